@@ -0,0 +1,82 @@
+# app/api/pagination.py
+"""
+Paginación por cursor (keyset) para los endpoints de listado.
+
+En lugar de OFFSET, que obliga a la base a recorrer y descartar todas las filas
+anteriores, cada página se pide con `WHERE id > :ultimo_id ORDER BY id` y se resuelve
+con un seek sobre la clave primaria, cueste lo mismo la página 1 que la 3000.
+
+- `limit` tiene un máximo fijo (API_MAX_PAGE_SIZE).
+- Si hay más filas, la respuesta lleva el header `X-Next-Cursor` con un token opaco;
+  se envía tal cual en `?cursor=` para pedir la siguiente página. Sin header, no hay más.
+- El cuerpo sigue siendo la lista de elementos, así que los clientes actuales no cambian.
+- `skip` se mantiene solo por compatibilidad y se ignora si llega un cursor.
+- Los listados se sirven desde la réplica de lectura si está configurada (LIST_MAX_STALENESS).
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy.orm import Query as ORMQuery
+
+from app.core.config import get_settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Segundos de retraso que toleran los listados: pueden leerse de la réplica (ver read_db).
+LIST_MAX_STALENESS = 30
+
+_settings = get_settings()
+
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> int:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        last_id = None
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+    return last_id
+
+
+@dataclass
+class PageParams:
+    limit: int
+    cursor: Optional[str] = None
+    skip: int = 0
+
+
+def page_params(
+    cursor: Optional[str] = Query(None, description=f"Token del header {NEXT_CURSOR_HEADER} de la página anterior"),
+    limit: int = Query(100, ge=1, le=_settings.API_MAX_PAGE_SIZE, description="Elementos por página"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Paginación por OFFSET (obsoleta, usar cursor)"),
+) -> PageParams:
+    """Dependencia de FastAPI con los parámetros de paginación comunes."""
+    return PageParams(limit=limit, cursor=cursor, skip=skip)
+
+
+def paginate(query: ORMQuery, id_column: Any, page: PageParams, response: Response) -> List[Any]:
+    """
+    Aplica la página pedida a `query` (ordenada por `id_column`) y, si quedan filas,
+    pone el cursor de la siguiente página en el header de la respuesta.
+    """
+    query = query.order_by(id_column)
+    if page.cursor:
+        query = query.filter(id_column > decode_cursor(page.cursor))
+    elif page.skip:
+        query = query.offset(page.skip)
+    # Se pide una fila de más para saber si existe una página siguiente.
+    rows = query.limit(page.limit + 1).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(rows[-1], id_column.key))
+    return rows
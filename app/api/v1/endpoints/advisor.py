@@ -1,22 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, read_db
 from app.db import models
 from app.api import deps
+from app.api.pagination import LIST_MAX_STALENESS, PageParams, page_params, paginate
 from app.schemas.advisor import AdvisorCreate, AdvisorUpdate, AdvisorInDB
 from app.core.config import get_settings
+from app.utils.cache import reference_cache
 
 router = APIRouter()
 
 @router.get("/", response_model=List[AdvisorInDB], summary="Obtener todos los asesores")
-def read_advisors(skip: int = 0, limit: int = 100, db: Session = Depends(deps.get_db)):
+def read_advisors(response: Response, page: PageParams = Depends(page_params), db: Session = Depends(read_db(max_staleness=LIST_MAX_STALENESS))):
     """
-    Obtiene una lista paginada de todos los asesores.
+    Obtiene una lista paginada de todos los asesores (paginación por cursor, ver app/api/pagination.py).
     """
-    advisors = db.query(models.Advisor).order_by(models.Advisor.id).offset(skip).limit(limit).all()
-    return advisors
+    return paginate(db.query(models.Advisor), models.Advisor.id, page, response)
 
 @router.get("/{advisor_id}", response_model=AdvisorInDB, summary="Obtener asesor por ID")
 def read_advisor(advisor_id: int, db: Session = Depends(deps.get_db)):
@@ -45,6 +46,7 @@ def create_advisor(advisor_data: AdvisorCreate, db: Session = Depends(deps.get_d
     db_advisor = models.Advisor(**advisor_data.model_dump())
     db.add(db_advisor)
     db.commit()
+    reference_cache.invalidate("Advisor")
     db.refresh(db_advisor)
     return db_advisor
 
@@ -64,6 +66,7 @@ def update_advisor(advisor_id: int, advisor_update: AdvisorUpdate, db: Session =
     
     db.add(db_advisor)
     db.commit()
+    reference_cache.invalidate("Advisor")
     db.refresh(db_advisor)
     return db_advisor
 
@@ -77,4 +80,5 @@ def delete_advisor(advisor_id: int, api_key: str = Query(..., description="Debes
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asesor no encontrado")
     db.delete(db_advisor)
     db.commit()
+    reference_cache.invalidate("Advisor")
     return {"message": "Asesor eliminado exitosamente"}
\ No newline at end of file
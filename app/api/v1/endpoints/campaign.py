@@ -1,22 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, read_db
 from app.db import models
 from app.api import deps
+from app.api.pagination import LIST_MAX_STALENESS, PageParams, page_params, paginate
 from app.schemas.campaign import CampaignCreate, CampaignUpdate, CampaignInDB
 from app.core.config import get_settings
+from app.utils.cache import reference_cache
 
 router = APIRouter()
 
 @router.get("/", response_model=List[CampaignInDB], summary="Obtener todas las campañas")
-def read_campaigns(skip: int = 0, limit: int = 100, db: Session = Depends(deps.get_db)):
+def read_campaigns(response: Response, page: PageParams = Depends(page_params), db: Session = Depends(read_db(max_staleness=LIST_MAX_STALENESS))):
     """
-    Obtiene una lista paginada de todas las campañas.
+    Obtiene una lista paginada de todas las campañas (paginación por cursor, ver app/api/pagination.py).
     """
-    campaigns = db.query(models.Campaign).order_by(models.Campaign.id).offset(skip).limit(limit).all()
-    return campaigns
+    return paginate(db.query(models.Campaign), models.Campaign.id, page, response)
 
 @router.get("/{campaign_id}", response_model=CampaignInDB, summary="Obtener campaña por ID")
 def read_campaign(campaign_id: int, db: Session = Depends(deps.get_db)):
@@ -36,6 +37,7 @@ def create_campaign(campaign_data: CampaignCreate, db: Session = Depends(deps.ge
     db_campaign = models.Campaign(**campaign_data.model_dump())
     db.add(db_campaign)
     db.commit()
+    reference_cache.invalidate("Campaign")
     db.refresh(db_campaign)
     return db_campaign
 
@@ -55,6 +57,7 @@ def update_campaign(campaign_id: int, campaign_update: CampaignUpdate, db: Sessi
     
     db.add(db_campaign)
     db.commit()
+    reference_cache.invalidate("Campaign")
     db.refresh(db_campaign)
     return db_campaign
 
@@ -70,4 +73,5 @@ def delete_campaign(campaign_id: int, api_key: str = Query(..., description="Deb
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Campaña no encontrada")
     db.delete(db_campaign)
     db.commit()
+    reference_cache.invalidate("Campaign")
     return {"message": "Campaña eliminada exitosamente"}
\ No newline at end of file
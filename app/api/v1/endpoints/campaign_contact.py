@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Any
-from app.db.session import get_db
+from typing import List, Any, Optional
+from app.db.session import get_db, get_async_db, read_db
+from app.api.pagination import LIST_MAX_STALENESS, PageParams, page_params, paginate
 from app.db.models import Contact, CampaignContact, ContactState
 from app.schemas.campaign_contact import CampaignContactUpsert, CampaignContactRead
 from app.core.logging import logger
-from app.db.repositories import ContactRepository, CampaignContactRepository, ContactStateRepository
-from app.services.queue_service import QueueService, QueueServiceError
+from app.db.async_repositories import (
+    AsyncContactRepository, AsyncCampaignContactRepository, AsyncContactStateRepository, AsyncOutboxRepository
+)
+from app.services.queue_service import QueueService
 import json
 
 router = APIRouter()
@@ -16,20 +20,23 @@ router = APIRouter()
 async def assign_campaign_and_state(
     data: CampaignContactUpsert,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    contact_repo = ContactRepository(db)
-    campaign_contact_repo = CampaignContactRepository(db)
-    contact_state_repo = ContactStateRepository(db)
-    queue_service = QueueService()
-
-    # Buscar contacto
-    contact = contact_repo.get_by_manychat_id(data.manychat_id)
+    # Sesión asíncrona: las consultas no bloquean el event loop mientras esperan a Azure SQL.
+    contact_repo = AsyncContactRepository(db)
+    campaign_contact_repo = AsyncCampaignContactRepository(db)
+    contact_state_repo = AsyncContactStateRepository(db)
+    outbox_repo = AsyncOutboxRepository(db)
+
+    # Resolver el id del contacto (caché manychat_id -> id, sin cargar la fila completa)
+    contact = await contact_repo.resolve_key(data.manychat_id)
     if not contact:
         raise HTTPException(status_code=404, detail=f"No se encontró contacto con manychat_id={data.manychat_id}")
 
+    # Todas las escrituras (estado, asignación y evento) van en una sola transacción:
+    # los repositorios solo hacen flush y el commit se hace una vez al final.
     # Primero creamos/actualizamos el ContactState
-    contact_state = contact_state_repo.create_or_update(
+    contact_state = await contact_state_repo.create_or_update(
         contact_id=contact.id,
         state=data.state,
         category=data.category
@@ -57,16 +64,10 @@ async def assign_campaign_and_state(
 
     # Siempre marcar sync_status como 'new' para que el worker CRM procese el cambio en Odoo
     cc_data["sync_status"] = "new"
-    campaign_contact = campaign_contact_repo.create_or_update_assignment(cc_data)
-
-    # Upsert ContactState
-    contact_state = contact_state_repo.create_or_update(
-        contact_id=contact.id,
-        state=data.state,
-        category="crm"
-    )
+    campaign_contact = await campaign_contact_repo.create_or_update_assignment(cc_data)
 
-    # Encolar evento para worker CRM (Odoo)
+    # Evento para worker CRM (Odoo). Se guarda en el Outbox dentro de la misma transacción;
+    # workers/outbox_relay.py lo publica en la cola, así la request no espera a Azure Queue.
     event = {
         "manychat_id": data.manychat_id,
         "campaign_id": data.campaign_id,
@@ -74,15 +75,13 @@ async def assign_campaign_and_state(
         "summary": data.summary,
         "comercial_id": data.comercial_id,
         "medico_id": data.medico_id,
-        "fecha_asignacion": data.fecha_asignacion.isoformat(),
+        "fecha_asignacion": data.fecha_asignacion.isoformat() if data.fecha_asignacion else None,
         "ultimo_estado": data.state,  # Usamos el state actual
         "contact_id": contact.id,
         "contact_state_id": contact_state.id,
     }
-    try:
-        await queue_service.send_message(queue_service.crm_queue_name, event)
-    except Exception as e:
-        logger.error(f"Error al encolar evento para worker CRM: {e}")
+    await outbox_repo.add(QueueService.CRM_OPPORTUNITIES_QUEUE_NAME, event)
+    await db.commit()
 
     return campaign_contact
 
@@ -90,8 +89,22 @@ async def assign_campaign_and_state(
 
 
 @router.get("/", response_model=List[CampaignContactRead], summary="Listar todos los CampaignContacts")
-def list_campaign_contacts(db: Session = Depends(get_db)):
-    return db.query(CampaignContact).all()
+def list_campaign_contacts(
+    response: Response,
+    campaign_id: Optional[int] = Query(None, description="Filtrar por campaña"),
+    contact_id: Optional[int] = Query(None, description="Filtrar por contacto"),
+    sync_status: Optional[str] = Query(None, description="Filtrar por estado de sincronización"),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(read_db(max_staleness=LIST_MAX_STALENESS)),
+):
+    query = db.query(CampaignContact)
+    if campaign_id is not None:
+        query = query.filter(CampaignContact.campaign_id == campaign_id)
+    if contact_id is not None:
+        query = query.filter(CampaignContact.contact_id == contact_id)
+    if sync_status is not None:
+        query = query.filter(CampaignContact.sync_status == sync_status)
+    return paginate(query, CampaignContact.id, page, response)
 
 @router.get("/{contact_id}/{campaign_id}", response_model=CampaignContactRead, summary="Obtener CampaignContact por contact_id y campaign_id")
 def get_campaign_contact(contact_id: int, campaign_id: int, db: Session = Depends(get_db)):
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from typing import List
-from app.db.session import get_db
+from app.db.session import get_db, read_db
+from app.api.pagination import LIST_MAX_STALENESS, PageParams, page_params, paginate
 from app.db.models import Channel
 from app.schemas.channel import ChannelCreate, ChannelUpdate, ChannelRead
 from app.core.config import get_settings
+from app.utils.cache import reference_cache
 
 router = APIRouter()
 
@@ -13,12 +15,13 @@ def create_channel(channel: ChannelCreate, db: Session = Depends(get_db)):
     db_channel = Channel(**channel.model_dump())
     db.add(db_channel)
     db.commit()
+    reference_cache.invalidate("Channel")
     db.refresh(db_channel)
     return db_channel
 
 @router.get("/", response_model=List[ChannelRead])
-def list_channels(db: Session = Depends(get_db)):
-    return db.query(Channel).all()
+def list_channels(response: Response, page: PageParams = Depends(page_params), db: Session = Depends(read_db(max_staleness=LIST_MAX_STALENESS))):
+    return paginate(db.query(Channel), Channel.id, page, response)
 
 @router.get("/{channel_id}", response_model=ChannelRead)
 def get_channel(channel_id: int, db: Session = Depends(get_db)):
@@ -36,6 +39,7 @@ def update_channel(channel_id: int, channel_update: ChannelUpdate, db: Session =
         setattr(channel, key, value)
     db.add(channel)
     db.commit()
+    reference_cache.invalidate("Channel")
     db.refresh(channel)
     return channel
 
@@ -49,4 +53,5 @@ def delete_channel(channel_id: int, api_key: str = Query(..., description="Debes
         raise HTTPException(status_code=404, detail="Channel not found")
     db.delete(channel)
     db.commit()
+    reference_cache.invalidate("Channel")
     return None
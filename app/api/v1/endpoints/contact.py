@@ -1,23 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 # Asegúrate de que estas importaciones sean correctas para tu configuración
-from app.db.session import SessionLocal # Usado para Type Hinting si no se usa directamente
+from app.db.session import SessionLocal, read_db # Usado para Type Hinting si no se usa directamente
 from app.db import models
 from app.api import deps # Para get_db
+from app.api.pagination import LIST_MAX_STALENESS, PageParams, page_params, paginate
 from app.schemas.contact import ContactCreate, ContactUpdate, ContactInDB # Asegúrate que sean correctas
 from app.core.config import get_settings
+from app.utils.bloom import known_contacts
+from app.utils.cache import contact_key_cache
 
 router = APIRouter()
 
 @router.get("/", response_model=List[ContactInDB], summary="Obtener todos los contactos")
-def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(deps.get_db)):
+def read_contacts(
+    response: Response,
+    channel_id: Optional[int] = Query(None, description="Filtrar por canal"),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(read_db(max_staleness=LIST_MAX_STALENESS)),
+):
     """
-    Obtiene una lista paginada de todos los contactos.
+    Obtiene una lista paginada de todos los contactos (paginación por cursor, ver app/api/pagination.py).
     """
-    contacts = db.query(models.Contact).order_by(models.Contact.id).offset(skip).limit(limit).all()
-    return contacts
+    query = db.query(models.Contact)
+    if channel_id is not None:
+        query = query.filter(models.Contact.channel_id == channel_id)
+    return paginate(query, models.Contact.id, page, response)
 
 @router.get("/{contact_id}", response_model=ContactInDB, summary="Obtener contacto por ID")
 def read_contact(contact_id: int, db: Session = Depends(deps.get_db)):
@@ -52,6 +62,7 @@ def create_contact(contact: ContactCreate, db: Session = Depends(deps.get_db)):
     db_contact = models.Contact(**contact_data)
     db.add(db_contact)
     db.commit()
+    known_contacts.add(db_contact.manychat_id)
     db.refresh(db_contact)
     return db_contact
 
@@ -67,11 +78,15 @@ def update_contact(contact_id: int, contact_update: ContactUpdate, db: Session =
 
     # exclude_unset=True asegura que solo los campos realmente enviados en la solicitud se usen para actualizar
     update_data = contact_update.model_dump(exclude_unset=True)
+    previous_manychat_id = db_contact.manychat_id
     for key, value in update_data.items():
         setattr(db_contact, key, value)
     
     db.add(db_contact)
     db.commit()
+    # manychat_id y channel_id pueden haber cambiado
+    contact_key_cache.invalidate("Contact", previous_manychat_id)
+    known_contacts.add(db_contact.manychat_id)
     db.refresh(db_contact)
     return db_contact
 
@@ -86,4 +101,5 @@ def delete_contact(contact_id: int, api_key: str = Query(..., description="Debes
     db.query(models.ContactState).filter(models.ContactState.contact_id == contact_id).delete(synchronize_session=False)
     db.delete(db_contact)
     db.commit()
+    contact_key_cache.invalidate("Contact", db_contact.manychat_id)
     return {"message": "Contacto eliminado exitosamente"}
@@ -0,0 +1,151 @@
+# app/api/v1/endpoints/export.py
+"""
+Exportación masiva de tablas en NDJSON o CSV.
+
+Las filas se leen con un cursor del lado del servidor (stream_results + yield_per)
+como tuplas de Core, sin crear objetos ORM ni modelos Pydantic, y cada bloque se
+envía al cliente en cuanto se serializa: la memoria no crece con el tamaño de la
+tabla y el primer byte sale en cuanto llega el primer bloque.
+
+La conexión y el turno del governor se reservan antes de responder (si la base está
+saturada se devuelve 503 como en el resto de la API) y los libera el propio generador
+de bloques al cerrarse, también si el cliente corta la descarga: Starlette no ejecuta
+la BackgroundTask de la respuesta cuando el cliente se desconecta, ni cierra el
+generador, así que _ExportResponse lo cierra al terminar.
+"""
+import csv
+import io
+import json
+from contextlib import ExitStack
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, ContextManager, Generator, Iterator, List, Sequence
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.engine import Result
+from starlette.concurrency import run_in_threadpool
+from starlette.types import Receive, Scope, Send
+
+from app.api.deps import verify_api_key
+from app.db.models import Address, Advisor, Campaign, CampaignContact, Channel, Contact, ContactState, SyncLog
+from app.db.session import read_connection
+
+router = APIRouter(dependencies=[Depends(verify_api_key)])
+
+# Filas por bloque leído del cursor y enviado al cliente.
+EXPORT_BATCH_SIZE = 1000
+# Las exportaciones toleran datos de hasta 5 minutos: se leen de la réplica si existe.
+EXPORT_MAX_STALENESS = 300
+
+EXPORTABLE = {
+    "contacts": Contact,
+    "contact-states": ContactState,
+    "campaigns": Campaign,
+    "campaign-contacts": CampaignContact,
+    "advisors": Advisor,
+    "channels": Channel,
+    "addresses": Address,
+    "sync-log": SyncLog,
+}
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
+def _ndjson_chunks(result: Result) -> Iterator[str]:
+    keys = list(result.keys())
+    for rows in result.partitions():
+        yield "".join(
+            json.dumps(dict(zip(keys, row)), default=_json_default, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def _csv_chunks(result: Result) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(result.keys())
+    yield buffer.getvalue()
+    for rows in result.partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_csv_value(row) for row in rows)
+        yield buffer.getvalue()
+
+
+def _csv_value(row: Sequence[Any]) -> List[Any]:
+    return [value.isoformat() if isinstance(value, (datetime, date)) else value for value in row]
+
+
+def _closing(chunks: Iterator[str], resources: ContextManager) -> Generator[str, None, None]:
+    """
+    Envía los bloques y libera `resources` al cerrarse el generador (fin, error o
+    desconexión). El primer `next()` lo hace export_entity y devuelve "": así el
+    generador ya está dentro del `with` y su close() libera los recursos aunque el
+    cliente corte antes del primer bloque.
+    """
+    with resources:
+        yield ""
+        yield from chunks
+
+
+class _ExportResponse(StreamingResponse):
+    """StreamingResponse que cierra el generador de bloques al terminar, aunque el cliente corte."""
+
+    def __init__(self, chunks: Generator[str, None, None], **kwargs: Any):
+        super().__init__(chunks, **kwargs)
+        self._chunks = chunks
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await run_in_threadpool(self._chunks.close)
+
+
+@router.get("/{entity}", summary="Exportar una tabla completa en NDJSON o CSV (streaming)")
+def export_entity(
+    entity: str,
+    format: ExportFormat = Query(ExportFormat.ndjson, description="ndjson (un objeto JSON por línea) o csv"),
+):
+    model = EXPORTABLE.get(entity)
+    if model is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Entidad no exportable: '{entity}'. Disponibles: {', '.join(EXPORTABLE)}",
+        )
+
+    resources = ExitStack()
+    try:
+        connection = resources.enter_context(read_connection(EXPORT_MAX_STALENESS))
+        result = connection.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(
+            select(model.__table__).order_by(*model.__table__.primary_key.columns)
+        )
+    except BaseException:
+        resources.close()
+        raise
+
+    if format == ExportFormat.csv:
+        chunks, media_type = _csv_chunks(result), "text/csv; charset=utf-8"
+    else:
+        chunks, media_type = _ndjson_chunks(result), "application/x-ndjson"
+    stream = _closing(chunks, resources)
+    next(stream)
+    return _ExportResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format.value}"'},
+    )
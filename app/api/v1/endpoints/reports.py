@@ -2,15 +2,21 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import case, desc, func, select
 from typing import Dict, Any
 
-from app.db.session import get_db
+from app.db.dialects import dialect_for
+from app.db.models import Channel, Contact, ContactState
+from app.db.session import read_db, db_governor, get_pool_stats
 from app.services.queue_service import QueueService
+from app.services.odoo_crm_opportunity_service import odoo_rate_limiter
 from app.api.deps import verify_api_key, get_queue_service
 from app.utils.monitoring import log_dependency_health
 from app.core.logging import logger
 
+# Los reportes toleran datos de hasta un minuto: se leen de la réplica si existe.
+REPORTS_MAX_STALENESS = 60
+
 router = APIRouter(
     prefix="/reports",
     tags=["Reports & Health"],
@@ -38,16 +44,20 @@ def check_database_health(db: Session) -> Dict[str, Any]:
         Dict con status y detalles de la conexión
     """
     try:
-        # Ejecutar query de prueba
-        result = db.execute(text("SELECT @@VERSION as version, GETDATE() as current_time"))
+        # Ejecutar query de prueba (versión y hora del servidor según el dialecto)
+        dialect = dialect_for(db.get_bind())
+        result = db.execute(select(
+            dialect.server_version().label("version"),
+            dialect.now().label("current_time"),
+        ))
         row = result.fetchone()
 
         # Obtener estadísticas básicas
-        stats_result = db.execute(text("""
-                                    SELECT (SELECT COUNT(*) FROM Contact)       as total_contacts,
-                                           (SELECT COUNT(*) FROM Contact_State) as total_states,
-                                           (SELECT COUNT(*) FROM Channel)       as total_channels
-                                    """))
+        stats_result = db.execute(select(
+            select(func.count()).select_from(Contact).scalar_subquery().label("total_contacts"),
+            select(func.count()).select_from(ContactState).scalar_subquery().label("total_states"),
+            select(func.count()).select_from(Channel).scalar_subquery().label("total_channels"),
+        ))
         stats = stats_result.fetchone()
 
         log_dependency_health("database", "ok")
@@ -203,7 +213,7 @@ def check_queue_health(queue_service: QueueService) -> Dict[str, Any]:
     }
 )
 async def health_check(
-        db: Session = Depends(get_db),
+        db: Session = Depends(read_db(max_staleness=REPORTS_MAX_STALENESS)),
         queue_service: QueueService = Depends(get_queue_service),
         api_key: str = Depends(verify_api_key)
 ) -> Dict[str, Any]:
@@ -218,8 +228,8 @@ async def health_check(
     Este endpoint requiere autenticación con API Key para prevenir
     exposición no autorizada de información del sistema.
     """
-    # Ejecutar verificaciones
-    db_health = check_database_health(db)
+    # Ejecutar verificaciones (las consultas síncronas van al executor de BD para no bloquear el event loop)
+    db_health = await db_governor.offload(check_database_health, db)
     odoo_health = check_odoo_health()
     queue_health = check_queue_health(queue_service)
 
@@ -241,6 +251,37 @@ async def health_check(
     }
 
 
+def _query_statistics(db: Session):
+    """Consultas de estadísticas (bloqueantes): se ejecutan en el executor de BD."""
+    dialect = dialect_for(db.get_bind())
+
+    # Estadísticas de contactos
+    contacts_stats = db.execute(select(
+        func.count().label("total"),
+        func.count(case((Contact.entry_date >= dialect.hours_ago(24), 1))).label("recent_24h"),
+    ).select_from(Contact)).fetchone()
+
+    # Contactos por canal
+    channel_stats = db.execute(
+        select(Channel.name.label("channel_name"), func.count(Contact.id).label("count"))
+        .select_from(Contact)
+        .outerjoin(Channel, Contact.channel_id == Channel.id)
+        .group_by(Channel.name)
+    ).fetchall()
+
+    # Estados actuales más comunes (uno por contacto: Contact_State guarda todo el historial)
+    state_stats = db.execute(
+        select(ContactState.state, func.count().label("count"))
+        .select_from(Contact)
+        .join(ContactState, ContactState.id == Contact.current_state_id)
+        .group_by(ContactState.state)
+        .order_by(desc("count"))
+        .limit(10)
+    ).fetchall()
+
+    return contacts_stats, channel_stats, state_stats
+
+
 @router.get(
     "/statistics",
     summary="Estadísticas del sistema",
@@ -277,7 +318,7 @@ async def health_check(
     }
 )
 async def get_statistics(
-        db: Session = Depends(get_db),
+        db: Session = Depends(read_db(max_staleness=REPORTS_MAX_STALENESS)),
         queue_service: QueueService = Depends(get_queue_service),
         api_key: str = Depends(verify_api_key)
 ) -> Dict[str, Any]:
@@ -291,29 +332,7 @@ async def get_statistics(
     - Actividad reciente (últimas 24 horas)
     """
     try:
-        # Estadísticas de contactos
-        contacts_stats = db.execute(text("""
-                                          SELECT COUNT(*)                                                           as total,
-                                                 COUNT(CASE WHEN entry_date >= DATEADD(hour, -24, GETDATE()) THEN 1 END) as recent_24h
-                                          FROM Contact
-                                          """)).fetchone()
-
-        # Contactos por canal
-        channel_stats = db.execute(text("""
-                                         SELECT c.name as channel_name, COUNT(con.id) as count
-                                         FROM Contact con
-                                             LEFT JOIN Channel c
-                                         ON con.channel_id = c.id
-                                         GROUP BY c.name
-                                         """)).fetchall()
-
-        # Estados más comunes
-        state_stats = db.execute(text("""
-                                        SELECT TOP 10 state, COUNT(*) as count
-                                        FROM Contact_State
-                                        GROUP BY state
-                                        ORDER BY count DESC
-                                        """)).fetchall()
+        contacts_stats, channel_stats, state_stats = await db_governor.offload(_query_statistics, db)
 
         # Obtener información de colas
         queue_info = check_queue_health(queue_service)
@@ -345,4 +364,38 @@ async def get_statistics(
         raise HTTPException(
             status_code=500,
             detail=f"Error al obtener estadísticas: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get(
+    "/db-pool",
+    summary="Telemetría del pool de conexiones",
+    description="Conexiones en uso, overflow, espera por conexión y edad de las conexiones de cada pool, más el estado de los governors de concurrencia",
+)
+async def get_db_pool_stats(api_key: str = Depends(verify_api_key)) -> Dict[str, Any]:
+    """
+    Devuelve la telemetría de los pools de SQLAlchemy (síncrono y asíncrono).
+
+    - **checked_out / idle / overflow**: ocupación actual del pool
+    - **checkout_wait**: espera para obtener una conexión (promedio, p95 y máximo en ms)
+    - **connection_age_s**: edad de las conexiones abiertas
+    - **governors**: operaciones en curso, en espera y rechazadas con 503
+    """
+    return get_pool_stats()
+
+
+@router.get(
+    "/odoo-rate-limit",
+    summary="Límite de llamadas a Odoo",
+    description="Ritmo configurado del token bucket compartido con Odoo y el histograma de esperas por turno de este proceso",
+)
+async def get_odoo_rate_limit_stats(api_key: str = Depends(verify_api_key)) -> Dict[str, Any]:
+    """
+    Devuelve el estado del límite de llamadas a Odoo visto desde este proceso.
+
+    - **rate / burst**: llamadas por segundo y ráfaga permitidas entre todos los procesos
+    - **acquired**: turnos obtenidos por este proceso
+    - **fallbacks**: reservas hechas con el bucket local porque la base no respondió
+    - **wait.histogram**: cuántos turnos esperaron cada tramo de tiempo
+    """
+    return odoo_rate_limiter.stats()
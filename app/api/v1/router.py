@@ -13,6 +13,7 @@ from app.api.v1.endpoints.channel import router as channel_router
 from app.api.v1.endpoints.crm_opportunities import router as crm_opportunities_router
 from app.api.v1.endpoints.manychat import router as manychat_router
 from app.api.v1.endpoints.reports import router as reports_router
+from app.api.v1.endpoints.export import router as export_router
 
 # Router principal que agrupará a todos los demás
 router = APIRouter()
@@ -30,3 +31,4 @@ router.include_router(campaign_contact_router, prefix="/campaign-contacts", tags
 router.include_router(channel_router, prefix="/channels", tags=["Channels"])
 router.include_router(crm_opportunities_router, prefix="/crm", tags=["CRM Opportunities"])
 router.include_router(reports_router, prefix="/reports", tags=["Reports"])
+router.include_router(export_router, prefix="/export", tags=["Export"])
@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     DEBUG: bool = Field(True, alias="DEBUG")
     API_KEY: str = Field(..., alias="API_KEY")
     API_V1_STR: str = Field("/api/v1", alias="API_V1_STR")
+    API_MAX_PAGE_SIZE: int = Field(500, alias="API_MAX_PAGE_SIZE")
     PORT: int = Field(8000, alias="PORT")
 
 
@@ -22,6 +23,67 @@ class Settings(BaseSettings):
     USE_KEY_VAULT: bool = Field(False, alias="USE_KEY_VAULT")
     KEY_VAULT_NAME: str = Field("", alias="KEY_VAULT_NAME")
 
+    # --- Base de datos: escritura masiva ---
+    DB_FAST_EXECUTEMANY: bool = Field(True, alias="DB_FAST_EXECUTEMANY")
+    DB_INSERTMANYVALUES_PAGE_SIZE: int = Field(1000, alias="DB_INSERTMANYVALUES_PAGE_SIZE")
+    DB_BULK_BATCH_SIZE: int = Field(1000, alias="DB_BULK_BATCH_SIZE")
+
+    # --- Base de datos: pool de conexiones y control de concurrencia ---
+    # DB_ROLE elige el tamaño de pool: la API atiende muchas requests concurrentes,
+    # los workers procesan mensajes de uno en uno y necesitan pocas conexiones.
+    DB_ROLE: str = Field("api", alias="DB_ROLE")  # "api" | "worker"
+    DB_POOL_SIZE: int = Field(20, alias="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(0, alias="DB_MAX_OVERFLOW")
+    DB_WORKER_POOL_SIZE: int = Field(5, alias="DB_WORKER_POOL_SIZE")
+    DB_WORKER_MAX_OVERFLOW: int = Field(0, alias="DB_WORKER_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: float = Field(10, alias="DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE: int = Field(3600, alias="DB_POOL_RECYCLE")
+    # Requests que pueden esperar una conexión libre y cuánto tiempo; por encima, 503 inmediato.
+    DB_MAX_WAITING: int = Field(20, alias="DB_MAX_WAITING")
+    DB_ADMISSION_TIMEOUT: float = Field(2, alias="DB_ADMISSION_TIMEOUT")
+    # Conexiones que la API abre al arrancar para no pagar el handshake ODBC en la primera ráfaga.
+    DB_POOL_WARMUP: int = Field(5, alias="DB_POOL_WARMUP")
+    # Log de cada sentencia SQL. Independiente de DEBUG: solo para diagnóstico puntual.
+    DB_ECHO: bool = Field(False, alias="DB_ECHO")
+
+    # --- Réplica de lectura (opcional) ---
+    # En Azure SQL suele ser la misma cadena que DATABASE_URL: se añade ApplicationIntent=ReadOnly.
+    DATABASE_READ_URL: Optional[str] = Field(None, alias="DATABASE_READ_URL")
+    DB_READ_POOL_SIZE: int = Field(10, alias="DB_READ_POOL_SIZE")
+    DB_READ_MAX_OVERFLOW: int = Field(0, alias="DB_READ_MAX_OVERFLOW")
+    # Retraso máximo esperado de la réplica (s): solo se usa para lecturas que toleran al menos esto.
+    DB_REPLICA_MAX_LAG: float = Field(5, alias="DB_REPLICA_MAX_LAG")
+    # Tras un fallo de conexión a la réplica, las lecturas van al primario durante este tiempo.
+    DB_REPLICA_RETRY_SECONDS: float = Field(30, alias="DB_REPLICA_RETRY_SECONDS")
+
+    # --- Caché de datos de referencia (Channel, Campaign, Advisor) ---
+    REFERENCE_CACHE_TTL: float = Field(300, alias="REFERENCE_CACHE_TTL")
+    REFERENCE_CACHE_MAXSIZE: int = Field(2000, alias="REFERENCE_CACHE_MAXSIZE")
+
+    # --- Caché manychat_id -> (Contact.id, channel_id) ---
+    CONTACT_KEY_CACHE_TTL: float = Field(600, alias="CONTACT_KEY_CACHE_TTL")
+    CONTACT_KEY_CACHE_MAXSIZE: int = Field(50000, alias="CONTACT_KEY_CACHE_MAXSIZE")
+
+    # --- Filtro de Bloom de contactos para /verificar-contacto ---
+    CONTACT_FILTER_ENABLED: bool = Field(True, alias="CONTACT_FILTER_ENABLED")
+    CONTACT_FILTER_CAPACITY: int = Field(1000000, alias="CONTACT_FILTER_CAPACITY")
+    CONTACT_FILTER_ERROR_RATE: float = Field(0.001, alias="CONTACT_FILTER_ERROR_RATE")
+    CONTACT_FILTER_SYNC_SECONDS: float = Field(1, alias="CONTACT_FILTER_SYNC_SECONDS")
+    # Antigüedad máxima (s) del último refresco para dar por bueno un "no" del filtro
+    CONTACT_FILTER_MAX_STALENESS: float = Field(2, alias="CONTACT_FILTER_MAX_STALENESS")
+    CONTACT_FILTER_REBUILD_SECONDS: float = Field(3600, alias="CONTACT_FILTER_REBUILD_SECONDS")
+
+    # --- Auditoría en Sync_Log (escritura por lotes en segundo plano) ---
+    SYNC_LOG_ENABLED: bool = Field(True, alias="SYNC_LOG_ENABLED")
+    SYNC_LOG_BATCH_SIZE: int = Field(200, alias="SYNC_LOG_BATCH_SIZE")
+    SYNC_LOG_FLUSH_SECONDS: float = Field(2, alias="SYNC_LOG_FLUSH_SECONDS")
+    SYNC_LOG_MAX_BUFFER: int = Field(10000, alias="SYNC_LOG_MAX_BUFFER")
+    SYNC_LOG_MAX_DETAILS: int = Field(2000, alias="SYNC_LOG_MAX_DETAILS")
+    # Días que se conservan las entradas y a partir de cuántos se descarta `details` de las exitosas (0 = nunca)
+    SYNC_LOG_RETENTION_DAYS: int = Field(90, alias="SYNC_LOG_RETENTION_DAYS")
+    SYNC_LOG_COMPACT_AFTER_DAYS: int = Field(7, alias="SYNC_LOG_COMPACT_AFTER_DAYS")
+    SYNC_LOG_MAINTENANCE_SECONDS: float = Field(3600, alias="SYNC_LOG_MAINTENANCE_SECONDS")
+
     # --- Logging ---
     LOG_LEVEL: str = Field("INFO", alias="LOG_LEVEL")
     LOG_FORMAT: str = Field("json", alias="LOG_FORMAT")
@@ -32,6 +94,22 @@ class Settings(BaseSettings):
     ODOO_DB: Optional[str] = Field(None, alias="ODOO_DB")
     ODOO_USERNAME: Optional[str] = Field(None, alias="ODOO_USERNAME")
     ODOO_PASSWORD: Optional[str] = Field(None, alias="ODOO_PASSWORD")
+    # Cliente JSON-RPC: timeout por llamada (s) y conexiones keep-alive
+    ODOO_TIMEOUT: float = Field(30, alias="ODOO_TIMEOUT")
+    ODOO_MAX_CONNECTIONS: int = Field(10, alias="ODOO_MAX_CONNECTIONS")
+    # Límite de llamadas a Odoo sumando todos los procesos (llamadas/s y ráfaga; 0 = sin límite).
+    # Con ODOO_RATE_LIMIT_SHARED=false cada proceso aplica el límite por su cuenta.
+    ODOO_RATE_LIMIT: float = Field(1.0, alias="ODOO_RATE_LIMIT")
+    ODOO_RATE_BURST: int = Field(1, alias="ODOO_RATE_BURST")
+    ODOO_RATE_LIMIT_SHARED: bool = Field(True, alias="ODOO_RATE_LIMIT_SHARED")
+    # Caché manychat_id -> id del crm.lead (respaldada por Contact.odoo_lead_id)
+    ODOO_LEAD_CACHE_TTL: float = Field(3600, alias="ODOO_LEAD_CACHE_TTL")
+    ODOO_LEAD_CACHE_MAXSIZE: int = Field(50000, alias="ODOO_LEAD_CACHE_MAXSIZE")
+    # Escrituras a Odoo agrupadas: ventana de espera (s, 0 = sin agrupar) y registros por llamada
+    ODOO_WRITE_BATCH_WINDOW: float = Field(0.2, alias="ODOO_WRITE_BATCH_WINDOW")
+    ODOO_WRITE_BATCH_MAX: int = Field(100, alias="ODOO_WRITE_BATCH_MAX")
+    # Fracción de oportunidades creadas/actualizadas que se releen para verificarlas (0 = nunca, 1 = todas)
+    ODOO_VERIFY_SAMPLE_RATE: float = Field(0.0, alias="ODOO_VERIFY_SAMPLE_RATE")
 
     # --- CAMBIO CLAVE AQUÍ: Usar model_config para Pydantic v2 ---
     model_config = SettingsConfigDict(
@@ -0,0 +1,133 @@
+# app/db/async_repositories.py
+"""
+Versiones asíncronas de los repositorios, para endpoints 'async def' y workers asyncio.
+
+No duplican las consultas: cada método ejecuta el repositorio síncrono equivalente
+mediante AsyncSession.run_sync. SQLAlchemy corre ese código en un greenlet y cada
+round trip pasa por el driver asíncrono (aioodbc / aiosqlite), así que el event loop
+queda libre mientras se espera a la base de datos. Igual que los síncronos, solo
+hacen flush: el commit lo hace async_unit_of_work o el endpoint.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models import Advisor, Address, Campaign, CampaignContact, Channel, Contact, ContactState, Outbox
+from app.db.repositories import (
+    AddressRepository, AdvisorRepository, CampaignContactRepository, CampaignRepository,
+    ChannelRepository, ContactKey, ContactRepository, ContactStateRepository, OutboxRepository,
+)
+
+
+class _AsyncRepository:
+    """Base común: ejecuta un método del repositorio síncrono sobre la AsyncSession."""
+    repository_class: Type[Any]
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        def call(session: Session) -> Any:
+            return getattr(self.repository_class(session), method)(*args, **kwargs)
+        return await self.db.run_sync(call)
+
+
+class AsyncContactRepository(_AsyncRepository):
+    repository_class = ContactRepository
+
+    async def get_by_manychat_id(self, manychat_id: str) -> Optional[Contact]:
+        return await self._run("get_by_manychat_id", manychat_id)
+
+    async def resolve_key(self, manychat_id: str) -> Optional[ContactKey]:
+        return await self._run("resolve_key", manychat_id)
+
+    async def resolve_keys(self, manychat_ids: Sequence[str]) -> Dict[str, ContactKey]:
+        return await self._run("resolve_keys", manychat_ids)
+
+    async def create_or_update(self, contact_data: Dict[str, Any]) -> Contact:
+        return await self._run("create_or_update", contact_data)
+
+    async def bulk_create_or_update(self, contacts_data: List[Dict[str, Any]]) -> List[Contact]:
+        return await self._run("bulk_create_or_update", contacts_data)
+
+    async def set_odoo_lead_id(self, contact_id: int, odoo_lead_id: Optional[int]) -> None:
+        return await self._run("set_odoo_lead_id", contact_id, odoo_lead_id)
+
+
+class AsyncContactStateRepository(_AsyncRepository):
+    repository_class = ContactStateRepository
+
+    async def create_or_update(self, contact_id: int, state: str, category: str = "manychat") -> ContactState:
+        return await self._run("create_or_update", contact_id, state, category=category)
+
+    async def get_latest_by_contact(self, contact_id: int) -> Optional[ContactState]:
+        return await self._run("get_latest_by_contact", contact_id)
+
+    async def get_history_by_contact(self, contact_id: int) -> List[ContactState]:
+        return await self._run("get_history_by_contact", contact_id)
+
+
+class AsyncChannelRepository(_AsyncRepository):
+    repository_class = ChannelRepository
+
+    async def get_or_create_by_name(self, name: str) -> Channel:
+        return await self._run("get_or_create_by_name", name)
+
+
+class AsyncCampaignRepository(_AsyncRepository):
+    repository_class = CampaignRepository
+
+    async def get_or_create_by_name(self, name: str) -> Campaign:
+        return await self._run("get_or_create_by_name", name)
+
+    async def get_by_id(self, campaign_id: int) -> Optional[Campaign]:
+        return await self._run("get_by_id", campaign_id)
+
+
+class AsyncAdvisorRepository(_AsyncRepository):
+    repository_class = AdvisorRepository
+
+    async def get_by_id_or_email(self, identifier: str) -> Optional[Advisor]:
+        return await self._run("get_by_id_or_email", identifier)
+
+
+class AsyncCampaignContactRepository(_AsyncRepository):
+    repository_class = CampaignContactRepository
+
+    async def get_by_contact_and_campaign(
+        self, contact_id: int, campaign_id: int, with_relations: bool = False
+    ) -> Optional[CampaignContact]:
+        return await self._run("get_by_contact_and_campaign", contact_id, campaign_id, with_relations)
+
+    async def create_or_update_assignment(self, data: Dict[str, Any]) -> CampaignContact:
+        return await self._run("create_or_update_assignment", data)
+
+    async def bulk_create_or_update_assignments(self, rows: List[Dict[str, Any]]) -> List[CampaignContact]:
+        return await self._run("bulk_create_or_update_assignments", rows)
+
+
+class AsyncOutboxRepository(_AsyncRepository):
+    repository_class = OutboxRepository
+
+    async def add(self, queue_name: str, event_data: Dict[str, Any]) -> Outbox:
+        return await self._run("add", queue_name, event_data)
+
+    async def get_pending(self, limit: int = 100) -> List[Outbox]:
+        return await self._run("get_pending", limit=limit)
+
+    async def claim_pending(self, owner: str, limit: int, lease_seconds: int) -> List[Outbox]:
+        return await self._run("claim_pending", owner, limit, lease_seconds)
+
+    async def mark_sent(self, ids: List[int], owner: Optional[str] = None) -> None:
+        await self._run("mark_sent", ids, owner=owner)
+
+    async def mark_failed(self, failures: Dict[int, str], max_attempts: int, owner: Optional[str] = None) -> None:
+        await self._run("mark_failed", failures, max_attempts=max_attempts, owner=owner)
+
+
+class AsyncAddressRepository(_AsyncRepository):
+    repository_class = AddressRepository
+
+    async def add_address_to_contact(self, manychat_id: str, address_data: Dict[str, Any]) -> Optional[Address]:
+        return await self._run("add_address_to_contact", manychat_id, address_data)
@@ -0,0 +1,54 @@
+# app/db/bulk.py
+"""
+Helpers de escritura masiva para workers y procesos de importación/backfill.
+
+Cada lote usa la ruta masiva más rápida del dialecto (app/db/dialects.py): executemany
+con fast_executemany en SQL Server + pyodbc (un solo round trip por lote en lugar de una
+sentencia por fila) y COPY en Postgres. Ninguna función hace commit.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Type
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.dialects import dialect_for
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bulk_insert(db: Session, model: Type[Any], rows: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+    """
+    Inserta filas (diccionarios columna → valor) en lotes de `batch_size`.
+    No carga instancias ORM ni devuelve IDs. Retorna el número de filas enviadas.
+    """
+    batch_size = batch_size or get_settings().DB_BULK_BATCH_SIZE
+    dialect = dialect_for(db.get_bind())
+    connection = db.connection()
+    total = 0
+    for chunk in _chunks(rows, batch_size):
+        total += dialect.bulk_insert(connection, model.__table__, chunk)
+    return total
+
+
+def bulk_update(db: Session, model: Type[Any], rows: Sequence[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+    """
+    Actualiza filas por clave primaria en lotes de `batch_size`.
+    Cada diccionario debe incluir la clave primaria (p. ej. 'id') y las columnas a modificar.
+    Retorna el número de filas enviadas.
+    """
+    batch_size = batch_size or get_settings().DB_BULK_BATCH_SIZE
+    total = 0
+    for chunk in _chunks(rows, batch_size):
+        db.execute(update(model), chunk)
+        total += len(chunk)
+    return total
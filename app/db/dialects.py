@@ -0,0 +1,318 @@
+# app/db/dialects.py
+"""
+Diferencias entre motores de base de datos detrás de una interfaz pequeña.
+
+Producción usa SQL Server (Azure SQL), pero el mismo código debe poder ejecutarse contra
+Postgres (docker/postgres) y contra un archivo SQLite para desarrollo local y benchmarks.
+Cada dialecto define:
+
+- `engine_options(url, is_async)`: connect_args y opciones de create_engine propias del driver
+  (fast_executemany en pyodbc, executemany_mode en psycopg2, timeouts con el nombre correcto).
+- `configure_engine(engine)`: ajustes al conectar (en SQLite: SAVEPOINT y WAL).
+- `now()` / `hours_ago(h)` / `server_version()`: expresiones de fecha y versión del servidor.
+- `upsert(...)`: UPSERT de un round trip (MERGE, ON CONFLICT o respaldo fila a fila).
+- `bulk_insert(connection, table, rows)`: la ruta de inserción masiva más rápida del driver
+  (executemany con fast_executemany en SQL Server, COPY en Postgres).
+
+La paginación no necesita nada propio: `Select.limit()/offset()` ya se compila a TOP /
+OFFSET ... FETCH en SQL Server y a LIMIT / OFFSET en el resto.
+
+Uso: `dialect_for(db.get_bind()).hours_ago(24)`.
+"""
+import io
+from datetime import timedelta
+from typing import Any, Dict, List, Sequence, Type, Union
+
+from sqlalchemy import Table, bindparam, event, func, literal_column, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine, URL
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from app.core.config import get_settings
+
+# SQL Server admite como máximo 2100 parámetros por sentencia; se deja margen.
+MSSQL_MAX_PARAMS = 2000
+# Debajo de este número de filas COPY no compensa su preparación frente a executemany.
+COPY_MIN_ROWS = 50
+# Segundos de espera al abrir una conexión (o un bloqueo, en SQLite).
+CONNECT_TIMEOUT = 30
+
+
+class SQLDialect:
+    """Comportamiento por defecto: SQL estándar a través de SQLAlchemy."""
+
+    name = "default"
+
+    def engine_options(self, url: URL, is_async: bool = False) -> Dict[str, Any]:
+        return {"connect_args": {}}
+
+    def configure_engine(self, engine: Engine) -> None:
+        """Se llama con el motor síncrono (o `async_engine.sync_engine`) recién creado."""
+
+    def now(self) -> ColumnElement:
+        return func.now()
+
+    def hours_ago(self, hours: int) -> ColumnElement:
+        return func.now() - timedelta(hours=hours)
+
+    def server_version(self) -> ColumnElement:
+        return func.version()
+
+    def upsert(
+        self, db: Session, model: Type[Any], rows: List[Dict[str, Any]], columns: List[str],
+        index_elements: Sequence[str], update_columns: List[str], preserve_existing: Sequence[str],
+    ) -> List[Any]:
+        """Ruta de respaldo para dialectos sin UPSERT nativo: SELECT + UPDATE/INSERT por fila."""
+        results: List[Any] = []
+        for row in rows:
+            existing = db.query(model).filter_by(**{c: row[c] for c in index_elements}).first()
+            if existing:
+                for c in update_columns:
+                    value = row[c]
+                    if value is None or (c in preserve_existing and getattr(existing, c) is not None):
+                        continue
+                    setattr(existing, c, value)
+                results.append(existing)
+            else:
+                instance = model(**row)
+                db.add(instance)
+                results.append(instance)
+        db.flush()
+        return results
+
+    def bulk_insert(self, connection: Connection, table: Table, rows: List[Dict[str, Any]]) -> int:
+        """INSERT como executemany. Retorna el número de filas enviadas."""
+        if rows:
+            connection.execute(table.insert(), rows)
+        return len(rows)
+
+
+class _OnConflictUpsert:
+    """INSERT ... ON CONFLICT (...) DO UPDATE ... RETURNING (SQLite >= 3.35 y Postgres)."""
+
+    insert = None
+
+    def upsert(self, db, model, rows, columns, index_elements, update_columns, preserve_existing):
+        table = model.__table__
+        results: List[Any] = []
+        for start in range(0, len(rows), 500):
+            stmt = self.insert(model).values(rows[start:start + 500])
+            set_ = {
+                c: (func.coalesce(table.c[c], stmt.excluded[c]) if c in preserve_existing
+                    else func.coalesce(stmt.excluded[c], table.c[c]))
+                for c in update_columns
+            }
+            if set_:
+                stmt = stmt.on_conflict_do_update(index_elements=list(index_elements), set_=set_)
+            else:
+                # Solo vienen columnas clave: un UPDATE no-op asegura que RETURNING devuelva la fila.
+                first_key = index_elements[0]
+                stmt = stmt.on_conflict_do_update(index_elements=list(index_elements), set_={first_key: stmt.excluded[first_key]})
+            stmt = stmt.returning(model)
+            results.extend(db.scalars(stmt, execution_options={"populate_existing": True}).all())
+        return results
+
+
+class MSSQLDialect(SQLDialect):
+    name = "mssql"
+
+    def engine_options(self, url, is_async=False):
+        options: Dict[str, Any] = {"connect_args": {"timeout": CONNECT_TIMEOUT}}
+        # pyodbc envía cada sentencia parametrizada y SQL Server cachea su plan por texto;
+        # las consultas frecuentes de los repositorios mantienen ese texto estable.
+        # fast_executemany manda los executemany como arreglos de parámetros en un solo round trip.
+        if url.get_driver_name() in ("pyodbc", "aioodbc"):
+            options["fast_executemany"] = get_settings().DB_FAST_EXECUTEMANY
+        return options
+
+    def now(self):
+        return func.getdate()
+
+    def hours_ago(self, hours):
+        return func.dateadd(literal_column("hour"), -hours, func.getdate())
+
+    def server_version(self):
+        return literal_column("@@VERSION")
+
+    def upsert(self, db, model, rows, columns, index_elements, update_columns, preserve_existing):
+        """MERGE ... WITH (HOLDLOCK) ... OUTPUT INSERTED.<columnas>, en tramos de MSSQL_MAX_PARAMS parámetros."""
+        table = model.__table__
+        q = db.get_bind().dialect.identifier_preparer.quote
+        chunk_size = max(1, MSSQL_MAX_PARAMS // max(1, len(columns)))
+        column_list = ", ".join(q(c) for c in columns)
+        on_clause = " AND ".join(f"target.{q(c)} = source.{q(c)}" for c in index_elements)
+        set_clause = ", ".join(
+            f"target.{q(c)} = COALESCE(target.{q(c)}, source.{q(c)})" if c in preserve_existing
+            else f"target.{q(c)} = COALESCE(source.{q(c)}, target.{q(c)})"
+            for c in update_columns
+        )
+        output_list = ", ".join(f"INSERTED.{q(c.name)}" for c in table.columns)
+        # CAST explícito: un NULL dentro de VALUES no tiene tipo y pyodbc lo enviaría como VARCHAR.
+        sql_types = {c: table.c[c].type.compile(dialect=db.get_bind().dialect) for c in columns}
+        results: List[Any] = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            params: Dict[str, Any] = {}
+            binds = []
+            values_sql = []
+            for i, row in enumerate(chunk):
+                names = []
+                for j, c in enumerate(columns):
+                    name = f"p{i}_{j}"
+                    params[name] = row[c]
+                    binds.append(bindparam(name, type_=table.c[c].type))
+                    names.append(f"CAST(:{name} AS {sql_types[c]})")
+                values_sql.append(f"({', '.join(names)})")
+            sql = (
+                f"MERGE INTO {q(table.name)} WITH (HOLDLOCK) AS target "
+                f"USING (VALUES {', '.join(values_sql)}) AS source ({column_list}) "
+                f"ON {on_clause} "
+                + (f"WHEN MATCHED THEN UPDATE SET {set_clause} " if set_clause else "")
+                + f"WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({', '.join(f'source.{q(c)}' for c in columns)}) "
+                f"OUTPUT {output_list};"
+            )
+            stmt = select(model).from_statement(
+                text(sql).bindparams(*binds).columns(*table.columns)
+            )
+            results.extend(db.scalars(stmt, params, execution_options={"populate_existing": True}).all())
+        return results
+
+
+class PostgreSQLDialect(_OnConflictUpsert, SQLDialect):
+    name = "postgresql"
+    insert = staticmethod(postgresql.insert)
+
+    def engine_options(self, url, is_async=False):
+        driver = url.get_driver_name()
+        if driver == "asyncpg":
+            return {"connect_args": {"timeout": CONNECT_TIMEOUT}}
+        options: Dict[str, Any] = {"connect_args": {"connect_timeout": CONNECT_TIMEOUT}}
+        if driver == "psycopg2":
+            # Agrupa los executemany sin RETURNING en INSERT ... VALUES de varias filas.
+            options["executemany_mode"] = "values_plus_batch"
+        return options
+
+    def bulk_insert(self, connection, table, rows):
+        """COPY ... FROM STDIN con psycopg2/psycopg; executemany para lotes chicos u otros drivers."""
+        columns = _copy_columns(table, rows)
+        if len(rows) < COPY_MIN_ROWS or columns is None or connection.dialect.driver not in ("psycopg2", "psycopg"):
+            return super().bulk_insert(connection, table, rows)
+
+        q = connection.dialect.identifier_preparer.quote
+        sql = f"COPY {q(table.name)} ({', '.join(q(c.name) for c in columns)}) FROM STDIN"
+        data = "".join(
+            "\t".join(_copy_text(row.get(c.key, _python_default(c))) for c in columns) + "\n"
+            for row in rows
+        )
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            if connection.dialect.driver == "psycopg2":
+                cursor.copy_expert(sql, io.StringIO(data))
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(data)
+        finally:
+            cursor.close()
+        return len(rows)
+
+
+class SQLiteDialect(_OnConflictUpsert, SQLDialect):
+    name = "sqlite"
+    insert = staticmethod(sqlite.insert)
+
+    def engine_options(self, url, is_async=False):
+        # check_same_thread=False: FastAPI usa la conexión desde hilos distintos al que la abrió.
+        return {"connect_args": {"timeout": CONNECT_TIMEOUT, "check_same_thread": False}}
+
+    def configure_engine(self, engine):
+        enable_sqlite_savepoints(engine)
+        if engine.url.database not in (None, "", ":memory:"):
+            # Archivo local compartido por la API y los workers: con WAL las lecturas no
+            # bloquean a la escritura; synchronous=NORMAL es seguro con WAL y mucho más rápido.
+            @event.listens_for(engine, "connect")
+            def _set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
+
+    def now(self):
+        return func.datetime("now")
+
+    def hours_ago(self, hours):
+        return func.datetime("now", f"-{int(hours)} hours")
+
+    def server_version(self):
+        return func.sqlite_version()
+
+
+def enable_sqlite_savepoints(sync_engine: Engine) -> None:
+    """
+    El driver sqlite3 no emite BEGIN antes de un SAVEPOINT, así que begin_nested()
+    confirmaría la transacción entera en SQLite. Se delega el control de transacciones
+    a SQLAlchemy (receta de su documentación); SQL Server no lo necesita.
+    """
+    @event.listens_for(sync_engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def _emit_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+# --- Helpers de COPY (Postgres) ---
+def _python_default(column) -> Any:
+    default = column.default
+    return default.arg if default is not None and default.is_scalar else None
+
+def _copy_columns(table: Table, rows: List[Dict[str, Any]]):
+    """
+    Columnas a enviar en el COPY: las presentes en las filas más las que tienen un default
+    escalar de Python (COPY solo aplica los defaults del servidor). None si alguna columna
+    ausente depende de un default calculado en Python: en ese caso se usa executemany.
+    """
+    present = set().union(*(row.keys() for row in rows)) if rows else set()
+    columns = []
+    for column in table.columns:
+        if column.key in present:
+            columns.append(column)
+        elif column.default is not None:
+            if not column.default.is_scalar:
+                return None
+            columns.append(column)
+    return columns
+
+def _copy_text(value: Any) -> str:
+    """Valor en el formato de texto de COPY: \\N para NULL y escapes para \\, tab y saltos de línea."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+_DIALECTS: Dict[str, SQLDialect] = {}
+
+def register_dialect(dialect: SQLDialect) -> None:
+    _DIALECTS[dialect.name] = dialect
+
+register_dialect(MSSQLDialect())
+register_dialect(PostgreSQLDialect())
+register_dialect(SQLiteDialect())
+_DEFAULT = SQLDialect()
+
+def dialect_for(bind: Union[Engine, Connection, URL, str]) -> SQLDialect:
+    """Dialecto de un motor, conexión, URL o nombre de backend ('mssql', 'postgresql', 'sqlite')."""
+    if isinstance(bind, str):
+        name = bind
+    elif isinstance(bind, URL):
+        name = bind.get_backend_name()
+    else:
+        name = bind.dialect.name
+    return _DIALECTS.get(name, _DEFAULT)
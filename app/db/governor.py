@@ -0,0 +1,191 @@
+# app/db/governor.py
+"""
+Control de concurrencia de acceso a la base de datos ("governor").
+
+El pool de conexiones es fijo (pool_size + max_overflow), pero Starlette ejecuta
+hasta 40 endpoints síncronos a la vez y el event loop puede abrir tantas sesiones
+asíncronas como requests lleguen. Sin límite, las requests sobrantes se quedan en
+la espera de QueuePool hasta agotar pool_timeout y fallan todas juntas.
+
+DBGovernor admite como máximo `max_concurrency` operaciones (el tamaño del pool),
+deja esperar a `max_waiting` más durante `wait_timeout` segundos y rechaza el
+resto al instante con DBOverloadedError, que la API traduce a un 503 con
+Retry-After. Así la latencia crece de forma gradual en lugar de colapsar.
+
+Las corrutinas que esperan turno forman una cola FIFO de futures (de cualquier event
+loop): al liberarse un turno se entrega directamente al primero de la cola, sin pasar
+por el semáforo, así nadie que llega después se lo adelanta y nadie sondea.
+"""
+import asyncio
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncGenerator, Callable, Deque, Generator, Optional
+
+
+class DBOverloadedError(RuntimeError):
+    """No hay conexiones libres y la cola de espera está llena o se agotó el tiempo de espera."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DBGovernor:
+    def __init__(self, max_concurrency: int, max_waiting: int, wait_timeout: float, name: str = "db"):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.name = name
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiting = 0
+        self._rejected = 0
+        self._async_waiters: Deque[asyncio.Future] = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _reject(self, reason: str) -> DBOverloadedError:
+        with self._lock:
+            self._rejected += 1
+        return DBOverloadedError(
+            f"Base de datos saturada ({self.name}): {reason}",
+            retry_after=max(1, round(self.wait_timeout)),
+        )
+
+    def _enter_queue(self) -> None:
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                full = True
+            else:
+                full = False
+                self._waiting += 1
+        if full:
+            raise self._reject(f"{self.max_waiting} operaciones ya esperan una conexión")
+
+    def _leave_queue(self, acquired: bool) -> None:
+        with self._lock:
+            self._waiting -= 1
+            if acquired:
+                self._in_use += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            while self._async_waiters:
+                waiter = self._async_waiters.popleft()
+                self._waiting -= 1
+                if waiter.done():  # se canceló mientras esperaba
+                    continue
+                try:
+                    waiter.get_loop().call_soon_threadsafe(self._hand_off, waiter)
+                except RuntimeError:  # su event loop ya se cerró
+                    continue
+                return  # el turno pasa a la corrutina, in_use no cambia
+            self._in_use -= 1
+            self._slots.release()
+
+    def _hand_off(self, waiter: asyncio.Future) -> None:
+        """Entrega un turno a una corrutina de la cola (en su event loop)."""
+        if waiter.done():  # venció o se canceló entre la entrega y ahora: pasa al siguiente
+            self._release()
+        else:
+            waiter.set_result(None)
+
+    @contextmanager
+    def slot(self) -> Generator[None, None, None]:
+        """Reserva un turno de BD desde código síncrono (hilos de Starlette o del executor)."""
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self._in_use += 1
+        else:
+            self._enter_queue()
+            acquired = False
+            try:
+                acquired = self._slots.acquire(timeout=self.wait_timeout)
+            finally:
+                self._leave_queue(acquired)
+            if not acquired:
+                raise self._reject(f"sin conexión libre tras {self.wait_timeout}s")
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncGenerator[None, None]:
+        """
+        Reserva un turno de BD desde una corrutina. Si no hay turno libre espera en la
+        cola FIFO sin bloquear el event loop, como mucho `wait_timeout` segundos.
+        """
+        waiter: Optional[asyncio.Future] = None
+        full = False
+        with self._lock:
+            # Bajo el mismo lock que _release: un turno liberado no puede perderse entre
+            # el intento fallido y el encolado.
+            if self._slots.acquire(blocking=False):
+                self._in_use += 1
+            elif self._waiting < self.max_waiting:
+                waiter = asyncio.get_running_loop().create_future()
+                self._async_waiters.append(waiter)
+                self._waiting += 1
+            else:
+                full = True
+        if full:
+            raise self._reject(f"{self.max_waiting} operaciones ya esperan una conexión")
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter, self.wait_timeout)
+            except BaseException as e:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+                        self._waiting -= 1
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # el turno llegó a la vez que el timeout o la cancelación
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._reject(f"sin conexión libre tras {self.wait_timeout}s") from None
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Executor dedicado con tantos hilos como conexiones tiene el pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=f"{self.name}-governor")
+        return self._executor
+
+    async def offload(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecuta código de BD bloqueante en el executor dedicado, sin pedir turno.
+        Para llamadores que ya lo tienen (p. ej. un endpoint 'async def' con la sesión de get_db).
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecuta código de BD bloqueante desde una corrutina sin bloquear el event loop.
+        La admisión se decide antes de encolar en el executor, para rechazar rápido.
+        """
+        async with self.async_slot():
+            return await self.offload(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "max_waiting": self.max_waiting,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,68 @@
+# app/db/migrations/__init__.py
+"""
+Migraciones versionadas del esquema de Azure SQL.
+
+Las tablas de producción no se crean con `Base.metadata.create_all`, así que cada
+cambio de esquema (tablas, columnas, índices) se publica como un módulo numerado
+en este paquete. Las versiones aplicadas se registran en la tabla `Schema_Migration`
+y el runner solo ejecuta las pendientes, en orden.
+
+Uso: python -m app.db.migrations
+"""
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.migrations import (
+    v0001_outbox, v0002_campaign_contact_unique, v0003_lookup_indexes, v0004_contact_current_state,
+    v0005_campaign_contact_lease, v0006_sync_log_indexes, v0007_rate_limit_bucket,
+    v0008_contact_odoo_lead_id, v0009_outbox_lease,
+)
+
+# Lista ordenada de migraciones: (versión, descripción, función upgrade)
+MIGRATIONS: List[Tuple[str, str, Callable[[Connection], None]]] = [
+    (v0001_outbox.VERSION, v0001_outbox.DESCRIPTION, v0001_outbox.upgrade),
+    (v0002_campaign_contact_unique.VERSION, v0002_campaign_contact_unique.DESCRIPTION, v0002_campaign_contact_unique.upgrade),
+    (v0003_lookup_indexes.VERSION, v0003_lookup_indexes.DESCRIPTION, v0003_lookup_indexes.upgrade),
+    (v0004_contact_current_state.VERSION, v0004_contact_current_state.DESCRIPTION, v0004_contact_current_state.upgrade),
+    (v0005_campaign_contact_lease.VERSION, v0005_campaign_contact_lease.DESCRIPTION, v0005_campaign_contact_lease.upgrade),
+    (v0006_sync_log_indexes.VERSION, v0006_sync_log_indexes.DESCRIPTION, v0006_sync_log_indexes.upgrade),
+    (v0007_rate_limit_bucket.VERSION, v0007_rate_limit_bucket.DESCRIPTION, v0007_rate_limit_bucket.upgrade),
+    (v0008_contact_odoo_lead_id.VERSION, v0008_contact_odoo_lead_id.DESCRIPTION, v0008_contact_odoo_lead_id.upgrade),
+    (v0009_outbox_lease.VERSION, v0009_outbox_lease.DESCRIPTION, v0009_outbox_lease.upgrade),
+]
+
+_metadata = MetaData()
+schema_migration = Table(
+    "Schema_Migration",
+    _metadata,
+    Column("version", String(20), primary_key=True),
+    Column("description", String(255), nullable=True),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    Aplica las migraciones pendientes. Cada versión se ejecuta en su propia transacción.
+    Retorna la lista de versiones aplicadas en esta ejecución.
+    """
+    applied_now: List[str] = []
+    with engine.begin() as connection:
+        schema_migration.create(connection, checkfirst=True)
+        applied = set(connection.execute(select(schema_migration.c.version)).scalars())
+
+    for version, description, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(schema_migration.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now(timezone.utc),
+            ))
+        applied_now.append(version)
+    return applied_now
@@ -0,0 +1,23 @@
+# app/db/migrations/__main__.py
+"""
+Ejecuta las migraciones pendientes: python -m app.db.migrations
+
+Con --create-schema crea antes las tablas que falten (Base.metadata.create_all). Es solo
+para bases locales o de pruebas (archivo SQLite, Postgres de docker): en producción el
+esquema existe y cambia únicamente a través de las migraciones.
+"""
+import sys
+
+from app.db.migrations import run_migrations
+from app.db.session import Base, engine
+import app.db.models  # noqa: F401 (registra los modelos en Base.metadata)
+
+if __name__ == "__main__":
+    if "--create-schema" in sys.argv[1:]:
+        Base.metadata.create_all(engine)
+        print(f"✅ Esquema creado en {engine.url.render_as_string(hide_password=True)}")
+    applied = run_migrations(engine)
+    if applied:
+        print(f"✅ Migraciones aplicadas: {', '.join(applied)}")
+    else:
+        print("✅ El esquema ya está al día. No hay migraciones pendientes.")
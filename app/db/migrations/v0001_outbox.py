@@ -0,0 +1,12 @@
+# app/db/migrations/v0001_outbox.py
+"""Crea la tabla Outbox para la publicación transaccional de eventos."""
+from sqlalchemy.engine import Connection
+
+from app.db.models import Outbox
+
+VERSION = "0001"
+DESCRIPTION = "Tabla Outbox para eventos transaccionales hacia Azure Storage Queue"
+
+
+def upgrade(connection: Connection) -> None:
+    Outbox.__table__.create(connection, checkfirst=True)
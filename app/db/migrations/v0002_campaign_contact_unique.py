@@ -0,0 +1,28 @@
+# app/db/migrations/v0002_campaign_contact_unique.py
+"""Índice único (contact_id, campaign_id) en Campaign_Contact, requerido por el UPSERT atómico."""
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+from app.db.models import CampaignContact
+
+VERSION = "0002"
+DESCRIPTION = "Índice único ux_campaign_contact_contact_campaign en Campaign_Contact"
+
+
+def upgrade(connection: Connection) -> None:
+    duplicates = connection.execute(
+        select(func.count()).select_from(
+            select(CampaignContact.contact_id, CampaignContact.campaign_id)
+            .group_by(CampaignContact.contact_id, CampaignContact.campaign_id)
+            .having(func.count() > 1)
+            .subquery()
+        )
+    ).scalar()
+    if duplicates:
+        raise RuntimeError(
+            f"Campaign_Contact tiene {duplicates} pares (contact_id, campaign_id) duplicados. "
+            "Consolídalos antes de aplicar esta migración."
+        )
+    for index in CampaignContact.__table__.indexes:
+        if index.name == "ux_campaign_contact_contact_campaign":
+            index.create(connection, checkfirst=True)
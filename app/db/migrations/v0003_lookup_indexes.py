@@ -0,0 +1,42 @@
+# app/db/migrations/v0003_lookup_indexes.py
+"""Índices para las búsquedas que se ejecutan en cada evento (estado, canal, campaña y asesor)."""
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+from app.db.models import Advisor, Campaign, Channel, ContactState
+
+VERSION = "0003"
+DESCRIPTION = "Índices de búsqueda en Contact_State, Channel, Campaign y Advisor"
+
+# (modelo, nombre del índice). Los únicos se validan antes de crearse.
+INDEXES = [
+    (ContactState, "ix_contact_state_contact_created"),
+    (Channel, "ux_channel_name"),
+    (Campaign, "ix_Campaign_name"),
+    (Advisor, "ux_advisor_email"),
+    (Advisor, "ix_advisor_name"),
+]
+
+
+def _count_duplicates(connection: Connection, column, where: Optional[object] = None) -> int:
+    query = select(column).group_by(column).having(func.count() > 1)
+    if where is not None:
+        query = query.where(where)
+    return connection.execute(select(func.count()).select_from(query.subquery())).scalar()
+
+
+def upgrade(connection: Connection) -> None:
+    duplicates = {
+        "Channel.name": _count_duplicates(connection, Channel.name),
+        "Advisor.email": _count_duplicates(connection, Advisor.email, Advisor.email.isnot(None)),
+    }
+    conflicts = {column: count for column, count in duplicates.items() if count}
+    if conflicts:
+        details = ", ".join(f"{column}: {count} valores repetidos" for column, count in conflicts.items())
+        raise RuntimeError(f"No se pueden crear los índices únicos ({details}). Consolida los duplicados antes de aplicar esta migración.")
+
+    for model, name in INDEXES:
+        index = next(index for index in model.__table__.indexes if index.name == name)
+        index.create(connection, checkfirst=True)
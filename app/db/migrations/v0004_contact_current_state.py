@@ -0,0 +1,31 @@
+# app/db/migrations/v0004_contact_current_state.py
+"""Columna Contact.current_state_id: puntero al último registro del historial Contact_State."""
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.engine import Connection
+
+from app.db.models import Contact, ContactState
+
+VERSION = "0004"
+DESCRIPTION = "Contact.current_state_id (historial append-only en Contact_State)"
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns(Contact.__tablename__)}
+    if "current_state_id" not in columns:
+        q = connection.dialect.identifier_preparer.quote
+        column_type = Contact.__table__.c.current_state_id.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {q(Contact.__tablename__)} ADD {q('current_state_id')} {column_type} NULL"))
+
+    # Hasta ahora había una fila por contacto; se apunta a la más reciente por si hay varias.
+    latest = (
+        select(ContactState.id)
+        .where(ContactState.contact_id == Contact.id)
+        .order_by(ContactState.created_at.desc(), ContactState.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    connection.execute(
+        update(Contact)
+        .where(Contact.current_state_id.is_(None))
+        .values(current_state_id=latest)
+    )
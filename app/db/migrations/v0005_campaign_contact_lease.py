@@ -0,0 +1,20 @@
+# app/db/migrations/v0005_campaign_contact_lease.py
+"""Columnas de lease en Campaign_Contact para que varias instancias del worker reclamen filas sin duplicar trabajo."""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from app.db.models import CampaignContact
+
+VERSION = "0005"
+DESCRIPTION = "Campaign_Contact.lease_owner/lease_expires_at (reclamo concurrente del worker de campañas)"
+
+
+def upgrade(connection: Connection) -> None:
+    table = CampaignContact.__table__
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    q = connection.dialect.identifier_preparer.quote
+    for name in ("lease_owner", "lease_expires_at"):
+        if name in existing:
+            continue
+        column_type = table.c[name].type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {q(table.name)} ADD {q(name)} {column_type} NULL"))
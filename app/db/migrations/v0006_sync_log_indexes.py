@@ -0,0 +1,17 @@
+# app/db/migrations/v0006_sync_log_indexes.py
+"""Índices de Sync_Log para consultar la auditoría por entidad y aplicar la retención por fecha."""
+from sqlalchemy.engine import Connection
+
+from app.db.models import SyncLog
+
+VERSION = "0006"
+DESCRIPTION = "Índices de Sync_Log (entidad y fecha)"
+
+INDEXES = ["ix_sync_log_entity", "ix_sync_log_created"]
+
+
+def upgrade(connection: Connection) -> None:
+    SyncLog.__table__.create(connection, checkfirst=True)
+    for name in INDEXES:
+        index = next(index for index in SyncLog.__table__.indexes if index.name == name)
+        index.create(connection, checkfirst=True)
@@ -0,0 +1,12 @@
+# app/db/migrations/v0007_rate_limit_bucket.py
+"""Crea la tabla Rate_Limit_Bucket para el límite de llamadas compartido entre procesos."""
+from sqlalchemy.engine import Connection
+
+from app.db.models import RateLimitBucket
+
+VERSION = "0007"
+DESCRIPTION = "Tabla Rate_Limit_Bucket (token bucket compartido para Odoo)"
+
+
+def upgrade(connection: Connection) -> None:
+    RateLimitBucket.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,19 @@
+# app/db/migrations/v0008_contact_odoo_lead_id.py
+"""Columna Contact.odoo_lead_id: id de la oportunidad en Odoo para actualizarla sin buscarla."""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from app.db.models import Contact
+
+VERSION = "0008"
+DESCRIPTION = "Contact.odoo_lead_id (mapeo manychat_id -> crm.lead de Odoo)"
+
+
+def upgrade(connection: Connection) -> None:
+    table = Contact.__table__
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    if "odoo_lead_id" in existing:
+        return
+    q = connection.dialect.identifier_preparer.quote
+    column_type = table.c.odoo_lead_id.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {q(table.name)} ADD {q('odoo_lead_id')} {column_type} NULL"))
@@ -0,0 +1,20 @@
+# app/db/migrations/v0009_outbox_lease.py
+"""Columnas de lease en Outbox para que varias instancias del relay reclamen eventos sin publicarlos dos veces."""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from app.db.models import Outbox
+
+VERSION = "0009"
+DESCRIPTION = "Outbox.lease_owner/lease_expires_at (reclamo concurrente del relay del Outbox)"
+
+
+def upgrade(connection: Connection) -> None:
+    table = Outbox.__table__
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    q = connection.dialect.identifier_preparer.quote
+    for name in ("lease_owner", "lease_expires_at"):
+        if name in existing:
+            continue
+        column_type = table.c[name].type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {q(table.name)} ADD {q(name)} {column_type} NULL"))
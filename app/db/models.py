@@ -1,10 +1,16 @@
 # app/db/models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, DECIMAL
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, DECIMAL, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.session import Base # Asegúrate que la importación de Base sea correcta
 
+# Ninguna relación se carga de forma perezosa: acceder a una que no se pidió explícitamente
+# lanza InvalidRequestError en lugar de disparar una consulta por fila (N+1).
+# Quien necesite una relación la declara en la consulta con selectinload/joinedload
+# (ver CAMPAIGN_CONTACT_RELATIONS en app/db/repositories.py).
+RAISE = "raise_on_sql"
+
 # --- Modelo Address (CORREGIDO) ---
 class Address(Base):
     __tablename__ = "Address"
@@ -22,7 +28,7 @@ class Address(Base):
     
     # Esta relación permite que desde una dirección (address) se pueda acceder 
     # a la información del contacto (contact) al que pertenece.
-    contact = relationship("Contact", back_populates="addresses")
+    contact = relationship("Contact", back_populates="addresses", lazy=RAISE)
 
 # --- Modelo Channel ---
 class Channel(Base):
@@ -30,7 +36,11 @@ class Channel(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), nullable=False)
     description = Column(String(255), nullable=True)
-    contacts = relationship("Contact", back_populates="channel")
+    contacts = relationship("Contact", back_populates="channel", lazy=RAISE)
+    # Único: ChannelRepository.get_or_create_by_name busca y crea canales por nombre.
+    __table_args__ = (
+        Index("ux_channel_name", name, unique=True),
+    )
 
 # --- Modelo ContactState ---
 class ContactState(Base):
@@ -40,7 +50,11 @@ class ContactState(Base):
     state = Column(String(100), nullable=False)
     category = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    contact = relationship("Contact", back_populates="state_history")
+    contact = relationship("Contact", back_populates="state_history", lazy=RAISE)
+    # "Último estado del contacto" se consulta en cada evento: el índice resuelve el ORDER BY.
+    __table_args__ = (
+        Index("ix_contact_state_contact_created", contact_id, created_at.desc()),
+    )
 
 # --- Modelo Contact (CORREGIDO) ---
 class Contact(Base):
@@ -57,19 +71,27 @@ class Contact(Base):
     entry_date = Column(DateTime, nullable=True)
     initial_state = Column(String(50), nullable=True)
 
+    # Último registro de Contact_State (historial append-only), lo mantiene ContactStateRepository
+    # en la misma transacción. Sin FK: el historial se borra antes que el contacto.
+    current_state_id = Column(Integer, nullable=True)
+
+    # Id del crm.lead en Odoo, guardado la primera vez que se conoce: las actualizaciones
+    # escriben directo sin buscar por el campo Studio de ManyChat (no indexado en Odoo).
+    odoo_lead_id = Column(Integer, nullable=True)
+
     # --- Relaciones ---
     channel_id = Column(Integer, ForeignKey("Channel.id"), nullable=True)
-    channel = relationship("Channel", back_populates="contacts")
+    channel = relationship("Channel", back_populates="contacts", lazy=RAISE)
 
     # --- ✅ CORRECCIÓN ---
     # Se elimina la 'address_id' y 'address' de aquí.
     # En su lugar, esta relación crea una lista de direcciones (addresses) para cada contacto.
     # Si un contacto se elimina, todas sus direcciones se borrarán en cascada.
-    addresses = relationship("Address", back_populates="contact", cascade="all, delete-orphan")
+    addresses = relationship("Address", back_populates="contact", cascade="all, delete-orphan", lazy=RAISE)
 
-    state_history = relationship("ContactState", back_populates="contact")
-    campaign_assignments = relationship("CampaignContact", back_populates="contact")
-    product_interactions = relationship("ProductInteraction", back_populates="contact")
+    state_history = relationship("ContactState", back_populates="contact", lazy=RAISE)
+    campaign_assignments = relationship("CampaignContact", back_populates="contact", lazy=RAISE)
+    product_interactions = relationship("ProductInteraction", back_populates="contact", lazy=RAISE)
 
 # --- (El resto de tus modelos permanecen igual) ---
 
@@ -85,17 +107,52 @@ class SyncLog(Base):
     details = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Consultas de auditoría por entidad y retención por fecha (ver app/db/sync_log.py).
+    __table_args__ = (
+        Index("ix_sync_log_entity", entity_type, entity_id, created_at),
+        Index("ix_sync_log_created", created_at),
+    )
+
+# --- Modelo Outbox ---
+# Eventos pendientes de publicar en Azure Storage Queue. Se escriben en la misma
+# transacción que los cambios de negocio y un relay (workers/outbox_relay.py)
+# los drena hacia la cola, de modo que ningún cambio en SQL pierda su evento.
+class Outbox(Base):
+    __tablename__ = "Outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    queue_name = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    # Lease del relay que publica el evento mientras status='publishing'.
+    # Si vence sin que el relay termine, otra instancia puede reclamarlo (ver OutboxRepository.claim_pending).
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+# --- Modelo Rate_Limit_Bucket ---
+# Token bucket compartido por todos los procesos que llaman a un sistema externo
+# (ver app/db/rate_limit.py). `version` permite actualizarlo con compare-and-set.
+class RateLimitBucket(Base):
+    __tablename__ = "Rate_Limit_Bucket"
+    name = Column(String(50), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    refilled_at = Column(Float, nullable=False)  # epoch en segundos
+    version = Column(Integer, nullable=False, default=0)
+
 # --- Modelo Campaign ---
 class Campaign(Base):
     __tablename__ = "Campaign"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False)
+    name = Column(String(100), nullable=False, index=True)
     date_start = Column(DateTime, nullable=False)
     date_end = Column(DateTime, nullable=True)
     budget = Column(DECIMAL(10, 2), nullable=True)
     status = Column(String(20), nullable=True)
     channel_id = Column(Integer, ForeignKey("Channel.id"), nullable=True)
-    contact_assignments = relationship("CampaignContact", back_populates="campaign")
+    contact_assignments = relationship("CampaignContact", back_populates="campaign", lazy=RAISE)
 
 # --- Modelo Advisor ---
 class Advisor(Base):
@@ -111,12 +168,27 @@ class Advisor(Base):
     is_active = Column(Boolean, nullable=False, default=True)
     created_at = Column(DateTime, nullable=False, default=func.now())
     updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
-    commercial_assignments = relationship("CampaignContact", foreign_keys="CampaignContact.commercial_advisor_id", back_populates="commercial_advisor")
-    medical_assignments = relationship("CampaignContact", foreign_keys="CampaignContact.medical_advisor_id", back_populates="medical_advisor")
+    commercial_assignments = relationship("CampaignContact", foreign_keys="CampaignContact.commercial_advisor_id", back_populates="commercial_advisor", lazy=RAISE)
+    medical_assignments = relationship("CampaignContact", foreign_keys="CampaignContact.medical_advisor_id", back_populates="medical_advisor", lazy=RAISE)
+    # AdvisorRepository.get_by_id_or_email busca por email o nombre. El email es único
+    # cuando existe (índice filtrado: SQL Server solo admitiría un NULL en un UNIQUE normal).
+    __table_args__ = (
+        Index(
+            "ux_advisor_email", email, unique=True,
+            mssql_where=email.isnot(None),
+            postgresql_where=email.isnot(None),
+            sqlite_where=email.isnot(None),
+        ),
+        Index("ix_advisor_name", name),
+    )
 
 # --- Modelo CampaignContact ---
 class CampaignContact(Base):
     __tablename__ = "Campaign_Contact"
+    # Una asignación por (contacto, campaña); el UPSERT atómico depende de este índice.
+    __table_args__ = (
+        Index("ux_campaign_contact_contact_campaign", "contact_id", "campaign_id", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     campaign_id = Column(Integer, ForeignKey("Campaign.id"), nullable=False)
     contact_id = Column(Integer, ForeignKey("Contact.id"), nullable=False)
@@ -136,12 +208,16 @@ class CampaignContact(Base):
     lead_state = Column(String(50), nullable=True)
     summary = Column(String(255), nullable=True)
     sync_status = Column(String(20), nullable=False, default="new", index=True)
-    campaign = relationship("Campaign", back_populates="contact_assignments")
-    contact = relationship("Contact", back_populates="campaign_assignments")
-    commercial_advisor = relationship("Advisor", foreign_keys=[commercial_advisor_id], back_populates="commercial_assignments")
-    medical_advisor = relationship("Advisor", foreign_keys=[medical_advisor_id], back_populates="medical_assignments")
-    order_products = relationship("OrderProduct", back_populates="campaign_contact")
-    product_interactions = relationship("ProductInteraction", back_populates="campaign_contact")
+    # Lease del worker que sincroniza la fila mientras sync_status='processing'.
+    # Si vence sin que el worker termine, otra instancia puede reclamarla (ver claim_pending).
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    campaign = relationship("Campaign", back_populates="contact_assignments", lazy=RAISE)
+    contact = relationship("Contact", back_populates="campaign_assignments", lazy=RAISE)
+    commercial_advisor = relationship("Advisor", foreign_keys=[commercial_advisor_id], back_populates="commercial_assignments", lazy=RAISE)
+    medical_advisor = relationship("Advisor", foreign_keys=[medical_advisor_id], back_populates="medical_assignments", lazy=RAISE)
+    order_products = relationship("OrderProduct", back_populates="campaign_contact", lazy=RAISE)
+    product_interactions = relationship("ProductInteraction", back_populates="campaign_contact", lazy=RAISE)
 
 # --- Modelo Product ---
 class Product(Base):
@@ -150,8 +226,8 @@ class Product(Base):
     code = Column(String(20), nullable=False, unique=True)
     name = Column(String(100), nullable=False)
     price = Column(DECIMAL(10, 2), nullable=True)
-    order_products = relationship("OrderProduct", back_populates="product")
-    product_interactions = relationship("ProductInteraction", back_populates="product")
+    order_products = relationship("OrderProduct", back_populates="product", lazy=RAISE)
+    product_interactions = relationship("ProductInteraction", back_populates="product", lazy=RAISE)
 
 # --- Modelo OrderProduct ---
 class OrderProduct(Base):
@@ -161,8 +237,8 @@ class OrderProduct(Base):
     product_id = Column(Integer, ForeignKey("Product.id"), nullable=False)
     quantity = Column(Integer, default=1)
     unit_price = Column(DECIMAL(10, 2))
-    campaign_contact = relationship("CampaignContact", back_populates="order_products")
-    product = relationship("Product", back_populates="order_products")
+    campaign_contact = relationship("CampaignContact", back_populates="order_products", lazy=RAISE)
+    product = relationship("Product", back_populates="order_products", lazy=RAISE)
 
 # --- Modelo ProductInteraction ---
 class ProductInteraction(Base):
@@ -173,6 +249,6 @@ class ProductInteraction(Base):
     campaign_contact_id = Column(Integer, ForeignKey("Campaign_Contact.id"), nullable=True)
     interaction_type = Column(String(50))
     interaction_date = Column(DateTime)
-    product = relationship("Product", back_populates="product_interactions")
-    contact = relationship("Contact", back_populates="product_interactions")
-    campaign_contact = relationship("CampaignContact", back_populates="product_interactions")
\ No newline at end of file
+    product = relationship("Product", back_populates="product_interactions", lazy=RAISE)
+    contact = relationship("Contact", back_populates="product_interactions", lazy=RAISE)
+    campaign_contact = relationship("CampaignContact", back_populates="product_interactions", lazy=RAISE)
\ No newline at end of file
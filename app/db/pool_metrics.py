@@ -0,0 +1,149 @@
+# app/db/pool_metrics.py
+"""
+Telemetría del pool de conexiones de SQLAlchemy.
+
+Mide lo que hace falta para detectar saturación:
+- conexiones en uso (checked out), en reposo y overflow;
+- tiempo de espera para obtener una conexión del pool;
+- edad de las conexiones (desde que se abrió el handshake ODBC);
+- conexiones abiertas, cerradas e invalidadas.
+
+Los contadores se alimentan con los eventos del pool (connect, checkout, checkin,
+close, invalidate). La espera no tiene evento propio en SQLAlchemy, así que se mide
+con una subclase del pool que cronometra _do_get (ver instrumented_pool_class).
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Type
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app.core.logging import logger
+
+# Esperas por encima de este umbral se registran como warning.
+SLOW_CHECKOUT_SECONDS = 1.0
+# Muestras recientes de espera usadas para calcular percentiles.
+WAIT_SAMPLES = 1000
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._pool: Optional[Pool] = None
+        self._wait_samples: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._checkouts = 0
+        self._connects = 0
+        self._closes = 0
+        self._invalidations = 0
+        self._connected_at: Dict[int, float] = {}
+
+    # --- Registro de eventos ---
+    def attach(self, pool: Pool) -> None:
+        self._pool = pool
+        event.listen(pool, "connect", self._on_connect)
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "close", self._on_close)
+        event.listen(pool, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection: Any, connection_record: Any) -> None:
+        with self._lock:
+            self._connects += 1
+            self._connected_at[id(connection_record)] = time.monotonic()
+
+    def _on_checkout(self, dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        with self._lock:
+            self._checkouts += 1
+
+    def _on_close(self, dbapi_connection: Any, connection_record: Any) -> None:
+        with self._lock:
+            self._closes += 1
+            self._connected_at.pop(id(connection_record), None)
+
+    def _on_invalidate(self, dbapi_connection: Any, connection_record: Any, exception: Any) -> None:
+        with self._lock:
+            self._invalidations += 1
+            self._connected_at.pop(id(connection_record), None)
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._wait_samples.append(seconds)
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+        if seconds >= SLOW_CHECKOUT_SECONDS:
+            logger.warning(f"Pool '{self.name}': espera de {seconds:.2f}s para obtener una conexión", **self._pool_status())
+
+    # --- Lectura ---
+    def _pool_status(self) -> Dict[str, Any]:
+        pool = self._pool
+        if pool is None or not hasattr(pool, "checkedout"):
+            return {}
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            samples = sorted(self._wait_samples)
+            ages = [now - t for t in self._connected_at.values()]
+            waits = {
+                "count": len(samples),
+                "avg_ms": round(1000 * sum(samples) / len(samples), 2) if samples else 0.0,
+                "p95_ms": round(1000 * samples[int(0.95 * (len(samples) - 1))], 2) if samples else 0.0,
+                "max_ms": round(1000 * self._wait_max, 2),
+                "total_s": round(self._wait_total, 3),
+            }
+            counters = {
+                "checkouts": self._checkouts,
+                "connects": self._connects,
+                "closes": self._closes,
+                "invalidations": self._invalidations,
+            }
+        return {
+            **self._pool_status(),
+            "checkout_wait": waits,
+            "connection_age_s": {
+                "open": len(ages),
+                "avg": round(sum(ages) / len(ages), 1) if ages else 0.0,
+                "max": round(max(ages), 1) if ages else 0.0,
+            },
+            **counters,
+        }
+
+
+def instrumented_pool_class(base: Type[Pool]) -> Type[Pool]:
+    """Subclase del pool que cronometra la espera por una conexión libre."""
+
+    class InstrumentedPool(base):  # type: ignore[misc, valid-type]
+        metrics: Optional[PoolMetrics] = None
+
+        def _do_get(self):
+            start = time.monotonic()
+            try:
+                return super()._do_get()
+            finally:
+                if self.metrics is not None:
+                    self.metrics.record_wait(time.monotonic() - start)
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+def instrument_engine(engine: Any, name: str) -> PoolMetrics:
+    """Conecta la telemetría al pool del motor (síncrono o AsyncEngine)."""
+    sync_engine: Engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    metrics = PoolMetrics(name)
+    metrics.attach(pool)
+    if hasattr(pool, "metrics"):
+        pool.metrics = metrics
+    return metrics
@@ -0,0 +1,153 @@
+# app/db/rate_limit.py
+"""
+Límite de llamadas compartido entre procesos (token bucket guardado en Azure SQL).
+
+Cada proceso que llama a Odoo (API, workers y sus réplicas) reserva su turno en la
+misma fila de `Rate_Limit_Bucket`, así el total no supera `rate` llamadas por segundo
+con ráfagas de hasta `burst`, sin importar cuántos procesos haya.
+
+- Reservar es una lectura y un UPDATE condicionado a `version` (compare-and-set): no
+  hace falta bloquear la fila ni hints propios de cada dialecto. Si otro proceso ganó
+  la carrera se vuelve a leer.
+- El token se reserva aunque aún no esté disponible: el saldo queda negativo y quien
+  reservó espera lo que falta. Los siguientes ven el saldo y esperan su turno detrás.
+- Si la base no responde, se usa un bucket local con el mismo ritmo para no detener
+  las llamadas; `stats()["fallbacks"]` cuenta esas reservas.
+- Las esperas se acumulan en un histograma (`stats()["wait"]`).
+"""
+import asyncio
+import bisect
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.core.logging import logger
+from app.db.models import RateLimitBucket
+
+# Límites superiores (s) de los tramos del histograma de espera; el último tramo es "más".
+WAIT_BUCKETS = (0.0, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+# Esperas por encima de este umbral se registran como warning.
+SLOW_WAIT_SECONDS = 10.0
+# Intentos de compare-and-set antes de dar la base por saturada y usar el bucket local.
+CAS_ATTEMPTS = 5
+
+
+class SQLTokenBucket:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int = 1,
+        engine: Optional[Engine] = None,
+        shared: bool = True,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.shared = shared
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._local_tokens = float(self.burst)
+        self._local_refilled_at = time.time()
+        self._histogram = [0] * (len(WAIT_BUCKETS) + 1)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._acquired = 0
+        self._fallbacks = 0
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            from app.db.session import engine
+            self._engine = engine
+        return self._engine
+
+    def _take(self, tokens: float, refilled_at: float, now: float) -> Tuple[float, float]:
+        """Rellena el saldo hasta `now`, descuenta un token y calcula la espera."""
+        tokens = min(float(self.burst), tokens + max(0.0, now - refilled_at) * self.rate) - 1
+        return tokens, max(0.0, -tokens / self.rate)
+
+    def reserve(self) -> float:
+        """Reserva un token. Retorna los segundos que hay que esperar antes de usarlo."""
+        if self.rate <= 0:
+            return 0.0
+        if self.shared:
+            try:
+                return self._reserve_shared()
+            except Exception as e:
+                logger.warning(f"Rate limit '{self.name}': bucket compartido no disponible, se usa el local: {e}")
+                with self._lock:
+                    self._fallbacks += 1
+        return self._reserve_local()
+
+    def _reserve_local(self) -> float:
+        with self._lock:
+            now = time.time()
+            self._local_tokens, wait = self._take(self._local_tokens, self._local_refilled_at, now)
+            self._local_refilled_at = now
+            return wait
+
+    def _reserve_shared(self) -> float:
+        table = RateLimitBucket.__table__
+        for _ in range(CAS_ATTEMPTS):
+            now = time.time()
+            try:
+                with self.engine.begin() as connection:
+                    row = connection.execute(
+                        select(table.c.tokens, table.c.refilled_at, table.c.version).where(table.c.name == self.name)
+                    ).first()
+                    if row is None:
+                        tokens, wait = self._take(float(self.burst), now, now)
+                        connection.execute(table.insert().values(name=self.name, tokens=tokens, refilled_at=now, version=0))
+                        return wait
+                    tokens, wait = self._take(row.tokens, row.refilled_at, now)
+                    updated = connection.execute(
+                        update(table)
+                        .where(table.c.name == self.name, table.c.version == row.version)
+                        .values(tokens=tokens, refilled_at=max(now, row.refilled_at), version=row.version + 1)
+                    ).rowcount
+                    if updated:
+                        return wait
+            except IntegrityError:
+                pass  # Otro proceso creó la fila a la vez: se vuelve a leer
+        raise RuntimeError(f"sin turno tras {CAS_ATTEMPTS} intentos de compare-and-set")
+
+    async def acquire(self) -> float:
+        """Espera el turno sin bloquear el event loop. Retorna los segundos esperados."""
+        if self.rate <= 0:
+            return 0.0
+        wait = await asyncio.to_thread(self.reserve) if self.shared else self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record_wait(wait)
+        return wait
+
+    def _record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._acquired += 1
+            self._histogram[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+        if seconds >= SLOW_WAIT_SECONDS:
+            logger.warning(f"Rate limit '{self.name}': espera de {seconds:.2f}s por un turno")
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"<={bound:g}s" for bound in WAIT_BUCKETS] + [f">{WAIT_BUCKETS[-1]:g}s"]
+        with self._lock:
+            return {
+                "name": self.name,
+                "rate": self.rate,
+                "burst": self.burst,
+                "shared": self.shared,
+                "acquired": self._acquired,
+                "fallbacks": self._fallbacks,
+                "wait": {
+                    "total_s": round(self._wait_total, 3),
+                    "max_ms": round(1000 * self._wait_max, 2),
+                    "histogram": dict(zip(labels, self._histogram)),
+                },
+            }
@@ -1,88 +1,346 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+from sqlalchemy import or_, func, select, bindparam, inspect, event, update
+from sqlalchemy.exc import IntegrityError
 # --- ✅ CAMBIO: Se añade el modelo Address ---
-from app.db.models import Contact, ContactState, Channel, Campaign, Advisor, CampaignContact, Address 
-from typing import Optional, Dict, Any
+from app.db.models import Contact, ContactState, Channel, Campaign, Advisor, CampaignContact, Address, Outbox
+from app.db.bulk import bulk_update
+from app.db.dialects import MSSQL_MAX_PARAMS, dialect_for
+from app.utils.bloom import known_contacts
+from app.utils.cache import MISSING, contact_key_cache, reference_cache
+from typing import Optional, Dict, Any, Iterator, List, NamedTuple, Sequence, Tuple, Type
+import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
+def _json_default(obj: Any) -> str:
+    """Serializa fechas a ISO 8601 al guardar payloads JSON (mismo formato que QueueService)."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+# --- Motor de UPSERT atómico por dialecto (implementaciones en app/db/dialects.py) ---
+def _merge_rows(rows: Sequence[Dict[str, Any]], index_elements: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Combina filas con la misma clave: MERGE y ON CONFLICT fallan si un mismo lote
+    toca dos veces la misma fila. Los valores no nulos posteriores tienen prioridad.
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = tuple(row[c] for c in index_elements)
+        if key in merged:
+            merged[key].update({k: v for k, v in row.items() if v is not None})
+        else:
+            merged[key] = dict(row)
+    return list(merged.values())
+
+def upsert_rows(
+    db: Session,
+    model: Type[Any],
+    rows: Sequence[Dict[str, Any]],
+    index_elements: Sequence[str],
+    preserve_existing: Sequence[str] = (),
+) -> List[Any]:
+    """
+    Inserta o actualiza filas en un solo round trip y retorna las instancias ORM resultantes.
+
+    - SQL Server: MERGE ... WITH (HOLDLOCK) ... OUTPUT INSERTED.<columnas>
+    - SQLite/Postgres: INSERT ... ON CONFLICT (...) DO UPDATE ... RETURNING
+    - Otros: SELECT + UPDATE/INSERT por fila (ver SQLDialect.upsert)
+
+    Semántica (igual que los UPSERT anteriores de los repositorios):
+    - Un valor None en la fila no sobrescribe el valor existente (COALESCE).
+    - Las columnas de `preserve_existing` solo se escriben si el valor existente es NULL.
+    - `index_elements` debe corresponder a una restricción o índice UNIQUE.
+    No hace commit.
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    valid_fields = {c.name for c in table.columns}
+    rows = _merge_rows([{k: v for k, v in row.items() if k in valid_fields} for row in rows], index_elements)
+    present = set().union(*(row.keys() for row in rows))
+    columns = [c.name for c in table.columns if c.name in present]
+    rows = [{c: row.get(c) for c in columns} for row in rows]
+    update_columns = [c for c in columns if c not in index_elements and not table.c[c].primary_key]
+
+    return dialect_for(db.get_bind()).upsert(
+        db, model, rows, columns, index_elements, update_columns, preserve_existing
+    )
+
+# --- Caché de datos de referencia ---
+# Se guardan instantáneas de columnas, nunca instancias ligadas a una sesión: al leer
+# de la caché se reconstruye la instancia y se adjunta a la sesión actual con
+# merge(load=False), sin ninguna consulta.
+def _snapshot(instance: Any) -> Dict[str, Any]:
+    return {attr.key: getattr(instance, attr.key) for attr in inspect(instance).mapper.column_attrs}
+
+def _attach_cached(db: Session, model: Type[Any], values: Dict[str, Any]) -> Any:
+    instance = model(**values)
+    make_transient_to_detached(instance)
+    return db.merge(instance, load=False)
+
+def _mark_uncommitted(db: Session, model: Type[Any], key: Any) -> None:
+    """Registra una fila creada en la transacción actual: si luego hay rollback, no debe quedar en caché."""
+    db.info.setdefault("uncommitted_references", set()).add((model.__name__, key))
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_uncommitted(session: Session) -> None:
+    session.info.pop("uncommitted_references", None)
+
+def _cached_lookup(db: Session, model: Type[Any], kind: str, key: Any, loader) -> Optional[Any]:
+    """Lectura a través de la caché: solo se guardan los aciertos, nunca los 'no encontrado'."""
+    namespace = model.__name__
+    values = reference_cache.get(namespace, (kind, key))
+    if values is not MISSING:
+        return _attach_cached(db, model, values)
+    instance = loader()
+    if instance is not None and (namespace, (kind, key)) not in db.info.get("uncommitted_references", ()):
+        reference_cache.set(namespace, (kind, key), _snapshot(instance))
+    return instance
+
+# --- Consultas frecuentes precompiladas ---
+# Las búsquedas de cada evento se construyen una sola vez, con parámetros con nombre:
+# no se arma ni se calcula la clave de caché de la expresión en cada llamada, y el texto
+# SQL es siempre el mismo, así SQL Server reutiliza el plan. Ver scripts/bench_hot_queries.py.
+_CONTACT_BY_MANYCHAT_ID = select(Contact).where(Contact.manychat_id == bindparam("manychat_id")).limit(1)
+_CONTACT_KEYS_BY_MANYCHAT_IDS = select(Contact.manychat_id, Contact.id, Contact.channel_id).where(
+    Contact.manychat_id.in_(bindparam("manychat_ids", expanding=True))
+)
+_CURRENT_STATE_BY_CONTACT = (
+    select(ContactState)
+    .join(Contact, Contact.current_state_id == ContactState.id)
+    .where(Contact.id == bindparam("contact_id"))
+)
+_LATEST_STATE_BY_CONTACT = (
+    select(ContactState)
+    .where(ContactState.contact_id == bindparam("contact_id"))
+    .order_by(ContactState.created_at.desc(), ContactState.id.desc())
+    .limit(1)
+)
+_ADVANCE_CURRENT_STATE = (
+    update(Contact)
+    .where(Contact.id == bindparam("contact_id"))
+    .where(or_(Contact.current_state_id.is_(None), Contact.current_state_id < bindparam("state_id")))
+    .values(current_state_id=bindparam("state_id"))
+    .execution_options(synchronize_session=False)
+)
+_CHANNEL_BY_NAME = select(Channel).where(Channel.name == bindparam("name")).limit(1)
+_CAMPAIGN_BY_ID = select(Campaign).where(Campaign.id == bindparam("campaign_id"))
+_ADVISOR_BY_ID = select(Advisor).where(Advisor.id == bindparam("advisor_id"))
+_ADVISOR_BY_EMAIL_OR_NAME = select(Advisor).where(
+    or_(Advisor.email == bindparam("identifier"), Advisor.name == bindparam("identifier"))
+).limit(1)
+_CAMPAIGN_CONTACT_BY_KEY = select(CampaignContact).where(
+    CampaignContact.contact_id == bindparam("contact_id"),
+    CampaignContact.campaign_id == bindparam("campaign_id"),
+)
+
+# Estados de CampaignContact que el worker de campañas debe sincronizar.
+CAMPAIGN_CONTACT_PENDING_STATUSES = ("new", "updated", "error")
+
+# --- Carga explícita de relaciones ---
+# Las relaciones de los modelos usan lazy="raise_on_sql": quien las necesite debe pedirlas
+# aquí. Las de CampaignContact son todas muchos-a-uno, así que un JOIN en la misma
+# consulta (joinedload) es lo más barato; para colecciones usar selectinload.
+CAMPAIGN_CONTACT_RELATIONS = (
+    joinedload(CampaignContact.campaign),
+    joinedload(CampaignContact.contact),
+    joinedload(CampaignContact.commercial_advisor),
+    joinedload(CampaignContact.medical_advisor),
+)
+_CAMPAIGN_CONTACT_WITH_RELATIONS_BY_KEY = _CAMPAIGN_CONTACT_BY_KEY.options(*CAMPAIGN_CONTACT_RELATIONS)
+
+def _padded_in_values(values: List[str]) -> List[str]:
+    """
+    Un IN expandido genera un texto SQL distinto por cada cantidad de valores. Se rellena
+    la lista (repitiendo el último) hasta la siguiente potencia de 2 para que solo existan
+    unas pocas variantes del texto y sus planes se reutilicen.
+    """
+    size = 1
+    while size < len(values):
+        size *= 2
+    size = min(size, MSSQL_MAX_PARAMS)
+    return values + [values[-1]] * (size - len(values))
+
+# --- Caché de claves de contacto ---
+# Casi todas las rutas empiezan resolviendo manychat_id -> Contact.id. Las claves que
+# escribe un UPSERT quedan pendientes en la sesión y se publican en contact_key_cache
+# solo cuando la transacción se confirma.
+class ContactKey(NamedTuple):
+    id: int
+    channel_id: Optional[int]
+
+@event.listens_for(Session, "after_commit")
+def _publish_contact_keys(session: Session) -> None:
+    for manychat_id, key in session.info.pop("pending_contact_keys", {}).items():
+        contact_key_cache.set("Contact", manychat_id, key)
+        known_contacts.add(manychat_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_contact_keys(session: Session) -> None:
+    session.info.pop("pending_contact_keys", None)
+
+# Los repositorios trabajan dentro de una unidad de trabajo (ver app.db.session.unit_of_work):
+# solo hacen flush y el commit lo hace una vez el servicio o endpoint que los usa.
 class ContactRepository:
     def __init__(self, db: Session):
         self.db = db
         
     def get_by_manychat_id(self, manychat_id: str) -> Optional[Contact]:
         """Obtiene un contacto por su ID de ManyChat."""
-        return self.db.query(Contact).filter(
-            Contact.manychat_id == manychat_id
-        ).first()
+        return self.db.scalars(_CONTACT_BY_MANYCHAT_ID, {"manychat_id": manychat_id}).first()
+
+    def resolve_key(self, manychat_id: str) -> Optional[ContactKey]:
+        """
+        Retorna (id, channel_id) del contacto sin cargar la fila ORM completa.
+        Usar en las rutas que solo necesitan la clave; None si el contacto no existe.
+        """
+        return self.resolve_keys([manychat_id]).get(manychat_id)
+
+    def resolve_keys(self, manychat_ids: Sequence[str]) -> Dict[str, ContactKey]:
+        """
+        Resuelve una lista de manychat_id. Los que no están en caché se buscan con una
+        sola consulta por bloque (solo id y channel_id); los no encontrados no aparecen
+        en el resultado y tampoco se guardan en caché.
+        """
+        found: Dict[str, ContactKey] = {}
+        missing: List[str] = []
+        for manychat_id in dict.fromkeys(manychat_ids):
+            key = contact_key_cache.get("Contact", manychat_id)
+            if key is MISSING:
+                missing.append(manychat_id)
+            else:
+                found[manychat_id] = key
+        pending = self.db.info.get("pending_contact_keys", {})
+        for start in range(0, len(missing), MSSQL_MAX_PARAMS):
+            # Solo columnas: se ejecuta en Core sobre la conexión de la sesión, sin pasar por el ORM.
+            rows = self.db.connection().execute(
+                _CONTACT_KEYS_BY_MANYCHAT_IDS,
+                {"manychat_ids": _padded_in_values(missing[start:start + MSSQL_MAX_PARAMS])},
+            )
+            for manychat_id, contact_id, channel_id in rows:
+                found[manychat_id] = ContactKey(contact_id, channel_id)
+                # Una fila escrita por esta misma transacción se publica al hacer commit.
+                if manychat_id not in pending:
+                    contact_key_cache.set("Contact", manychat_id, found[manychat_id])
+        return found
+
+    def count(self) -> int:
+        return self.db.scalar(select(func.count()).select_from(Contact))
+
+    def stream_manychat_ids(self, after_id: int = 0, batch_size: int = 5000) -> Iterator[Tuple[int, str]]:
+        """
+        Recorre (id, manychat_id) de los contactos con id > after_id en orden de id,
+        leyendo el resultado por bloques (yield_per) en lugar de cargarlo entero en memoria.
+        """
+        result = self.db.execute(
+            select(Contact.id, Contact.manychat_id)
+            .where(Contact.id > after_id)
+            .order_by(Contact.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for contact_id, manychat_id in result:
+            yield contact_id, manychat_id
+
+    def set_odoo_lead_id(self, contact_id: int, odoo_lead_id: Optional[int]) -> None:
+        """Guarda (o borra, con None) el id de la oportunidad de Odoo del contacto."""
+        self.db.execute(
+            update(Contact)
+            .where(Contact.id == contact_id)
+            .values(odoo_lead_id=odoo_lead_id)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _remember_keys(self, contacts: Sequence[Contact]) -> None:
+        pending = self.db.info.setdefault("pending_contact_keys", {})
+        for contact in contacts:
+            pending[contact.manychat_id] = ContactKey(contact.id, contact.channel_id)
         
     def create_or_update(self, contact_data: Dict[str, Any]) -> Contact:
         """
-        Crea un nuevo contacto o actualiza uno existente (UPSERT)
+        Crea un nuevo contacto o actualiza uno existente (UPSERT atómico)
         basado en el manychat_id. Filtra los campos para evitar errores por campos no válidos.
         """
-        # Solo los campos válidos del modelo Contact
-        valid_fields = {c.name for c in Contact.__table__.columns}
-        filtered_data = {k: v for k, v in contact_data.items() if k in valid_fields}
-        existing_contact = self.get_by_manychat_id(filtered_data["manychat_id"])
-        
-        if existing_contact:
-            for key, value in filtered_data.items():
-                if hasattr(existing_contact, key) and value is not None:
-                    setattr(existing_contact, key, value)
-            contact = existing_contact
-        else:
-            contact = Contact(**filtered_data)
-            self.db.add(contact)
-        self.db.commit()
-        self.db.refresh(contact)
+        contact = upsert_rows(self.db, Contact, [contact_data], index_elements=["manychat_id"])[0]
+        self._remember_keys([contact])
         return contact
 
+    def bulk_create_or_update(self, contacts_data: List[Dict[str, Any]]) -> List[Contact]:
+        """UPSERT por lotes de contactos basado en manychat_id, en un round trip por lote."""
+        contacts = upsert_rows(self.db, Contact, contacts_data, index_elements=["manychat_id"])
+        self._remember_keys(contacts)
+        return contacts
+
 class ContactStateRepository:
     def __init__(self, db: Session):
         self.db = db
         
     def create_or_update(self, contact_id: int, state: str, category: str = "manychat") -> ContactState:
         """
-        Crea o actualiza el estado del contacto: si existe un registro previo, lo actualiza; si no, lo crea.
-        Siempre habrá solo un registro por contacto.
+        Registra un cambio de estado del contacto. Contact_State es un historial append-only:
+        cada transición es una fila nueva y Contact.current_state_id apunta a la última
+        (se actualiza en la misma transacción). Si el estado no cambia respecto al actual,
+        no se inserta nada y se retorna el registro actual, aunque llegue con otra categoría:
+        el historial solo guarda transiciones reales (tiempo en cada etapa).
         """
         latest = self.get_latest_by_contact(contact_id)
-        if latest:
-            latest.state = state
-            latest.category = category
-            self.db.commit()
-            self.db.refresh(latest)
+        if latest and latest.state == state:
             return latest
-        else:
-            contact_state = ContactState(
-                contact_id=contact_id,
-                state=state,
-                category=category
-            )
-            self.db.add(contact_state)
-            self.db.commit()
-            self.db.refresh(contact_state)
-            return contact_state
+        contact_state = ContactState(
+            contact_id=contact_id,
+            state=state,
+            category=category
+        )
+        self.db.add(contact_state)
+        self.db.flush()
+        # Solo avanza: si dos transacciones registran estados a la vez, queda el de id mayor.
+        self.db.execute(_ADVANCE_CURRENT_STATE, {"contact_id": contact_id, "state_id": contact_state.id})
+        return contact_state
         
     def get_latest_by_contact(self, contact_id: int) -> Optional[ContactState]:
-        """Obtiene el último estado registrado para un contacto."""
+        """Obtiene el estado actual del contacto (búsqueda por clave primaria vía Contact.current_state_id)."""
+        latest = self.db.scalars(_CURRENT_STATE_BY_CONTACT, {"contact_id": contact_id}).first()
+        if latest is not None:
+            return latest
+        # Contactos sin puntero (p. ej. estados insertados fuera del repositorio)
+        return self.db.scalars(_LATEST_STATE_BY_CONTACT, {"contact_id": contact_id}).first()
+
+    def get_history_by_contact(self, contact_id: int) -> List[ContactState]:
+        """Historial completo de transiciones del contacto, de la más antigua a la más reciente."""
         return self.db.query(ContactState).filter(
             ContactState.contact_id == contact_id
-        ).order_by(ContactState.created_at.desc()).first()
+        ).order_by(ContactState.created_at, ContactState.id).all()
 
 class ChannelRepository:
     def __init__(self, db: Session):
         self.db = db
         
+    def get_by_name(self, name: str) -> Optional[Channel]:
+        """Obtiene un canal por nombre (a través de la caché de referencia)."""
+        return _cached_lookup(
+            self.db, Channel, "name", name,
+            lambda: self.db.scalars(_CHANNEL_BY_NAME, {"name": name}).first(),
+        )
+
     def get_or_create_by_name(self, name: str) -> Channel:
-        """Obtiene un canal por nombre o lo crea si no existe."""
-        channel = self.db.query(Channel).filter(Channel.name == name).first()
-        if not channel:
-            channel = Channel(name=name, description=f"Auto-created: {name}")
-            self.db.add(channel)
-            self.db.commit()
-            self.db.refresh(channel)
+        """
+        Obtiene un canal por nombre o lo crea si no existe.
+        Seguro ante concurrencia: si otra request o worker crea el mismo canal a la vez,
+        el índice único ux_channel_name hace fallar el segundo INSERT, que se deshace en
+        su savepoint sin afectar la transacción del llamador, y se lee el canal ya creado.
+        """
+        channel = self.get_by_name(name)
+        if channel:
+            return channel
+        try:
+            with self.db.begin_nested():
+                channel = Channel(name=name, description=f"Auto-created: {name}")
+                self.db.add(channel)
+        except IntegrityError:
+            return self.db.query(Channel).filter(Channel.name == name).one()
+        # Aún no confirmado: no debe entrar a la caché hasta que otra lectura lo encuentre.
+        _mark_uncommitted(self.db, Channel, ("name", name))
         return channel
 
 class CampaignRepository: 
@@ -101,59 +359,225 @@ class CampaignRepository:
                 status="active"
             )
             self.db.add(campaign)
-            self.db.commit()
-            self.db.refresh(campaign)
+            self.db.flush()
         return campaign
 
     def get_by_id(self, campaign_id: int) -> Optional[Campaign]:
-        """Obtiene una campaña por su ID entero."""
-        return self.db.query(Campaign).filter(Campaign.id == campaign_id).first()
+        """Obtiene una campaña por su ID entero (a través de la caché de referencia)."""
+        return _cached_lookup(
+            self.db, Campaign, "id", campaign_id,
+            lambda: self.db.scalars(_CAMPAIGN_BY_ID, {"campaign_id": campaign_id}).first(),
+        )
 
 class AdvisorRepository: 
     def __init__(self, db: Session):
         self.db = db
 
     def get_by_id_or_email(self, identifier: str) -> Optional[Advisor]: 
-        """Obtiene un asesor por su ID o email."""
+        """Obtiene un asesor por su ID o email (a través de la caché de referencia)."""
+        return _cached_lookup(
+            self.db, Advisor, "id_or_email", str(identifier),
+            lambda: self._load_by_id_or_email(identifier),
+        )
+
+    def _load_by_id_or_email(self, identifier: str) -> Optional[Advisor]:
         try:
             advisor_id = int(identifier)
-            return self.db.query(Advisor).filter(Advisor.id == advisor_id).first()
+            return self.db.scalars(_ADVISOR_BY_ID, {"advisor_id": advisor_id}).first()
         except ValueError: # Si no es un entero, intenta buscar por email o nombre
-            return self.db.query(Advisor).filter(
-                or_(Advisor.email == identifier, Advisor.name == identifier)
-            ).first()
+            return self.db.scalars(_ADVISOR_BY_EMAIL_OR_NAME, {"identifier": identifier}).first()
 
 class CampaignContactRepository: 
     def __init__(self, db: Session):
         self.db = db
 
+    def get_by_contact_and_campaign(
+        self, contact_id: int, campaign_id: int, with_relations: bool = False
+    ) -> Optional[CampaignContact]:
+        """
+        Obtiene la asignación de un contacto a una campaña. Con `with_relations` trae en la
+        misma consulta la campaña, el contacto y los asesores (CAMPAIGN_CONTACT_RELATIONS).
+        """
+        statement = _CAMPAIGN_CONTACT_WITH_RELATIONS_BY_KEY if with_relations else _CAMPAIGN_CONTACT_BY_KEY
+        return self.db.scalars(statement, {"contact_id": contact_id, "campaign_id": campaign_id}).first()
+
     def create_or_update_assignment(self, data: Dict[str, Any]) -> CampaignContact: 
-        """Crea una nueva asignación de CampaignContact o actualiza una existente (UPSERT)."""
-        from datetime import datetime, timezone
-        # Busca por contact_id y campaign_id para evitar duplicados de asignación
-        existing = self.db.query(CampaignContact).filter(
-            CampaignContact.contact_id == data["contact_id"],
-            CampaignContact.campaign_id == data["campaign_id"]
-        ).first()
-
-        if existing:
-            for key, value in data.items():
-                if hasattr(existing, key) and value is not None:
-                    setattr(existing, key, value)
-            # Marcar como nuevo para que el worker CRM lo procese
-            existing.sync_status = "new"
-            campaign_contact = existing
-        else:
-            # Si no viene registration_date, usar ahora en UTC
-            if "registration_date" not in data or data["registration_date"] is None:
-                data["registration_date"] = datetime.now(timezone.utc)
-            data["sync_status"] = "new"
-            campaign_contact = CampaignContact(**data)
-            self.db.add(campaign_contact)
+        """Crea una nueva asignación de CampaignContact o actualiza una existente (UPSERT atómico)."""
+        return self.bulk_create_or_update_assignments([data])[0]
 
-        self.db.commit()
-        self.db.refresh(campaign_contact)
-        return campaign_contact
+    def bulk_create_or_update_assignments(self, rows: List[Dict[str, Any]]) -> List[CampaignContact]:
+        """
+        UPSERT por lotes de asignaciones, identificadas por (contact_id, campaign_id).
+        - sync_status siempre queda en 'new' para que el worker CRM procese el cambio en Odoo.
+        - registration_date conserva la primera fecha de registro; si no viene, se usa ahora en UTC.
+        """
+        now = datetime.now(timezone.utc)
+        prepared = []
+        for data in rows:
+            row = dict(data)
+            if row.get("registration_date") is None:
+                row["registration_date"] = now
+            row["sync_status"] = "new"
+            prepared.append(row)
+        return upsert_rows(
+            self.db, CampaignContact, prepared,
+            index_elements=["contact_id", "campaign_id"],
+            preserve_existing=["registration_date"],
+        )
+
+    def claim_pending(self, owner: str, limit: int, lease_seconds: int) -> List[CampaignContact]:
+        """
+        Reclama de forma atómica hasta `limit` asignaciones pendientes de sincronizar
+        ('new', 'updated', 'error' o 'processing' con el lease vencido): pasan a 'processing'
+        a nombre de `owner` hasta que venza el lease. Varias instancias del worker pueden
+        reclamar a la vez sin tomar la misma fila.
+        - SQL Server: UPDATE ... OUTPUT sobre un SELECT TOP (n) WITH (ROWLOCK, READPAST, UPDLOCK):
+          las filas que otro worker tiene bloqueadas se saltan en lugar de esperar.
+        - Postgres: FOR UPDATE SKIP LOCKED. SQLite: el UPDATE ya toma el único bloqueo de escritura.
+        """
+        now = datetime.now(timezone.utc)
+        claimable = (
+            select(CampaignContact.id)
+            .where(or_(
+                CampaignContact.sync_status.in_(CAMPAIGN_CONTACT_PENDING_STATUSES),
+                (CampaignContact.sync_status == "processing") & (CampaignContact.lease_expires_at < now),
+            ))
+            .order_by(CampaignContact.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .with_hint(CampaignContact, "WITH (ROWLOCK, READPAST, UPDLOCK)", "mssql")
+        )
+        stmt = (
+            update(CampaignContact)
+            .where(CampaignContact.id.in_(claimable.scalar_subquery()))
+            .values(
+                sync_status="processing",
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+            )
+            .returning(CampaignContact)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        return sorted(self.db.scalars(stmt).all(), key=lambda cc: cc.id)
+
+    def finish_claim(self, campaign_contact_id: int, owner: str, sync_status: str, **values: Any) -> bool:
+        """
+        Cierra el lease de `owner` dejando la fila en `sync_status` (más los `values` dados).
+        Si el lease venció y otra instancia la reclamó, o la API volvió a marcarla como 'new'
+        mientras se procesaba, no se toca y retorna False.
+        """
+        result = self.db.execute(
+            update(CampaignContact)
+            .where(
+                CampaignContact.id == campaign_contact_id,
+                CampaignContact.sync_status == "processing",
+                CampaignContact.lease_owner == owner,
+            )
+            .values(sync_status=sync_status, lease_owner=None, lease_expires_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+class OutboxRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add(self, queue_name: str, event_data: Dict[str, Any]) -> Outbox:
+        """
+        Registra un evento pendiente de publicar en la cola indicada.
+        El evento se confirma junto con la transacción del llamador.
+        """
+        message = Outbox(
+            queue_name=queue_name,
+            payload=json.dumps(event_data, default=_json_default),
+            status="pending",
+            attempts=0,
+        )
+        self.db.add(message)
+        self.db.flush()
+        return message
+
+    def get_pending(self, limit: int = 100) -> List[Outbox]:
+        """Obtiene los eventos pendientes más antiguos, en orden de creación."""
+        return self.db.query(Outbox).filter(
+            Outbox.status == "pending"
+        ).order_by(Outbox.id).limit(limit).all()
+
+    def claim_pending(self, owner: str, limit: int, lease_seconds: int) -> List[Outbox]:
+        """
+        Reclama de forma atómica hasta `limit` eventos ('pending' o 'publishing' con el lease
+        vencido): pasan a 'publishing' a nombre de `owner` hasta que venza el lease. Varias
+        instancias del relay pueden reclamar a la vez sin publicar el mismo evento.
+        Mismo mecanismo que CampaignContactRepository.claim_pending (READPAST/UPDLOCK en
+        SQL Server, SKIP LOCKED en Postgres, RETURNING/OUTPUT para leer las filas reclamadas).
+        """
+        now = datetime.now(timezone.utc)
+        claimable = (
+            select(Outbox.id)
+            .where(or_(
+                Outbox.status == "pending",
+                (Outbox.status == "publishing") & (Outbox.lease_expires_at < now),
+            ))
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .with_hint(Outbox, "WITH (ROWLOCK, READPAST, UPDLOCK)", "mssql")
+        )
+        stmt = (
+            update(Outbox)
+            .where(Outbox.id.in_(claimable.scalar_subquery()))
+            .values(status="publishing", lease_owner=owner, lease_expires_at=now + timedelta(seconds=lease_seconds))
+            .returning(Outbox)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        return sorted(self.db.scalars(stmt).all(), key=lambda m: m.id)
+
+    def _owned_by(self, query, owner: Optional[str]):
+        """Con `owner`, limita la consulta a los eventos cuyo lease sigue siendo suyo."""
+        if owner is None:
+            return query
+        return query.filter(Outbox.status == "publishing", Outbox.lease_owner == owner)
+
+    def mark_sent(self, ids: List[int], owner: Optional[str] = None) -> None:
+        """
+        Marca un lote de eventos como publicados con un único UPDATE.
+        Con `owner` solo se tocan los eventos que ese relay aún tiene reclamados.
+        """
+        if not ids:
+            return
+        self._owned_by(self.db.query(Outbox).filter(Outbox.id.in_(ids)), owner).update(
+            {
+                Outbox.status: "sent",
+                Outbox.sent_at: datetime.now(timezone.utc),
+                Outbox.lease_owner: None,
+                Outbox.lease_expires_at: None,
+            },
+            synchronize_session=False
+        )
+
+    def mark_failed(self, failures: Dict[int, str], max_attempts: int, owner: Optional[str] = None) -> None:
+        """
+        Registra el error de cada evento fallido y lo devuelve a 'pending'. Tras
+        `max_attempts` intentos el evento queda en estado 'failed' y el relay deja de
+        reintentarlo. Con `owner` solo se tocan los eventos que ese relay aún tiene reclamados.
+        """
+        if not failures:
+            return
+        current_attempts = self._owned_by(
+            self.db.query(Outbox.id, Outbox.attempts).filter(Outbox.id.in_(list(failures))), owner
+        ).all()
+        updates = []
+        for message_id, attempts in current_attempts:
+            attempts = (attempts or 0) + 1
+            updates.append({
+                "id": message_id,
+                "attempts": attempts,
+                "last_error": failures[message_id][:1000],
+                "status": "failed" if attempts >= max_attempts else "pending",
+                "lease_owner": None,
+                "lease_expires_at": None,
+            })
+        bulk_update(self.db, Outbox, updates)
 
 # --- 🚀 NUEVO REPOSITORIO AÑADIDO 🚀 ---
 class AddressRepository:
@@ -172,9 +596,9 @@ class AddressRepository:
         Returns:
             La nueva instancia de Address si el contacto fue encontrado, o None si no.
         """
-        # 1. Buscar el contacto por su manychat_id
+        # 1. Resolver el id del contacto por su manychat_id (sin cargar la fila completa)
         contact_repo = ContactRepository(self.db)
-        contact = contact_repo.get_by_manychat_id(manychat_id)
+        contact = contact_repo.resolve_key(manychat_id)
 
         if not contact:
             logging.warning(f"No se encontró un contacto con manychat_id: {manychat_id}. No se pudo añadir la dirección.")
@@ -188,10 +612,9 @@ class AddressRepository:
         # 3. Asociar la nueva dirección al contacto encontrado
         new_address.contact_id = contact.id
         
-        # 4. Guardar en la base de datos
+        # 4. Guardar en la base de datos (el commit lo hace la unidad de trabajo)
         self.db.add(new_address)
-        self.db.commit()
-        self.db.refresh(new_address)
+        self.db.flush()
         
         logging.info(f"Dirección añadida correctamente al contacto {contact.id} ({manychat_id}).")
         
@@ -1,8 +1,18 @@
+import asyncio
+import time
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine, URL, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
-from contextlib import contextmanager
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from contextlib import asynccontextmanager, contextmanager
 from app.core.config import get_settings
-from typing import Generator
+from app.db.dialects import dialect_for, enable_sqlite_savepoints  # noqa: F401 (reexportado)
+from app.db.governor import DBGovernor
+from app.db.pool_metrics import PoolMetrics, instrument_engine, instrumented_pool_class
+from app.core.logging import logger
+from typing import Any, AsyncGenerator, Dict, Generator, Optional, Tuple
 
 # --- 1. Base Declarativa para Modelos SQLAlchemy ---
 # Todos tus modelos de base de datos (tablas) deben heredar de 'Base'.
@@ -14,50 +24,73 @@ Base = declarative_base()
 # Configuraciones del pool de conexiones para mejor rendimiento y estabilidad:
 settings = get_settings() # Obtiene la instancia de configuración
 
-# Determina si es una base de datos SQLite en memoria
-# Esto es CRÍTICO para los tests.
-is_sqlite_in_memory = settings.DATABASE_URL == "sqlite:///:memory:"
+def pool_limits() -> Tuple[int, int]:
+    """(pool_size, max_overflow) según DB_ROLE: la API y los workers tienen pools distintos."""
+    if settings.DB_ROLE == "worker":
+        return settings.DB_WORKER_POOL_SIZE, settings.DB_WORKER_MAX_OVERFLOW
+    return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
 
-# Argumentos base para create_engine
-engine_args = {
-    "url": settings.DATABASE_URL,
-    "echo": settings.DEBUG,
-}
+def _engine_args(url: URL, is_async: bool = False, pool: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """
+    Argumentos de create_engine/create_async_engine adecuados para cada dialecto.
 
-# Añade condicionalmente los argumentos de pool si NO es SQLite en memoria
-if not is_sqlite_in_memory:
-    engine_args.update({
-        "pool_size": 20,
-        "max_overflow": 0, # No permite conexiones adicionales más allá de pool_size
-        "pool_recycle": 3600, # Recicla (cierra y reabre) conexiones cada 3600 segundos (1 hora)
-                              # Esto previene problemas de timeout con la base de datos.
-    })
-
-# Configura connect_args.
-connect_args = {
-    "timeout": 30, # Tiempo de espera para establecer una conexión
-}
+    Los connect_args y las opciones propias de cada driver (fast_executemany en
+    SQL Server + pyodbc/aioodbc, executemany_mode en psycopg2, timeouts) los define
+    el dialecto en app/db/dialects.py. Aquí se agregan las opciones comunes:
+    - 'insertmanyvalues_page_size' controla cuántas filas agrupa SQLAlchemy por
+      sentencia INSERT ... VALUES cuando se necesita RETURNING.
+    - Pool instrumentado con los límites de pool_limits() o los de `pool`
+      = (pool_size, max_overflow).
+    """
+    backend = url.get_backend_name()
 
-# 'prepared_statement_cache_size' es específico de ciertos dialectos (como SQL Server)
-# y puede causar TypeError con SQLite.
-if not is_sqlite_in_memory:
-    connect_args["prepared_statement_cache_size"] = 0
+    # Determina si es una base de datos SQLite en memoria
+    # Esto es CRÍTICO para los tests.
+    is_sqlite_in_memory = backend == "sqlite" and url.database in (None, "", ":memory:")
 
-# Para SQLite, 'check_same_thread=False' es a menudo necesario para multithreading con FastAPI
-if is_sqlite_in_memory:
-    connect_args["check_same_thread"] = False
+    # Argumentos base para create_engine
+    engine_args = {
+        "url": url,
+        "echo": settings.DB_ECHO,
+        "insertmanyvalues_page_size": settings.DB_INSERTMANYVALUES_PAGE_SIZE,
+    }
 
-engine_args["connect_args"] = connect_args
+    # Añade condicionalmente los argumentos de pool si NO es SQLite en memoria
+    if not is_sqlite_in_memory:
+        pool_size, max_overflow = pool or pool_limits()
+        engine_args.update({
+            # Pool instrumentado: mide la espera por conexión (ver app/db/pool_metrics.py)
+            "poolclass": instrumented_pool_class(AsyncAdaptedQueuePool if is_async else QueuePool),
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": settings.DB_POOL_TIMEOUT, # Espera máxima por una conexión libre del pool
+            "pool_recycle": settings.DB_POOL_RECYCLE, # Recicla (cierra y reabre) conexiones periódicamente
+                                                      # Esto previene problemas de timeout con la base de datos.
+        })
+
+    engine_args.update(dialect_for(url).engine_options(url, is_async=is_async))
+    return engine_args
+
+def create_db_engine(database_url: Optional[str] = None, pool: Optional[Tuple[int, int]] = None) -> Engine:
+    """Crea el motor síncrono de SQLAlchemy (pyodbc en producción; Postgres o un archivo SQLite en local)."""
+    url = make_url(database_url or settings.DATABASE_URL)
+    db_engine = create_engine(**_engine_args(url, pool=pool))
+    dialect_for(url).configure_engine(db_engine)
+    return db_engine
 
 # Crea el motor con los argumentos preparados
-engine = create_engine(**engine_args)
+engine = create_db_engine()
+
+# Telemetría de los pools por nombre de motor ("db" y, al crearse, "async-db").
+pool_metrics: Dict[str, PoolMetrics] = {"db": instrument_engine(engine, "db")}
 
 
 # --- 3. Configuración del Constructor de Sesiones ---
 # 'SessionLocal' es una "fábrica" que crea nuevas sesiones de base de datos.
 # autocommit=False: Debes hacer commit explícitamente para guardar los cambios.
 # autoflush=False: Los objetos no se "flushean" automáticamente a la base de datos antes de un commit.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: Los objetos conservan sus valores tras el commit, sin un SELECT de refresco.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # --- 4. Context Manager para Sesiones de Base de Datos (Recomendado) ---
 # Usa esta función con la sentencia 'with' para garantizar que la sesión se abra
@@ -78,16 +111,114 @@ def get_db_session() -> Generator[Session, None, None]:
     finally:
         db.close()  # Siempre cierra la sesión, liberando la conexión al pool
 
+# --- 4b. Unidad de Trabajo (Unit of Work) ---
+# Los repositorios solo hacen flush; el commit se hace una sola vez al final de la
+# operación de servicio. Así un evento completo es una única transacción.
+@contextmanager
+def unit_of_work() -> Generator[Session, None, None]:
+    """
+    Proporciona una sesión transaccional: hace commit al salir del bloque sin errores
+    y rollback si ocurre una excepción.
+    Uso: with unit_of_work() as db: ...
+    """
+    with get_db_session() as db:
+        yield db
+        db.commit()
+
+# --- 4c. Control de Concurrencia (ver app/db/governor.py) ---
+# Un governor por motor, con tantos turnos como conexiones tiene su pool. Las
+# dependencias de FastAPI reservan un turno antes de abrir la sesión: si el pool
+# está lleno y la cola de espera también, la request recibe un 503 al instante.
+def _create_governor(name: str, pool: Optional[Tuple[int, int]] = None) -> DBGovernor:
+    pool_size, max_overflow = pool or pool_limits()
+    return DBGovernor(
+        max_concurrency=pool_size + max_overflow,
+        max_waiting=settings.DB_MAX_WAITING,
+        wait_timeout=settings.DB_ADMISSION_TIMEOUT,
+        name=name,
+    )
+
+db_governor = _create_governor("db")
+async_db_governor = _create_governor("async-db")
+
 # --- 5. Función de Utilidad para Frameworks (e.g., FastAPI) ---
 # Esta función es ideal para usarla como una "dependencia" en frameworks web.
 def get_db() -> Generator[Session, None, None]:
     """
     Proporciona una sesión de base de datos para dependencias de frameworks (como FastAPI).
     La sesión se cierra automáticamente después de que el endpoint ha sido procesado.
+    Lanza DBOverloadedError (503) si no hay turno libre en el pool.
     Uso (en FastAPI): db: Session = Depends(get_db)
     """
-    with get_db_session() as db:
-        yield db
+    with db_governor.slot():
+        with get_db_session() as db:
+            yield db
+
+# --- 5b. Réplica de lectura ---
+# Los reportes y listados pueden leerse de una réplica (en Azure SQL, la réplica de
+# lectura a la que se llega con ApplicationIntent=ReadOnly) para no competir con la
+# ingesta de webhooks y los workers en el primario. Cada endpoint declara cuántos
+# segundos de retraso tolera: si es menos que DB_REPLICA_MAX_LAG, si no hay réplica
+# configurada o si la réplica falló hace poco, la lectura va al primario.
+def read_only_url(database_url: str) -> URL:
+    """Añade ApplicationIntent=ReadOnly a una URL de SQL Server (pyodbc/aioodbc) si no lo tiene."""
+    url = make_url(database_url)
+    if url.get_backend_name() != "mssql" or "applicationintent" in str(url).lower():
+        return url
+    odbc_connect = url.query.get("odbc_connect")
+    if odbc_connect:
+        return url.update_query_dict({"odbc_connect": odbc_connect.rstrip(";") + ";ApplicationIntent=ReadOnly"})
+    return url.update_query_dict({"ApplicationIntent": "ReadOnly"})
+
+read_engine: Optional[Engine] = None
+read_db_governor: Optional[DBGovernor] = None
+if settings.DATABASE_READ_URL:
+    _read_pool = (settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW)
+    read_engine = create_db_engine(read_only_url(settings.DATABASE_READ_URL).render_as_string(hide_password=False), pool=_read_pool)
+    read_db_governor = _create_governor("read-db", pool=_read_pool)
+    pool_metrics["read-db"] = instrument_engine(read_engine, "read-db")
+
+_replica_down_until = 0.0
+
+def _replica_usable(max_staleness: float) -> bool:
+    return (
+        read_engine is not None
+        and max_staleness >= settings.DB_REPLICA_MAX_LAG
+        and time.monotonic() >= _replica_down_until
+    )
+
+@contextmanager
+def read_connection(max_staleness: float) -> Generator[Connection, None, None]:
+    """
+    Conexión para una lectura que tolera hasta `max_staleness` segundos de retraso.
+    Usa la réplica si es posible y, si no se puede conectar, vuelve al primario.
+    Reserva el turno del governor del motor elegido (503 si está saturado).
+    """
+    global _replica_down_until
+    if _replica_usable(max_staleness):
+        with read_db_governor.slot():
+            try:
+                connection = read_engine.connect()
+            except DBAPIError as e:
+                _replica_down_until = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+                logger.warning(f"Réplica de lectura no disponible, se usa el primario durante {settings.DB_REPLICA_RETRY_SECONDS}s: {e}")
+            else:
+                with connection:
+                    yield connection
+                return
+    with db_governor.slot(), engine.connect() as connection:
+        yield connection
+
+def read_db(max_staleness: float):
+    """
+    Dependencia de FastAPI para endpoints de solo lectura que toleran datos con hasta
+    `max_staleness` segundos de retraso. Uso: db: Session = Depends(read_db(max_staleness=60))
+    """
+    def get_read_db() -> Generator[Session, None, None]:
+        with read_connection(max_staleness) as connection:
+            with SessionLocal(bind=connection) as db:
+                yield db
+    return get_read_db
 
 # --- 6. Función específica para Workers ---
 # Esta función es para ser usada explícitamente por tus workers asíncronos.
@@ -99,6 +230,121 @@ def get_db_session_worker() -> Generator[Session, None, None]: # <--- FUNCIÓN A
     with get_db_session() as db:
         yield db
 
+# --- 6b. Motor y Sesiones Asíncronas ---
+# Los endpoints 'async def' y los workers asyncio deben usar esta ruta: con un driver
+# asíncrono (aioodbc para SQL Server, aiosqlite en local) cada consulta cede el event
+# loop mientras espera a la base de datos, en lugar de bloquear todas las requests.
+# El motor se crea de forma perezosa para que los procesos que solo usan la ruta
+# síncrona no necesiten tener instalados los drivers asíncronos.
+ASYNC_DRIVERS = {
+    "mssql": "aioodbc",
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+def to_async_url(database_url: str) -> URL:
+    """Traduce una URL síncrona (p. ej. mssql+pyodbc) a su equivalente asíncrono (mssql+aioodbc)."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No hay driver asíncrono configurado para el dialecto '{backend}'.")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+def create_async_db_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """Crea el motor asíncrono con los mismos argumentos de pool y dialecto que el síncrono."""
+    url = to_async_url(database_url or settings.DATABASE_URL)
+    async_engine = create_async_engine(**_engine_args(url, is_async=True))
+    dialect_for(url).configure_engine(async_engine.sync_engine)
+    return async_engine
+
+_async_engine: Optional[AsyncEngine] = None
+
+def get_async_engine() -> AsyncEngine:
+    """Devuelve el motor asíncrono del proceso, creándolo en el primer uso."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_db_engine()
+        pool_metrics["async-db"] = instrument_engine(_async_engine, "async-db")
+    return _async_engine
+
+# Misma configuración que SessionLocal; el motor se asigna al abrir cada sesión.
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+@asynccontextmanager
+async def get_async_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Equivalente asíncrono de get_db_session: rollback si hay error y cierre garantizado.
+    Uso: async with get_async_db_session() as db: ...
+    """
+    db = AsyncSessionLocal(bind=get_async_engine())
+    try:
+        yield db
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+@asynccontextmanager
+async def async_unit_of_work() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Equivalente asíncrono de unit_of_work: un único commit al salir del bloque sin errores.
+    Uso: async with async_unit_of_work() as db: ...
+    """
+    async with get_async_db_session() as db:
+        yield db
+        await db.commit()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependencia de FastAPI para endpoints 'async def'.
+    Lanza DBOverloadedError (503) si no hay turno libre en el pool.
+    Uso: db: AsyncSession = Depends(get_async_db)
+    """
+    async with async_db_governor.async_slot():
+        async with get_async_db_session() as db:
+            yield db
+
+async def dispose_async_engine() -> None:
+    """Cierra las conexiones del motor asíncrono (al apagar la aplicación o el worker)."""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+# --- 6c. Pre-calentamiento y Telemetría del Pool ---
+def warm_up_pool(target_engine: Engine, connections: int) -> int:
+    """
+    Abre hasta `connections` conexiones y las devuelve al pool, para que las primeras
+    requests tras un despliegue no paguen el handshake ODBC. Retorna cuántas abrió.
+    """
+    opened = []
+    try:
+        for _ in range(min(connections, pool_limits()[0])):
+            opened.append(target_engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+async def warm_up_async_pool(connections: int) -> int:
+    """Equivalente asíncrono de warm_up_pool: abre las conexiones en paralelo."""
+    async_engine = get_async_engine()
+    count = min(connections, pool_limits()[0])
+    opened = await asyncio.gather(*(async_engine.connect().start() for _ in range(count)))
+    await asyncio.gather(*(connection.close() for connection in opened))
+    return len(opened)
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Estado de los pools y de los governors, para el endpoint de reportes."""
+    return {
+        "pools": {name: metrics.snapshot() for name, metrics in pool_metrics.items()},
+        "governors": {
+            governor.name: governor.stats()
+            for governor in (db_governor, async_db_governor, read_db_governor) if governor is not None
+        },
+    }
+
 # --- 7. Función para Verificar la Conexión a la Base de Datos ---
 # Útil para comprobar si tu aplicación puede conectarse al inicio.
 def check_database_connection():
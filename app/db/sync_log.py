@@ -0,0 +1,218 @@
+# app/db/sync_log.py
+"""
+Registro de auditoría en la tabla Sync_Log sin penalizar a quien lo escribe.
+
+Los workers y endpoints llaman a `sync_log.record(...)`, que solo agrega la entrada a
+un buffer en memoria y retorna: no abre conexión ni espera a la base. Un hilo de fondo
+vacía el buffer con un INSERT por lotes (la ruta masiva del dialecto, ver dialects.py)
+cuando se acumulan SYNC_LOG_BATCH_SIZE entradas o cada SYNC_LOG_FLUSH_SECONDS.
+
+- Si la base no responde, el lote vuelve al buffer y se reintenta en el siguiente ciclo.
+- El buffer tiene un máximo (SYNC_LOG_MAX_BUFFER): si se llena se descartan las entradas
+  más antiguas y se cuentan en `stats()["dropped"]`. La auditoría nunca frena el flujo.
+- El mismo hilo aplica la retención cada SYNC_LOG_MAINTENANCE_SECONDS: borra las filas
+  con más de SYNC_LOG_RETENTION_DAYS días y compacta (quita `details`) las exitosas con
+  más de SYNC_LOG_COMPACT_AFTER_DAYS días. 0 desactiva cada paso.
+- Al terminar el proceso (atexit) se escribe lo que quede en el buffer.
+"""
+import atexit
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+from app.core.logging import logger
+from app.db.dialects import MSSQL_MAX_PARAMS, dialect_for
+from app.db.models import SyncLog
+
+# Filas borradas o compactadas por sentencia: evita transacciones y bloqueos largos
+# (y el IN de ids no supera el límite de parámetros de SQL Server).
+MAINTENANCE_CHUNK = MSSQL_MAX_PARAMS
+
+
+class SyncLogRecorder:
+    def __init__(
+        self,
+        engine: Optional[Engine] = None,
+        batch_size: int = 200,
+        flush_seconds: float = 2.0,
+        max_buffer: int = 10000,
+        max_details: int = 2000,
+        retention_days: int = 90,
+        compact_after_days: int = 7,
+        maintenance_seconds: float = 3600,
+        enabled: bool = True,
+    ):
+        self._engine = engine
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_details = max_details
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self.maintenance_seconds = maintenance_seconds
+        self.enabled = enabled
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_maintenance = time.monotonic()
+        self._written = 0
+        self._dropped = 0
+        self._failed_flushes = 0
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            from app.db.session import engine
+            self._engine = engine
+        return self._engine
+
+    def record(
+        self,
+        source_system: str,
+        entity_type: str,
+        entity_id: Any,
+        action: str,
+        status: str,
+        details: Any = None,
+    ) -> None:
+        """Encola una entrada de auditoría. No bloquea ni lanza excepciones por la base."""
+        if not self.enabled:
+            return
+        if details is not None and not isinstance(details, str):
+            details = json.dumps(details, default=str, ensure_ascii=False)
+        if details and len(details) > self.max_details:
+            details = details[:self.max_details]
+        entry = {
+            "source_system": source_system[:50],
+            "entity_type": entity_type[:50],
+            "entity_id": str(entity_id)[:50],
+            "action": action[:20],
+            "status": status[:20],
+            "details": details,
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Escribe todo el buffer en lotes de `batch_size`. Retorna las filas insertadas."""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not batch:
+                return written
+            try:
+                with self.engine.begin() as connection:
+                    dialect_for(connection).bulk_insert(connection, SyncLog.__table__, batch)
+            except Exception as e:
+                # El lote vuelve al inicio del buffer; si no cabe, se pierden las más antiguas.
+                with self._lock:
+                    free = self._buffer.maxlen - len(self._buffer)
+                    self._dropped += max(0, len(batch) - free)
+                    self._buffer.extendleft(reversed(batch[-free:] if free else []))
+                    self._failed_flushes += 1
+                logger.warning(f"Sync_Log: no se pudo escribir un lote de {len(batch)} entradas: {e}")
+                return written
+            written += len(batch)
+            with self._lock:
+                self._written += len(batch)
+
+    def apply_retention(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Borra las entradas vencidas y compacta las exitosas antiguas, por tramos."""
+        now = now or datetime.now(timezone.utc)
+        result = {"deleted": 0, "compacted": 0}
+        if self.retention_days > 0:
+            cutoff = now - timedelta(days=self.retention_days)
+            result["deleted"] = self._chunked(
+                lambda ids: delete(SyncLog).where(SyncLog.id.in_(ids)),
+                SyncLog.created_at < cutoff,
+            )
+        if self.compact_after_days > 0:
+            cutoff = now - timedelta(days=self.compact_after_days)
+            result["compacted"] = self._chunked(
+                lambda ids: update(SyncLog).where(SyncLog.id.in_(ids)).values(details=None),
+                (SyncLog.created_at < cutoff) & (SyncLog.status == "success") & SyncLog.details.is_not(None),
+            )
+        return result
+
+    def _chunked(self, statement_for, condition) -> int:
+        total = 0
+        while True:
+            with self.engine.begin() as connection:
+                ids = connection.execute(
+                    select(SyncLog.id).where(condition).order_by(SyncLog.id).limit(MAINTENANCE_CHUNK)
+                ).scalars().all()
+                if not ids:
+                    return total
+                connection.execute(statement_for(ids))
+            total += len(ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "written": self._written,
+                "dropped": self._dropped,
+                "failed_flushes": self._failed_flushes,
+            }
+
+    def close(self) -> None:
+        """Detiene el hilo de fondo y escribe lo que quede en el buffer."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 5)
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="sync-log-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if self.maintenance_seconds and time.monotonic() - self._last_maintenance >= self.maintenance_seconds:
+                    self._last_maintenance = time.monotonic()
+                    result = self.apply_retention()
+                    if any(result.values()):
+                        logger.info("Sync_Log: retención aplicada.", **result)
+            except Exception as e:
+                logger.error(f"Error en el escritor de Sync_Log: {e}", exc_info=True)
+
+
+_settings = get_settings()
+sync_log = SyncLogRecorder(
+    batch_size=_settings.SYNC_LOG_BATCH_SIZE,
+    flush_seconds=_settings.SYNC_LOG_FLUSH_SECONDS,
+    max_buffer=_settings.SYNC_LOG_MAX_BUFFER,
+    max_details=_settings.SYNC_LOG_MAX_DETAILS,
+    retention_days=_settings.SYNC_LOG_RETENTION_DAYS,
+    compact_after_days=_settings.SYNC_LOG_COMPACT_AFTER_DAYS,
+    maintenance_seconds=_settings.SYNC_LOG_MAINTENANCE_SECONDS,
+    enabled=_settings.SYNC_LOG_ENABLED,
+)
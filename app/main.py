@@ -1,18 +1,24 @@
 # app/main.py
 
 # --- Imports de FastAPI y Python ---
-from fastapi import FastAPI, Request, Query, Depends, HTTPException
+import asyncio
+from fastapi import FastAPI, Request, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
 
 # --- Imports de tu aplicación ---
+from app.api.pagination import NEXT_CURSOR_HEADER
 from app.api.v1.router import router as api_v1_router
 from app.core.config import get_settings
 from app.core.logging import logger
-from app.db.models import Contact  # Modelo de la base de datos
-from app.db.session import get_db   # Dependencia para la sesión de BD
+from app.db.repositories import ContactRepository
+from app.db.session import (   # Dependencia para la sesión de BD
+    get_db_session, dispose_async_engine, db_governor, async_db_governor, read_db_governor, engine, warm_up_pool, warm_up_async_pool
+)
+from app.db.governor import DBOverloadedError
+from app.db.sync_log import sync_log
+from app.utils.bloom import known_contacts
 
 # --- Configuración de la Aplicación ---
 settings = get_settings()
@@ -62,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],  # el navegador debe poder leer el cursor de la página siguiente
 )
 
 # --- Routers ---
@@ -89,51 +96,110 @@ async def health_check():
     return {"status": "healthy"}
 
 # --- ENDPOINT DE VERIFICACIÓN (CORREGIDO) ---
+def _contact_exists(manychat_id: str) -> bool:
+    with get_db_session() as db:
+        # Solo se necesita saber si existe: se resuelve la clave (caché manychat_id -> id).
+        return ContactRepository(db).resolve_key(manychat_id) is not None
+
 @app.get(
     "/verificar-contacto",
     response_model=VerificationResponse,
     summary="Verifica si un contacto existe por manychat_id",
     tags=["Verificación"]
 )
-def verificar_contacto(
-    manychat_id: str = Query(..., description="ID de ManyChat a verificar en la base de datos"),
-    db: Session = Depends(get_db)  # Inyección de dependencia de la BD
+async def verificar_contacto(
+    manychat_id: str = Query(..., description="ID de ManyChat a verificar en la base de datos")
 ):
     """
     Verifica en la base de datos (Azure SQL) si ya existe un contacto
     con el `manychat_id` proporcionado.
+    Si el filtro de Bloom de contactos conocidos descarta el id y se refrescó hace
+    menos de CONTACT_FILTER_MAX_STALENESS segundos, responde "no" sin consultar la
+    base; un probable acierto o un filtro desactualizado llegan a Azure SQL.
     """
+    if settings.CONTACT_FILTER_ENABLED and not known_contacts.might_contain(manychat_id):
+        return {"existe": "no"}
     try:
-        # --- ✅ ESTA ES LA CORRECCIÓN ---
-        # Ahora usamos 'Contact.manychat_id' que es el nombre correcto de la columna.
-        contacto = db.query(Contact).filter(Contact.manychat_id == manychat_id).first()
-
-        if contacto:
-            return {"existe": "sí"}
-        else:
-            return {"existe": "no"}
-
+        existe = await db_governor.run(_contact_exists, manychat_id)
+    except DBOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error de base de datos al verificar contacto con manychat_id={manychat_id}: {e}")
         raise HTTPException(
             status_code=500,
             detail="Ocurrió un error interno al consultar la base de datos."
         )
-
+    return {"existe": "sí" if existe else "no"}
+
+def refresh_contact_filter(full: bool = False) -> int:
+    """Reconstruye (full) o actualiza de forma incremental el filtro de contactos conocidos."""
+    with get_db_session() as db:
+        repo = ContactRepository(db)
+        if full or not known_contacts.ready:
+            return known_contacts.rebuild(repo.stream_manychat_ids(), expected=repo.count())
+        return known_contacts.sync(repo.stream_manychat_ids(after_id=known_contacts.sync_from))
+
+async def contact_filter_loop():
+    """Carga el filtro al arrancar y lo mantiene al día: sync incremental y reconstrucción periódica."""
+    loop = asyncio.get_running_loop()
+    last_rebuild = None
+    while True:
+        full = last_rebuild is None or loop.time() - last_rebuild >= settings.CONTACT_FILTER_REBUILD_SECONDS
+        try:
+            count = await db_governor.offload(refresh_contact_filter, full)
+            if full:
+                last_rebuild = loop.time()
+                logger.info(f"Filtro de contactos reconstruido: {count} manychat_id conocidos")
+        except Exception as e:
+            # Hasta que cargue, /verificar-contacto consulta la base en cada request.
+            logger.warning(f"No se pudo actualizar el filtro de contactos: {e}")
+        await asyncio.sleep(settings.CONTACT_FILTER_SYNC_SECONDS)
 
 # --- Eventos de Ciclo de Vida ---
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 Iniciando MiaSalud Integration API...")
-    # Tu lógica de verificación de BD está bien aquí.
+    # Pre-calentar los pools: la primera ráfaga tras un despliegue no paga los handshakes ODBC.
+    if settings.DB_POOL_WARMUP > 0:
+        try:
+            opened_sync, opened_async = await asyncio.gather(
+                db_governor.offload(warm_up_pool, engine, settings.DB_POOL_WARMUP),
+                warm_up_async_pool(settings.DB_POOL_WARMUP),
+            )
+            logger.info(f"Pools de BD pre-calentados: {opened_sync} conexiones síncronas, {opened_async} asíncronas")
+        except Exception as e:
+            # No impide el arranque: las conexiones se abrirán bajo demanda.
+            logger.warning(f"No se pudo pre-calentar el pool de BD: {e}")
+    if settings.CONTACT_FILTER_ENABLED:
+        # En segundo plano: el recorrido de Contact no debe retrasar el arranque.
+        app.state.contact_filter_task = asyncio.create_task(contact_filter_loop())
     logger.info("✅ API iniciada exitosamente")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("👋 Cerrando MiaSalud Integration API...")
+    contact_filter_task = getattr(app.state, "contact_filter_task", None)
+    if contact_filter_task:
+        contact_filter_task.cancel()
+    await dispose_async_engine()
+    db_governor.shutdown()
+    async_db_governor.shutdown()
+    if read_db_governor:
+        read_db_governor.shutdown()
+    sync_log.close()
 
 
 # --- Manejadores de Excepciones Globales ---
+@app.exception_handler(DBOverloadedError)
+async def db_overloaded_handler(request: Request, exc: DBOverloadedError):
+    # Rechazo rápido: el pool de BD está lleno y también su cola de espera.
+    logger.warning(f"Request rechazada por saturación de la BD: {request.url.path} ({exc})")
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Servicio temporalmente saturado, reintente más tarde"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
     return JSONResponse(status_code=404, content={"error": "Endpoint no encontrado"})
@@ -1,26 +1,53 @@
 # app/services/odoo_crm_opportunity_service.py
 
-import xmlrpc.client
 import asyncio
-import time
+import random
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
+import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
 from app.core.config import get_settings # Asume que tienes un módulo de configuración
 from app.core.logging import logger # Asume que tienes un logger configurado
+from app.db.rate_limit import SQLTokenBucket
+from app.services.odoo_write_batcher import OdooWriteBatcher
+from app.utils.cache import MISSING, odoo_lead_cache
 
 # Excepción personalizada para errores específicos de Odoo
 class OdooServiceError(Exception):
     """Excepción para errores al interactuar con el servicio Odoo."""
     pass
 
+class OdooRPCError(OdooServiceError):
+    """Odoo respondió con un error: la llamada no se aplicó."""
+    pass
+
+class OdooTransportError(OdooServiceError):
+    """Fallo de red, timeout o respuesta HTTP inválida: no se sabe si Odoo aplicó la llamada."""
+    pass
+
+class OdooMissingRecordError(OdooRPCError):
+    """El registro pedido ya no existe en Odoo (odoo.exceptions.MissingError)."""
+    pass
+
+# Namespace de odoo_lead_cache: manychat_id -> id del crm.lead
+LEAD_CACHE_NAMESPACE = "crm.lead"
+
+# Un único bucket por proceso; el saldo real vive en Azure SQL y lo comparten todos los procesos.
+_settings = get_settings()
+odoo_rate_limiter = SQLTokenBucket(
+    "odoo",
+    rate=_settings.ODOO_RATE_LIMIT,
+    burst=_settings.ODOO_RATE_BURST,
+    shared=_settings.ODOO_RATE_LIMIT_SHARED,
+)
+
 # Manejo de reintentos con Tenacity para fallos de red o temporales
 # Intentará 3 veces, esperando exponencialmente (2s, 4s, 8s) y registrando antes de cada reintento
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=2, max=10),
     retry=retry_if_exception_type(
-        (xmlrpc.client.Fault, ConnectionRefusedError, TimeoutError, asyncio.TimeoutError)
+        (httpx.TransportError, ConnectionRefusedError, TimeoutError, asyncio.TimeoutError)
     ),
     before_sleep=before_sleep_log(logger, logger.warning)
 )
@@ -39,7 +66,11 @@ class OdooCRMOpportunityService:
         except Exception as e:
             logger.error(f"Error al obtener oportunidad Odoo por ID {opportunity_id}: {e}")
             return None
-    def __init__(self):
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        rate_limiter: Optional[SQLTokenBucket] = None,
+    ):
         settings = get_settings()
         self.url = settings.ODOO_URL
         self.db = settings.ODOO_DB
@@ -59,28 +90,89 @@ class OdooCRMOpportunityService:
         if missing:
             raise RuntimeError(f"Faltan variables de entorno Odoo requeridas: {', '.join(missing)}. Este servicio solo debe usarse si la integración Odoo está configurada.")
 
-        # Conexión XML-RPC para autenticación y llamadas comunes
-        self.common = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/common')
+        # Cliente HTTP asíncrono con conexiones keep-alive reutilizadas entre llamadas.
+        # Se crea al primer uso para quedar ligado al event loop del worker.
+        self.timeout = settings.ODOO_TIMEOUT
+        self.max_connections = settings.ODOO_MAX_CONNECTIONS
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._request_id = 0
+
         self.uid: Optional[int] = None # User ID, se obtiene en la autenticación
+        self._auth_lock = asyncio.Lock()
 
-        # Conexión para operaciones de modelos (lectura/escritura)
-        self.models: Optional[xmlrpc.client.ServerProxy] = None # Se inicializa después de la autenticación
+        # Fracción de escrituras que se releen para verificarlas (0 = nunca)
+        self.verify_sample_rate: float = settings.ODOO_VERIFY_SAMPLE_RATE
 
-        self.last_odoo_call_time: float = 0.0 # Para controlar la tasa de llamadas
+        # Control de tasa compartido con el resto de procesos que llaman a Odoo
+        self.rate_limiter = rate_limiter or odoo_rate_limiter
+
+        # Las escrituras y altas que llegan casi a la vez se envían juntas (ver odoo_write_batcher.py)
+        self.write_batcher = OdooWriteBatcher(
+            self._execute_odoo_call,
+            window=settings.ODOO_WRITE_BATCH_WINDOW,
+            max_batch=settings.ODOO_WRITE_BATCH_MAX,
+            # Solo un error devuelto por Odoo garantiza que el create agrupado no creó nada
+            create_retry_errors=(OdooRPCError,),
+        )
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.url.rstrip('/'),
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        """Cierra las conexiones abiertas con Odoo."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _rpc(self, service: str, method: str, *args) -> Any:
+        """Llamada JSON-RPC a /jsonrpc. No bloquea el event loop mientras espera a Odoo."""
+        self._request_id += 1
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"service": service, "method": method, "args": list(args)},
+            "id": self._request_id,
+        }
+        try:
+            response = await self._client().post("/jsonrpc", json=payload)
+            response.raise_for_status()
+            body = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Error de transporte con Odoo ({service}.{method}): {e}")
+            raise OdooTransportError(f"Error inesperado al comunicarse con Odoo: {e}")
+        error = body.get("error")
+        if error:
+            data = error.get("data") or {}
+            message = data.get("message") or error.get("message")
+            if str(data.get("name", "")).endswith("MissingError"):
+                raise OdooMissingRecordError(f"Error de Odoo RPC: {message}")
+            logger.error(f"Fallo de Odoo RPC: {error.get('code')} - {message}")
+            raise OdooRPCError(f"Error de Odoo RPC: {message}")
+        return body.get("result")
 
     async def _authenticate(self) -> int:
         """Autentica con Odoo y guarda el UID."""
-        if self.uid is None:
-            logger.info("Autenticando con Odoo...")
-            try:
-                self.uid = self.common.authenticate(self.db, self.username, self.password, {})
-                if not self.uid:
+        if self.uid is not None:
+            return self.uid
+        async with self._auth_lock:  # Una sola autenticación aunque haya llamadas concurrentes
+            if self.uid is None:
+                logger.info("Autenticando con Odoo...")
+                try:
+                    uid = await self._rpc("common", "authenticate", self.db, self.username, self.password, {})
+                except OdooServiceError as e:
+                    raise OdooServiceError(f"No se pudo autenticar con Odoo: {e}")
+                if not uid:
                     raise OdooServiceError("Fallo de autenticación con Odoo: UID no obtenido.")
-                self.models = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/object')
+                self.uid = uid
                 logger.info(f"Autenticación Odoo exitosa para usuario: {self.username}, UID: {self.uid}")
-            except Exception as e:
-                logger.error(f"Error durante la autenticación Odoo: {e}", exc_info=True)
-                raise OdooServiceError(f"No se pudo autenticar con Odoo: {e}")
         return self.uid
 
     async def _execute_odoo_call(self, model: str, method: str, *args, **kwargs) -> Any:
@@ -88,31 +180,12 @@ class OdooCRMOpportunityService:
         Ejecuta una llamada a la API de Odoo, controlando la tasa de solicitudes.
         """
         await self._authenticate() # Asegurar autenticación antes de cada llamada
-        
-        # Control de tasa de llamadas (1 req/s)
-        current_time = time.monotonic()
-        time_since_last_call = current_time - self.last_odoo_call_time
-        if time_since_last_call < 1.0: # Si la última llamada fue hace menos de 1 segundo
-            sleep_time = 1.0 - time_since_last_call
-            logger.debug(f"Odoo rate limit: Esperando {sleep_time:.2f}s antes de la próxima llamada.")
-            await asyncio.sleep(sleep_time)
-        self.last_odoo_call_time = time.monotonic() # Actualizar el tiempo de la última llamada
-
-        if not self.models:
-            raise OdooServiceError("Cliente de modelos Odoo no inicializado. ¿Fallo de autenticación?")
+        await self.rate_limiter.acquire()
 
         logger.debug(f"Llamando a Odoo: model='{model}', method='{method}'")
-        try:
-            result = self.models.execute_kw(
-                self.db, self.uid, self.password, model, method, args, kwargs
-            )
-            return result
-        except xmlrpc.client.Fault as fault:
-            logger.error(f"Fallo de Odoo RPC: {fault.faultCode} - {fault.faultString}", exc_info=True)
-            raise OdooServiceError(f"Error de Odoo RPC: {fault.faultString}")
-        except Exception as e:
-            logger.error(f"Error inesperado en llamada a Odoo: {e}", exc_info=True)
-            raise OdooServiceError(f"Error inesperado al comunicarse con Odoo: {e}")
+        return await self._rpc(
+            "object", "execute_kw", self.db, self.uid, self.password, model, method, list(args), kwargs
+        )
 
     async def find_opportunity_by_manychat_id(self, manychat_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -135,6 +208,7 @@ class OdooCRMOpportunityService:
             logger.info(f"Resultado crudo de búsqueda Odoo por ManyChatID {manychat_id}: {opportunities}")
             if opportunities:
                 logger.info(f"Oportunidad Odoo encontrada para ManyChat ID {manychat_id}: {opportunities[0]['id']}")
+                odoo_lead_cache.set(LEAD_CACHE_NAMESPACE, manychat_id, opportunities[0]['id'])
                 return opportunities[0]
             logger.info(f"No se encontró oportunidad Odoo para ManyChat ID: {manychat_id}")
             return None
@@ -154,14 +228,15 @@ class OdooCRMOpportunityService:
         source_id: Optional[int] = None,             # ID del canal de entrada
         channel_name: Optional[str] = None,          # Nombre del canal de entrada (instagram, tiktok, etc)
         fecha_entrada: Optional[datetime] = None,    # Fecha de entrada
-        fecha_ultimo_estado: Optional[datetime] = None  # Fecha del último estado
+        fecha_ultimo_estado: Optional[datetime] = None,  # Fecha del último estado
+        odoo_lead_id: Optional[int] = None               # Id del crm.lead si ya se conoce (Contact.odoo_lead_id)
     ) -> int:
         """
         Crea una nueva oportunidad en Odoo o actualiza una existente.
+        Si el id del crm.lead se conoce (argumento o caché) se escribe directo, sin buscarla;
+        si Odoo responde que ya no existe, se busca por ManyChat ID como antes.
         Retorna el ID de la oportunidad en Odoo.
         """
-        existing_opportunity = await self.find_opportunity_by_manychat_id(manychat_id)
-
         # Validar que contact_name sea un string y no un objeto Contact
         if contact_name is not None and not isinstance(contact_name, str):
             # Si es un objeto con first_name y last_name, construir el nombre completo
@@ -188,59 +263,97 @@ class OdooCRMOpportunityService:
             'x_studio_canal_entrada': canal_entrada_value,  # Ahora puede ser el nombre del canal
         }
         # No asignar user_id/advisor
-        # Eliminar claves con valor None para evitar errores de XML-RPC
+        # Eliminar claves con valor None para no sobrescribir campos en Odoo
         opportunity_data = {k: v for k, v in opportunity_data.items() if v is not None}
 
-        if existing_opportunity:
-            # Actualizar oportunidad existente
-            opportunity_id = existing_opportunity['id']
-            # No actualizar la fecha de entrada en updates
-            opportunity_data.pop('x_studio_fecha_entrada_1', None)
-            logger.info(f"Actualizando oportunidad Odoo {opportunity_id} para ManyChat ID: {manychat_id}")
+        opportunity_id = self._known_lead_id(manychat_id, odoo_lead_id)
+        if opportunity_id:
             try:
-                await self._execute_odoo_call(
-                    'crm.lead', 'write', [opportunity_id], opportunity_data
-                )
-                logger.info(f"Oportunidad Odoo {opportunity_id} actualizada correctamente.")
-                # Log de la oportunidad después de actualizar
-                await self.get_opportunity_by_id(opportunity_id)
-                return opportunity_id
-            except OdooServiceError as e:
-                logger.error(f"Error al actualizar oportunidad Odoo {opportunity_id}: {e}")
-                raise
+                return await self._update_opportunity(opportunity_id, manychat_id, opportunity_data)
+            except OdooMissingRecordError:
+                logger.warning(f"La oportunidad Odoo {opportunity_id} de ManyChat ID {manychat_id} ya no existe; se busca de nuevo.")
+                odoo_lead_cache.invalidate(LEAD_CACHE_NAMESPACE, manychat_id)
+
+        existing_opportunity = await self.find_opportunity_by_manychat_id(manychat_id)
+        if existing_opportunity:
+            return await self._update_opportunity(existing_opportunity['id'], manychat_id, opportunity_data)
         else:
-            # Crear nueva oportunidad
+            # Crear nueva oportunidad (el payload ya incluye x_studio_manychatid_api)
             logger.info(f"Creando nueva oportunidad Odoo para ManyChat ID: {manychat_id}")
-            logger.info(f"Payload enviado a Odoo (crm.lead.create): {opportunity_data}")
+            logger.debug(f"Payload enviado a Odoo (crm.lead.create): {opportunity_data}")
             try:
-                new_opportunity_id = await self._execute_odoo_call(
-                    'crm.lead', 'create', opportunity_data
-                )
+                new_opportunity_id = await self.write_batcher.create('crm.lead', opportunity_data)
                 if not new_opportunity_id:
                     raise OdooServiceError(f"Odoo no devolvió ID al crear oportunidad para ManyChat ID {manychat_id}.")
                 logger.info(f"Nueva oportunidad Odoo creada con ID: {new_opportunity_id} para ManyChat ID: {manychat_id}")
-                # Log de la oportunidad recién creada
-                await self.get_opportunity_by_id(new_opportunity_id)
-                # Forzar update del campo ManyChatID tras la creación (workaround)
-                try:
-                    await self._execute_odoo_call(
-                        'crm.lead', 'write', [new_opportunity_id], {'x_studio_manychatid_api': manychat_id}
-                    )
-                    logger.info(f"Campo ManyChatID actualizado por workaround en Odoo ID: {new_opportunity_id}")
-                    # Log de la oportunidad después del workaround
-                    await self.get_opportunity_by_id(new_opportunity_id)
-                except Exception as e:
-                    logger.warning(f"No se pudo forzar el update del campo ManyChatID en Odoo ID: {new_opportunity_id}: {e}")
+                odoo_lead_cache.set(LEAD_CACHE_NAMESPACE, manychat_id, new_opportunity_id)
+                await self._maybe_verify(new_opportunity_id, manychat_id)
                 return new_opportunity_id
             except OdooServiceError as e:
                 logger.error(f"Error al crear nueva oportunidad Odoo para ManyChat ID {manychat_id}: {e}")
                 raise
 
-    async def update_opportunity_stage(self, manychat_id: str, new_stage_odoo_id: int) -> bool:
+    def _known_lead_id(self, manychat_id: str, odoo_lead_id: Optional[int]) -> Optional[int]:
+        if odoo_lead_id:
+            return odoo_lead_id
+        cached = odoo_lead_cache.get(LEAD_CACHE_NAMESPACE, manychat_id)
+        return None if cached is MISSING else cached
+
+    async def _update_opportunity(self, opportunity_id: int, manychat_id: str, opportunity_data: Dict[str, Any]) -> int:
+        """
+        Escribe los datos en una oportunidad existente. Retorna su ID.
+        Siempre envía todos los campos: la etapa o los datos pueden haber cambiado en Odoo
+        (un usuario u otra réplica del worker), y cada evento vuelve a fijar los nuestros.
+        """
+        # No actualizar la fecha de entrada en updates
+        opportunity_data = {k: v for k, v in opportunity_data.items() if k != 'x_studio_fecha_entrada_1'}
+        logger.info(f"Actualizando oportunidad Odoo {opportunity_id} para ManyChat ID: {manychat_id}")
+        try:
+            await self.write_batcher.write('crm.lead', opportunity_id, opportunity_data)
+        except OdooMissingRecordError:
+            raise
+        except OdooServiceError as e:
+            logger.error(f"Error al actualizar oportunidad Odoo {opportunity_id}: {e}")
+            raise
+        logger.info(f"Oportunidad Odoo {opportunity_id} actualizada correctamente.")
+        odoo_lead_cache.set(LEAD_CACHE_NAMESPACE, manychat_id, opportunity_id)
+        await self._maybe_verify(opportunity_id, manychat_id)
+        return opportunity_id
+
+    async def _maybe_verify(self, opportunity_id: int, manychat_id: str) -> None:
+        """
+        Relee una muestra de las oportunidades escritas (ODOO_VERIFY_SAMPLE_RATE) para
+        comprobar que Odoo guardó el ManyChatID. Si falta, lo vuelve a escribir.
+        """
+        if not self.verify_sample_rate or random.random() >= self.verify_sample_rate:
+            return
+        try:
+            opportunity = await self.get_opportunity_by_id(opportunity_id)
+            if opportunity and opportunity.get('x_studio_manychatid_api') != manychat_id:
+                logger.warning(f"Oportunidad Odoo {opportunity_id} sin ManyChatID tras la escritura; se corrige.")
+                await self._execute_odoo_call(
+                    'crm.lead', 'write', [opportunity_id], {'x_studio_manychatid_api': manychat_id}
+                )
+        except Exception as e:
+            logger.warning(f"No se pudo verificar la oportunidad Odoo {opportunity_id}: {e}")
+
+    async def update_opportunity_stage(self, manychat_id: str, new_stage_odoo_id: int, odoo_lead_id: Optional[int] = None) -> bool:
         """
         Actualiza el stage de una oportunidad en Odoo.
+        Con el id del crm.lead conocido (argumento o caché) se escribe directo, sin leer el stage actual.
         Retorna True si la actualización fue exitosa, False en caso contrario (ej. no encontrada).
         """
+        opportunity_id = self._known_lead_id(manychat_id, odoo_lead_id)
+        if opportunity_id:
+            try:
+                await self.write_batcher.write('crm.lead', opportunity_id, {'stage_id': new_stage_odoo_id})
+                logger.info(f"Stage de oportunidad {opportunity_id} actualizado exitosamente a {new_stage_odoo_id}.")
+                odoo_lead_cache.set(LEAD_CACHE_NAMESPACE, manychat_id, opportunity_id)
+                return True
+            except OdooMissingRecordError:
+                logger.warning(f"La oportunidad Odoo {opportunity_id} de ManyChat ID {manychat_id} ya no existe; se busca de nuevo.")
+                odoo_lead_cache.invalidate(LEAD_CACHE_NAMESPACE, manychat_id)
+
         opportunity = await self.find_opportunity_by_manychat_id(manychat_id)
         if not opportunity:
             logger.warning(f"No se encontró oportunidad Odoo con ManyChat ID {manychat_id} para actualizar stage.")
@@ -255,9 +368,7 @@ class OdooCRMOpportunityService:
 
         logger.info(f"Actualizando stage de oportunidad Odoo {opportunity_id} a {new_stage_odoo_id} para ManyChat ID: {manychat_id}")
         try:
-            await self._execute_odoo_call(
-                'crm.lead', 'write', [opportunity_id], {'stage_id': new_stage_odoo_id}
-            )
+            await self.write_batcher.write('crm.lead', opportunity_id, {'stage_id': new_stage_odoo_id})
             logger.info(f"Stage de oportunidad {opportunity_id} actualizado exitosamente a {new_stage_odoo_id}.")
             return True
         except OdooServiceError as e:
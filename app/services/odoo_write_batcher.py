@@ -0,0 +1,162 @@
+# app/services/odoo_write_batcher.py
+"""
+Agrupa escrituras a Odoo que llegan casi a la vez en una sola llamada.
+
+`write` de Odoo acepta una lista de ids y `create` una lista de diccionarios, pero el
+servicio escribía un registro por llamada. OdooWriteBatcher retiene las escrituras
+durante `window` segundos y luego envía:
+- un `write(ids, vals)` por cada grupo de registros con exactamente los mismos valores
+  (p. ej. el mismo stage_id para los leads movidos en bloque);
+- un `create([vals, ...])` por modelo con todos los registros nuevos.
+Cada llamada lleva como máximo `max_batch` registros.
+
+- Quien escribe espera (await) el resultado de su propio registro, igual que antes.
+- Si un write agrupado falla, se reintenta registro a registro: el error (p. ej.
+  MissingError de un lead borrado) le llega solo a quien escribió ese registro.
+  Repetir un write no tiene efectos secundarios.
+- Un create agrupado solo se reintenta registro a registro si el error es de
+  `create_retry_errors` (errores que Odoo devolvió, así que no creó nada). Tras un
+  timeout Odoo pudo haber creado el lote entero: reintentarlo duplicaría cada lead,
+  así que el error se entrega a todo el grupo.
+- Dos escrituras al mismo registro en la misma ventana se envían en el orden en que
+  llegaron: la segunda nunca se une a un grupo que se enviaría antes que la primera.
+- window=0 desactiva la agrupación: cada escritura es una llamada inmediata.
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+OdooCall = Callable[..., Awaitable[Any]]
+
+
+class _WriteGroup:
+    def __init__(self, model: str, values: Dict[str, Any]):
+        self.model = model
+        self.values = values
+        self.futures: Dict[int, List[asyncio.Future]] = {}
+
+
+class OdooWriteBatcher:
+    def __init__(
+        self,
+        call: OdooCall,
+        window: float = 0.2,
+        max_batch: int = 100,
+        create_retry_errors: Tuple[Type[BaseException], ...] = (),
+    ):
+        self._call = call  # async (model, method, *args) -> resultado, p. ej. _execute_odoo_call
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.create_retry_errors = create_retry_errors
+        self._writes: List[_WriteGroup] = []
+        self._group_by_values: Dict[Tuple[str, str], int] = {}
+        self._last_group_of: Dict[Tuple[str, int], int] = {}
+        self._creates: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._queued = 0
+        self._calls = 0
+
+    async def write(self, model: str, record_id: int, values: Dict[str, Any]) -> None:
+        """Escribe `values` en el registro. Retorna cuando Odoo confirmó la escritura."""
+        if self.window <= 0:
+            await self._send(model, "write", [record_id], values)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._group_for(model, record_id, values).futures.setdefault(record_id, []).append(future)
+        self._enqueued()
+        await future
+
+    async def create(self, model: str, values: Dict[str, Any]) -> int:
+        """Crea un registro y retorna su id."""
+        if self.window <= 0:
+            return self._single_id(await self._send(model, "create", [values]))
+        future = asyncio.get_running_loop().create_future()
+        self._creates.setdefault(model, []).append((values, future))
+        self._enqueued()
+        return await future
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queued, "calls": self._calls}
+
+    def _group_for(self, model: str, record_id: int, values: Dict[str, Any]) -> _WriteGroup:
+        key = (model, json.dumps(values, sort_keys=True, default=str))
+        index = self._group_by_values.get(key)
+        last = self._last_group_of.get((model, record_id), -1)
+        # Solo se une a un grupo que se envía después de la escritura anterior de ese registro
+        if index is None or index < last or len(self._writes[index].futures) >= self.max_batch:
+            self._writes.append(_WriteGroup(model, values))
+            index = self._group_by_values[key] = len(self._writes) - 1
+        self._last_group_of[(model, record_id)] = index
+        return self._writes[index]
+
+    def _enqueued(self) -> None:
+        self._queued += 1
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        writes, creates = self._writes, self._creates
+        self._writes, self._group_by_values, self._last_group_of, self._creates = [], {}, {}, {}
+        self._flush_task = None
+        for group in writes:
+            await self._flush_write(group)
+        for model, entries in creates.items():
+            for start in range(0, len(entries), self.max_batch):
+                await self._flush_create(model, entries[start:start + self.max_batch])
+
+    async def _flush_write(self, group: _WriteGroup) -> None:
+        ids = list(group.futures)
+        try:
+            await self._send(group.model, "write", ids, group.values)
+        except Exception as e:
+            if len(ids) == 1:
+                _resolve(group.futures[ids[0]], error=e)
+                return
+            for record_id in ids:
+                try:
+                    await self._send(group.model, "write", [record_id], group.values)
+                except Exception as single_error:
+                    _resolve(group.futures[record_id], error=single_error)
+                else:
+                    _resolve(group.futures[record_id], True)
+            return
+        for futures in group.futures.values():
+            _resolve(futures, True)
+
+    async def _flush_create(self, model: str, entries: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            result = await self._send(model, "create", [values for values, _ in entries])
+            ids = result if isinstance(result, list) else [result]
+            if len(ids) != len(entries):
+                raise ValueError(f"Odoo devolvió {len(ids)} ids para {len(entries)} registros creados")
+        except Exception as e:
+            if len(entries) == 1 or not isinstance(e, self.create_retry_errors):
+                _resolve([future for _, future in entries], error=e)
+                return
+            for values, future in entries:
+                try:
+                    _resolve([future], self._single_id(await self._send(model, "create", [values])))
+                except Exception as single_error:
+                    _resolve([future], error=single_error)
+            return
+        for (_, future), record_id in zip(entries, ids):
+            _resolve([future], record_id)
+
+    async def _send(self, model: str, method: str, *args) -> Any:
+        self._calls += 1
+        return await self._call(model, method, *args)
+
+    @staticmethod
+    def _single_id(result: Any) -> int:
+        return result[0] if isinstance(result, list) else result
+
+
+def _resolve(futures: List[asyncio.Future], result: Any = None, error: Optional[BaseException] = None) -> None:
+    for future in futures:
+        if future.done():  # quien esperaba se canceló
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
@@ -0,0 +1,166 @@
+# app/utils/bloom.py
+"""
+Filtro de Bloom de los manychat_id conocidos, para responder /verificar-contacto.
+
+ManyChat pregunta en cada inicio de conversación si el contacto existe y la mayoría
+de las veces la respuesta es "no". Si el filtro dice que un manychat_id no está, la
+respuesta sale sin tocar la base; si dice que puede estar (acierto o falso positivo,
+~0,1 %), se consulta la base.
+
+Un filtro de Bloom no tiene falsos negativos sobre lo que contiene, pero solo contiene
+los contactos leídos en su último refresco y los creados en este proceso: los que crean
+el worker de contactos u otro worker de gunicorn entran con el siguiente sync(). Por eso
+un "no" del filtro solo vale si el último refresco empezó hace menos de `max_staleness`
+segundos (CONTACT_FILTER_MAX_STALENESS); si es más antiguo se consulta la base. Un
+contacto creado por otro proceso dentro de esa ventana todavía puede recibir "no".
+
+ContactExistenceFilter se mantiene así:
+- rebuild(): recorrido completo de la tabla al arrancar y cada cierto tiempo, que
+  construye un filtro nuevo y lo intercambia de forma atómica;
+- sync(): lectura incremental de los ids posteriores a la última marca de agua;
+- add(): los contactos confirmados en este proceso se añaden al momento.
+Mientras no se ha construido por primera vez, toda consulta se trata como "puede estar".
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.core.config import get_settings
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de un solo digest.
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class ContactExistenceFilter:
+    # Margen de ids que se vuelve a leer en cada sync: una transacción de otro proceso
+    # puede confirmar un id menor que otro ya leído.
+    SYNC_OVERLAP = 1000
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, max_staleness: float = 2.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_staleness = max_staleness
+        self._filter: Optional[BloomFilter] = None
+        self._building: Optional[BloomFilter] = None
+        self._watermark = 0
+        self._lock = threading.Lock()
+        self._last_rebuild: Optional[datetime] = None
+        # time.monotonic() al empezar la lectura del último rebuild()/sync() completo
+        self._refreshed_at: Optional[float] = None
+        self._definite_no = 0
+        self._maybe = 0
+        self._stale = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    @property
+    def sync_from(self) -> int:
+        """Id a partir del cual (exclusivo) debe leer el siguiente sync()."""
+        return max(0, self._watermark - self.SYNC_OVERLAP)
+
+    def might_contain(self, manychat_id: str) -> bool:
+        """
+        False solo si el contacto no existía al empezar el último refresco y ese refresco
+        tiene menos de `max_staleness` segundos. Con un refresco más antiguo el contacto
+        pudo crearse después en otro proceso, así que se responde "puede estar".
+        """
+        current = self._filter
+        if current is not None and manychat_id not in current:
+            if self._refreshed_at is not None and time.monotonic() - self._refreshed_at <= self.max_staleness:
+                self._definite_no += 1
+                return False
+            self._stale += 1
+        self._maybe += 1
+        return True
+
+    def add(self, manychat_id: str) -> None:
+        with self._lock:
+            for bloom in (self._filter, self._building):
+                if bloom is not None:
+                    bloom.add(manychat_id)
+
+    def rebuild(self, rows: Iterable[Tuple[int, str]], expected: int = 0) -> int:
+        """
+        Construye un filtro nuevo a partir de filas (id, manychat_id) y lo activa.
+        Los add() que llegan durante el recorrido se aplican también al filtro nuevo.
+        """
+        started = time.monotonic()
+        bloom = BloomFilter(max(self.capacity, 2 * expected), self.error_rate)
+        with self._lock:
+            self._building = bloom
+        watermark = 0
+        try:
+            for contact_id, manychat_id in rows:
+                bloom.add(manychat_id)
+                watermark = max(watermark, contact_id)
+        finally:
+            with self._lock:
+                self._building = None
+        with self._lock:
+            self._filter = bloom
+            self._watermark = watermark
+            self._last_rebuild = datetime.now(timezone.utc)
+            self._refreshed_at = started
+        return bloom.count
+
+    def sync(self, rows: Iterable[Tuple[int, str]]) -> int:
+        """Añade las filas (id, manychat_id) nuevas desde la última marca de agua."""
+        started = time.monotonic()
+        added = 0
+        for contact_id, manychat_id in rows:
+            self.add(manychat_id)
+            self._watermark = max(self._watermark, contact_id)
+            added += 1
+        self._refreshed_at = started
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._filter
+        return {
+            "ready": current is not None,
+            "entries": current.count if current else 0,
+            "capacity": current.capacity if current else self.capacity,
+            "size_bytes": len(current._bits) if current else 0,
+            "watermark": self._watermark,
+            "last_rebuild": self._last_rebuild.isoformat() if self._last_rebuild else None,
+            "definite_no": self._definite_no,
+            "maybe": self._maybe,
+            "stale": self._stale,
+        }
+
+
+_settings = get_settings()
+
+# Filtro compartido por el endpoint de verificación y los repositorios (ver ContactRepository).
+known_contacts = ContactExistenceFilter(
+    capacity=_settings.CONTACT_FILTER_CAPACITY,
+    error_rate=_settings.CONTACT_FILTER_ERROR_RATE,
+    max_staleness=_settings.CONTACT_FILTER_MAX_STALENESS,
+)
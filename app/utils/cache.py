@@ -0,0 +1,108 @@
+# app/utils/cache.py
+"""
+Caché en memoria del proceso para datos de referencia (canales, campañas, asesores).
+
+Son tablas de unos cientos de filas que cambian muy poco, pero se consultaban en
+cada evento. TTLCache guarda instantáneas (diccionarios de columnas) con:
+- TTL: una entrada caduca a los `ttl` segundos, lo que acota cuánto tarda otro
+  proceso (otro worker de gunicorn o un worker de colas) en ver un cambio;
+- tamaño máximo: al superarlo se descarta la entrada usada hace más tiempo (LRU);
+- invalidación explícita por "namespace" (p. ej. "Channel"), que usan los
+  endpoints CRUD tras cada escritura.
+
+contact_key_cache usa la misma clase para resolver manychat_id -> (id, channel_id)
+de contactos; la llenan los UPSERT al confirmarse y la invalidan los borrados.
+odoo_lead_cache guarda manychat_id -> id del crm.lead de Odoo.
+
+Es segura entre hilos. Un get-or-create concurrente no se resuelve aquí sino con
+índices únicos en la base (ver ChannelRepository.get_or_create_by_name).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.config import get_settings
+
+MISSING = object()
+
+CacheKey = Tuple[str, Hashable]
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        """Retorna el valor guardado o MISSING si no existe o ya caducó."""
+        cache_key = (namespace, key)
+        with self._lock:
+            entry = self._data.get(cache_key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[cache_key]
+                self._misses += 1
+                return MISSING
+            self._data.move_to_end(cache_key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, namespace: str, key: Hashable, value: Any) -> None:
+        cache_key = (namespace, key)
+        with self._lock:
+            self._data[cache_key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(cache_key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, namespace: Optional[str] = None, key: Hashable = MISSING) -> None:
+        """Borra una clave, todo un namespace o (sin argumentos) toda la caché."""
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+            elif key is not MISSING:
+                self._data.pop((namespace, key), None)
+            else:
+                for cache_key in [k for k in self._data if k[0] == namespace]:
+                    del self._data[cache_key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+_settings = get_settings()
+
+# Caché compartida por los repositorios de datos de referencia.
+reference_cache = TTLCache(
+    maxsize=_settings.REFERENCE_CACHE_MAXSIZE,
+    ttl=_settings.REFERENCE_CACHE_TTL,
+    name="reference",
+)
+
+# manychat_id -> ContactKey(id, channel_id), ver ContactRepository.resolve_key.
+contact_key_cache = TTLCache(
+    maxsize=_settings.CONTACT_KEY_CACHE_MAXSIZE,
+    ttl=_settings.CONTACT_KEY_CACHE_TTL,
+    name="contact-keys",
+)
+
+# manychat_id -> id del crm.lead en Odoo, ver OdooCRMOpportunityService.
+odoo_lead_cache = TTLCache(
+    maxsize=_settings.ODOO_LEAD_CACHE_MAXSIZE,
+    ttl=_settings.ODOO_LEAD_CACHE_TTL,
+    name="odoo-leads",
+)
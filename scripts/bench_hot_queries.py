@@ -0,0 +1,112 @@
+# scripts/bench_hot_queries.py
+"""
+Microbenchmark del costo en Python por llamada de las búsquedas frecuentes de los
+repositorios: la versión anterior (db.query(...).filter(...) construido en cada
+llamada) frente a las sentencias precompiladas de app/db/repositories.py.
+
+Usa por defecto una base SQLite en memoria, así el tiempo medido es casi todo
+construcción de la consulta, compilación/caché y carga ORM, no red ni servidor.
+
+Uso:
+    python scripts/bench_hot_queries.py [--iterations 5000] [--url sqlite://]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, or_  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db.session import Base  # noqa: E402
+from app.db.models import Advisor, CampaignContact, Contact, ContactState  # noqa: E402
+from app.db.repositories import (  # noqa: E402
+    AdvisorRepository, CampaignContactRepository, ContactRepository, ContactStateRepository,
+    _CONTACT_KEYS_BY_MANYCHAT_IDS, _padded_in_values,
+)
+
+
+# --- Versiones anteriores (construyen la expresión ORM en cada llamada) ---
+def legacy_get_by_manychat_id(db, manychat_id):
+    return db.query(Contact).filter(Contact.manychat_id == manychat_id).first()
+
+
+def legacy_resolve_keys(db, manychat_ids):
+    return db.query(Contact.manychat_id, Contact.id, Contact.channel_id).filter(
+        Contact.manychat_id.in_(manychat_ids)
+    ).all()
+
+
+def legacy_latest_state(db, contact_id):
+    return db.query(ContactState).filter(
+        ContactState.contact_id == contact_id
+    ).order_by(ContactState.created_at.desc()).first()
+
+
+def legacy_campaign_contact(db, contact_id, campaign_id):
+    return db.query(CampaignContact).filter_by(contact_id=contact_id, campaign_id=campaign_id).first()
+
+
+def legacy_advisor(db, identifier):
+    return db.query(Advisor).filter(or_(Advisor.email == identifier, Advisor.name == identifier)).first()
+
+
+def _seed(db):
+    db.add_all([Contact(id=i, manychat_id=f"mc-{i}", first_name="Bench") for i in range(1, 501)])
+    db.add_all([Advisor(id=i, name=f"Asesor {i}", email=f"asesor{i}@example.com") for i in range(1, 21)])
+    db.add_all([CampaignContact(contact_id=i, campaign_id=1) for i in range(1, 501)])
+    db.flush()
+    states = ContactStateRepository(db)
+    for i in range(1, 501):
+        states.create_or_update(i, "Nuevo Lead")
+        states.create_or_update(i, "Lead Asignado")
+    db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--url", default="sqlite://")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, expire_on_commit=False)()
+    _seed(db)
+
+    batch = [f"mc-{i}" for i in range(1, 51)]
+    cases = [
+        ("contacto por manychat_id",
+         lambda: legacy_get_by_manychat_id(db, "mc-250"),
+         lambda: ContactRepository(db).get_by_manychat_id("mc-250")),
+        # resolve_keys pasa por contact_key_cache: se mide la consulta en sí
+        ("claves de 50 contactos",
+         lambda: legacy_resolve_keys(db, batch),
+         lambda: db.connection().execute(
+             _CONTACT_KEYS_BY_MANYCHAT_IDS, {"manychat_ids": _padded_in_values(batch)}
+         ).all()),
+        ("último estado del contacto",
+         lambda: legacy_latest_state(db, 250),
+         lambda: ContactStateRepository(db).get_latest_by_contact(250)),
+        ("asignación contacto+campaña",
+         lambda: legacy_campaign_contact(db, 250, 1),
+         lambda: CampaignContactRepository(db).get_by_contact_and_campaign(250, 1)),
+        ("asesor por email",
+         lambda: legacy_advisor(db, "asesor7@example.com"),
+         lambda: AdvisorRepository(db)._load_by_id_or_email("asesor7@example.com")),
+    ]
+
+    print(f"{'consulta':<30} {'antes (µs)':>12} {'después (µs)':>14} {'mejora':>8}")
+    for name, before, after in cases:
+        before(), after()  # calentar las cachés de compilación
+        t_before = min(timeit.repeat(before, number=args.iterations, repeat=3)) / args.iterations * 1e6
+        t_after = min(timeit.repeat(after, number=args.iterations, repeat=3)) / args.iterations * 1e6
+        print(f"{name:<30} {t_before:>12.1f} {t_after:>14.1f} {t_before / t_after:>7.1f}x")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,17 @@ ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
 if ROOT_PATH not in sys.path:
     sys.path.append(ROOT_PATH)
 
+# Los workers usan el pool de conexiones reducido (ver DB_ROLE en app/core/config.py).
+# Debe fijarse antes de importar la app, que crea el motor al importarse.
+os.environ.setdefault("DB_ROLE", "worker")
+
 from app.services.queue_service import QueueService
 # --- ✅ CAMBIO: Importamos los workers existentes y el nuevo ---
 from workers.contact_processor import process_contact_events
 # Suponiendo que tienes un campaign_processor.py similar
 # from workers.campaign_processor import process_campaign_events 
 from workers.address_processor import process_address_events
+from workers.outbox_relay import process_outbox
 
 # Configuración del logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -46,7 +51,8 @@ async def main():
     await asyncio.gather(
         process_contact_events(queue_service, sql_service),
         # process_campaign_events(), # Descomenta si tienes este worker
-        process_address_events()
+        process_address_events(),
+        process_outbox(queue_service)
     )
 
 if __name__ == "__main__":
@@ -6,12 +6,13 @@ export PYTHONPATH=/app:$PYTHONPATH
 # Inicia la API con Gunicorn
 gunicorn -w 4 -k uvicorn.workers.UvicornWorker app.main:app --bind 0.0.0.0:8000 &
 
-# Inicia los workers en segundo plano
+# Inicia los workers en segundo plano (DB_ROLE=worker: pool de conexiones reducido)
 
-python /app/workers/crm_processor.py &
-python /app/workers/contact_processor.py &
-python /app/workers/campaign_processor.py &
-python /app/workers/address_processor.py &
+DB_ROLE=worker python /app/workers/crm_processor.py &
+DB_ROLE=worker python /app/workers/contact_processor.py &
+DB_ROLE=worker python /app/workers/campaign_processor.py &
+DB_ROLE=worker python /app/workers/address_processor.py &
+DB_ROLE=worker python /app/workers/outbox_relay.py &
 
 # Mantén el contenedor activo esperando a que los procesos terminen
 wait
\ No newline at end of file
@@ -0,0 +1,58 @@
+# tests/test_async_repositories.py
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.db.session import Base, to_async_url
+from app.db.models import Contact, Outbox
+from app.db.async_repositories import AsyncContactRepository, AsyncContactStateRepository, AsyncOutboxRepository
+
+
+@pytest_asyncio.fixture
+async def async_session():
+    """AsyncSession sobre aiosqlite en memoria con el esquema completo (no usa la base real)."""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    try:
+        yield session
+    finally:
+        await session.close()
+        await engine.dispose()
+
+
+def test_to_async_url_maps_drivers():
+    assert to_async_url("mssql+pyodbc://u:p@host/db?driver=ODBC+Driver+18+for+SQL+Server").drivername == "mssql+aioodbc"
+    assert to_async_url("sqlite:///./local.db").drivername == "sqlite+aiosqlite"
+
+
+@pytest.mark.asyncio
+async def test_async_repositories_share_sync_upsert(async_session):
+    contact_repo = AsyncContactRepository(async_session)
+    created = await contact_repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana", "email": "ana@example.com"})
+    updated = await contact_repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana María"})
+    state = await AsyncContactStateRepository(async_session).create_or_update(created.id, "Nuevo Lead")
+    await async_session.commit()
+
+    assert updated.id == created.id
+    assert (updated.first_name, updated.email) == ("Ana María", "ana@example.com")
+    assert state.contact_id == created.id
+    assert await async_session.scalar(select(func.count()).select_from(Contact)) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_outbox_round_trip(async_session):
+    outbox_repo = AsyncOutboxRepository(async_session)
+    message = await outbox_repo.add("cola", {"manychat_id": "mc-1"})
+    await async_session.commit()
+
+    pending = await outbox_repo.get_pending()
+    await outbox_repo.mark_sent([m.id for m in pending])
+    await async_session.commit()
+
+    assert [m.id for m in pending] == [message.id]
+    assert await outbox_repo.get_pending() == []
+    assert (await async_session.get(Outbox, message.id, populate_existing=True)).status == "sent"
@@ -0,0 +1,73 @@
+# tests/test_campaign_claim.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mssql
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.db.models import CampaignContact
+from app.db.repositories import CampaignContactRepository
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'claims.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as db:
+        db.add_all([CampaignContact(contact_id=i, campaign_id=1, sync_status="new") for i in range(1, 6)])
+        db.add(CampaignContact(contact_id=6, campaign_id=1, sync_status="synced"))
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def test_concurrent_claims_never_share_rows(Session):
+    with Session() as first, Session() as second:
+        a = CampaignContactRepository(first).claim_pending("worker-a", 3, 300)
+        first.commit()
+        b = CampaignContactRepository(second).claim_pending("worker-b", 3, 300)
+        second.commit()
+
+    assert [cc.contact_id for cc in a] == [1, 2, 3]
+    assert [cc.contact_id for cc in b] == [4, 5]
+    assert {cc.lease_owner for cc in a} == {"worker-a"} and {cc.sync_status for cc in b} == {"processing"}
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_cannot_finish(Session):
+    with Session() as db:
+        repo = CampaignContactRepository(db)
+        claimed = repo.claim_pending("worker-a", 1, 300)
+        db.commit()
+        assert repo.claim_pending("worker-b", 5, 300)[0].contact_id == 2
+
+        db.query(CampaignContact).filter(CampaignContact.id == claimed[0].id).update(
+            {CampaignContact.lease_expires_at: datetime.now(timezone.utc) - timedelta(seconds=1)}
+        )
+        db.commit()
+        reclaimed = repo.claim_pending("worker-c", 10, 300)
+        db.commit()
+
+        assert [cc.id for cc in reclaimed] == [claimed[0].id]
+        assert repo.finish_claim(claimed[0].id, "worker-a", "synced") is False
+        assert repo.finish_claim(claimed[0].id, "worker-c", "synced", last_state="Asignado") is True
+        db.commit()
+
+        done = db.get(CampaignContact, claimed[0].id, populate_existing=True)
+        assert (done.sync_status, done.last_state, done.lease_owner) == ("synced", "Asignado", None)
+
+
+def test_sql_server_claim_skips_locked_rows():
+    captured = []
+
+    class FakeSession:
+        def scalars(self, stmt):
+            captured.append(str(stmt.compile(dialect=mssql.dialect())))
+            return type("Result", (), {"all": lambda self: []})()
+
+    CampaignContactRepository(FakeSession()).claim_pending("worker-a", 50, 300)
+    sql = captured[0]
+    assert "OUTPUT inserted.id" in sql and "SELECT TOP" in sql
+    assert "WITH (ROWLOCK, READPAST, UPDLOCK)" in sql
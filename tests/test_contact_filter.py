@@ -0,0 +1,64 @@
+# tests/test_contact_filter.py
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.session import Base
+from app.db.models import Contact
+from app.db.repositories import ContactRepository
+from app.utils import bloom as bloom_module
+from app.utils.bloom import BloomFilter, ContactExistenceFilter
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"mc-{i}")
+
+    assert all(f"mc-{i}" in bloom for i in range(10000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_filter_answers_maybe_until_loaded_and_tracks_new_contacts():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as db:
+        db.add_all([Contact(manychat_id=f"mc-{i}", first_name="X") for i in range(5)])
+        db.commit()
+
+    known = ContactExistenceFilter(capacity=100)
+    assert known.might_contain("unknown")
+
+    with Session() as db:
+        repo = ContactRepository(db)
+        assert known.rebuild(repo.stream_manychat_ids(batch_size=2), expected=repo.count()) == 5
+    assert known.might_contain("mc-3")
+    assert not known.might_contain("unknown")
+
+    # Contacto creado por otro proceso: lo recoge el sync incremental
+    with Session() as db:
+        db.add(Contact(manychat_id="mc-new", first_name="X"))
+        db.commit()
+    with Session() as db:
+        assert known.sync(ContactRepository(db).stream_manychat_ids(after_id=known.sync_from)) >= 1
+    assert known.might_contain("mc-new")
+    engine.dispose()
+
+
+def test_stale_filter_answers_maybe_for_unknown_ids(monkeypatch):
+    known = ContactExistenceFilter(capacity=100, max_staleness=2)
+    now = [1000.0]
+    monkeypatch.setattr(bloom_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    known.rebuild([(1, "mc-1")])
+    assert not known.might_contain("mc-otro")
+
+    # Sin refresco reciente, otro proceso pudo crear el contacto: hay que consultar la base
+    now[0] += 3
+    assert known.might_contain("mc-otro")
+    known.sync([])
+    assert not known.might_contain("mc-otro")
+    assert known.stats()["stale"] == 1
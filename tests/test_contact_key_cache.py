@@ -0,0 +1,72 @@
+# tests/test_contact_key_cache.py
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.session import Base
+from app.db.models import Contact
+from app.db.repositories import ContactKey, ContactRepository, _padded_in_values
+from app.utils.cache import MISSING, contact_key_cache
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    contact_key_cache.invalidate()
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    contact_key_cache.invalidate()
+    engine.dispose()
+
+
+def _count_statements(Session):
+    statements = []
+    event.listen(Session.kw["bind"], "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_upsert_publishes_key_only_after_commit(Session):
+    with Session() as db:
+        contact = ContactRepository(db).create_or_update({"manychat_id": "mc-1", "first_name": "Ana"})
+        assert contact_key_cache.get("Contact", "mc-1") is MISSING
+        db.commit()
+
+    assert contact_key_cache.get("Contact", "mc-1") == ContactKey(contact.id, None)
+
+    statements = _count_statements(Session)
+    with Session() as db:
+        assert ContactRepository(db).resolve_key("mc-1") == ContactKey(contact.id, None)
+    assert statements == []
+
+
+def test_rolled_back_upsert_is_not_cached(Session):
+    with Session() as db:
+        ContactRepository(db).create_or_update({"manychat_id": "mc-1", "first_name": "Ana"})
+        db.rollback()
+
+    assert contact_key_cache.get("Contact", "mc-1") is MISSING
+    with Session() as db:
+        assert ContactRepository(db).resolve_key("mc-1") is None
+
+
+def test_resolve_keys_batches_misses_in_one_query(Session):
+    with Session() as db:
+        db.add_all([Contact(manychat_id=f"mc-{i}", first_name="X", channel_id=None) for i in range(3)])
+        db.commit()
+
+    with Session() as db:
+        ContactRepository(db).resolve_key("mc-0")
+
+    statements = _count_statements(Session)
+    with Session() as db:
+        keys = ContactRepository(db).resolve_keys(["mc-0", "mc-1", "mc-2", "mc-404", "mc-1"])
+
+    assert set(keys) == {"mc-0", "mc-1", "mc-2"}
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    assert contact_key_cache.get("Contact", "mc-404") is MISSING
+
+
+def test_in_list_is_padded_to_a_few_stable_sizes():
+    assert _padded_in_values(["a", "b", "c"]) == ["a", "b", "c", "c"]
+    assert len(_padded_in_values([str(i) for i in range(33)])) == 64
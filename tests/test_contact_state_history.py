@@ -0,0 +1,71 @@
+# tests/test_contact_state_history.py
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.v1.endpoints.campaign_contact import assign_campaign_and_state
+from app.db.session import Base
+from app.db.models import Contact, ContactState
+from app.db.repositories import ContactStateRepository
+from app.schemas.campaign_contact import CampaignContactUpsert
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add(Contact(id=1, manychat_id="mc-1", first_name="Ana"))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def test_state_changes_are_appended_and_pointer_follows(db):
+    repo = ContactStateRepository(db)
+    first = repo.create_or_update(1, "Nuevo Lead")
+    second = repo.create_or_update(1, "Lead Asignado", category="crm")
+    db.commit()
+
+    assert first.id != second.id
+    assert [s.state for s in repo.get_history_by_contact(1)] == ["Nuevo Lead", "Lead Asignado"]
+    assert db.get(Contact, 1).current_state_id == second.id
+    assert repo.get_latest_by_contact(1).id == second.id
+
+
+def test_repeated_state_does_not_add_a_transition(db):
+    repo = ContactStateRepository(db)
+    first = repo.create_or_update(1, "Nuevo Lead")
+    again = repo.create_or_update(1, "Nuevo Lead")
+
+    assert again.id == first.id
+    assert db.query(ContactState).count() == 1
+
+
+def test_same_state_with_another_category_is_not_a_transition(db):
+    repo = ContactStateRepository(db)
+    first = repo.create_or_update(1, "Nuevo Lead", category="manychat")
+
+    assert repo.create_or_update(1, "Nuevo Lead", category="crm").id == first.id
+    assert db.query(ContactState).count() == 1
+
+
+@pytest.mark.asyncio
+async def test_assigning_the_same_state_twice_keeps_one_history_row():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        session.add(Contact(id=1, manychat_id="mc-assign", first_name="Ana"))
+        await session.commit()
+
+        data = CampaignContactUpsert(manychat_id="mc-assign", campaign_id=1, state="Comienza Cotización")
+        for _ in range(2):
+            await assign_campaign_and_state(data, BackgroundTasks(), session)
+
+        states = (await session.scalars(select(ContactState.state))).all()
+    await engine.dispose()
+    assert states == ["Comienza Cotización"]
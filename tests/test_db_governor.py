@@ -0,0 +1,95 @@
+# tests/test_db_governor.py
+import asyncio
+import threading
+
+import pytest
+
+from app.db.governor import DBGovernor, DBOverloadedError
+
+
+def test_slot_rejects_when_wait_queue_is_full():
+    governor = DBGovernor(max_concurrency=1, max_waiting=0, wait_timeout=5)
+    with governor.slot():
+        with pytest.raises(DBOverloadedError):
+            with governor.slot():
+                pass
+    assert governor.stats()["rejected"] == 1
+    assert governor.stats()["in_use"] == 0
+
+
+def test_slot_waits_for_a_released_connection():
+    governor = DBGovernor(max_concurrency=1, max_waiting=1, wait_timeout=2)
+    released = threading.Event()
+
+    def hold():
+        with governor.slot():
+            released.wait(1)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    while governor.stats()["in_use"] == 0:
+        pass
+    threading.Timer(0.05, released.set).start()
+    with governor.slot():
+        assert governor.stats()["in_use"] == 1
+    holder.join()
+
+
+def test_async_run_times_out_with_overload_error():
+    governor = DBGovernor(max_concurrency=1, max_waiting=5, wait_timeout=0.05)
+
+    async def scenario():
+        async with governor.async_slot():
+            with pytest.raises(DBOverloadedError) as exc_info:
+                await governor.run(lambda: None)
+            assert exc_info.value.retry_after >= 1
+        return await governor.run(lambda value: value * 2, 21)
+
+    assert asyncio.run(scenario()) == 42
+    governor.shutdown()
+
+
+def test_async_waiters_get_released_slots_in_arrival_order():
+    governor = DBGovernor(max_concurrency=1, max_waiting=5, wait_timeout=2)
+    order = []
+
+    async def waiter(name):
+        async with governor.async_slot():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        async with governor.async_slot():
+            tasks = []
+            for name in ("a", "b", "c"):
+                tasks.append(asyncio.create_task(waiter(name)))
+                await asyncio.sleep(0)  # cada uno se encola antes que el siguiente
+            assert governor.stats()["waiting"] == 3
+        # Llega justo cuando se libera el turno: no se adelanta a la cola
+        tasks.append(asyncio.create_task(waiter("late")))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["a", "b", "c", "late"]
+    assert governor.stats()["in_use"] == 0 and governor.stats()["waiting"] == 0
+
+
+def test_slot_released_by_a_thread_wakes_an_async_waiter():
+    governor = DBGovernor(max_concurrency=1, max_waiting=1, wait_timeout=2)
+    holding = threading.Event()
+
+    def hold():
+        with governor.slot():
+            holding.set()
+            threading.Event().wait(0.05)
+
+    async def scenario():
+        holder = threading.Thread(target=hold)
+        holder.start()
+        holding.wait(1)
+        async with governor.async_slot():
+            assert governor.stats()["in_use"] == 1
+        holder.join()
+
+    asyncio.run(scenario())
+    assert governor.stats()["in_use"] == 0 and governor.stats()["waiting"] == 0
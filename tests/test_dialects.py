@@ -0,0 +1,76 @@
+# tests/test_dialects.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1.endpoints.reports import _query_statistics, check_database_health
+from app.db.bulk import bulk_insert
+from app.db.dialects import (
+    MSSQLDialect, PostgreSQLDialect, SQLDialect, SQLiteDialect, _copy_columns, _copy_text, dialect_for,
+)
+from app.db.models import CampaignContact, Channel, Contact, ContactState, SyncLog
+from app.db.session import Base, create_db_engine
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'local.db'}", pool=(2, 0))
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+
+def test_dialect_lookup_by_name_url_and_engine(Session):
+    assert isinstance(dialect_for("mssql"), MSSQLDialect)
+    assert isinstance(dialect_for("postgresql"), PostgreSQLDialect)
+    assert isinstance(dialect_for(Session.kw["bind"]), SQLiteDialect)
+    assert type(dialect_for("oracle")) is SQLDialect
+
+
+def test_file_sqlite_engine_uses_wal(Session):
+    with Session.kw["bind"].connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+
+def test_reports_run_on_sqlite_without_tsql(Session):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with Session() as db:
+        db.add(Channel(id=1, name="WhatsApp"))
+        db.add_all([
+            Contact(id=1, manychat_id="mc-1", first_name="Ana", channel_id=1, entry_date=now - timedelta(hours=1), current_state_id=10),
+            Contact(id=2, manychat_id="mc-2", first_name="Luis", channel_id=1, entry_date=now - timedelta(days=3), current_state_id=11),
+            Contact(id=3, manychat_id="mc-3", first_name="Eva", entry_date=None),
+        ])
+        db.add_all([
+            ContactState(id=10, contact_id=1, state="Nuevo Lead"),
+            ContactState(id=11, contact_id=2, state="Nuevo Lead"),
+        ])
+        db.commit()
+
+        contacts_stats, channel_stats, state_stats = _query_statistics(db)
+        health = check_database_health(db)
+
+    assert (contacts_stats.total, contacts_stats.recent_24h) == (3, 1)
+    assert dict((row.channel_name, row.count) for row in channel_stats) == {"WhatsApp": 2, None: 1}
+    assert [(row.state, row.count) for row in state_stats] == [("Nuevo Lead", 2)]
+    assert health["status"] == "healthy" and health["statistics"]["total_contacts"] == 3
+
+
+def test_bulk_insert_goes_through_the_dialect(Session):
+    with Session() as db:
+        sent = bulk_insert(db, CampaignContact, [{"contact_id": i, "campaign_id": 1} for i in range(1, 6)], batch_size=2)
+        db.commit()
+        assert sent == 5
+        assert {cc.sync_status for cc in db.query(CampaignContact)} == {"new"}
+
+
+def test_copy_payload_escapes_values_and_fills_python_defaults():
+    assert _copy_text(None) == "\\N"
+    assert _copy_text("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+
+    columns = _copy_columns(CampaignContact.__table__, [{"contact_id": 1, "campaign_id": 2}])
+    assert [column.key for column in columns] == ["campaign_id", "contact_id", "sync_status"]
+    # Sync_Log.created_at solo tiene default de servidor: COPY lo aplica si la columna se omite.
+    assert "created_at" not in [column.key for column in _copy_columns(SyncLog.__table__, [{"status": "ok"}])]
@@ -0,0 +1,90 @@
+# tests/test_export.py
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, select
+from starlette.requests import ClientDisconnect
+
+from app.api.deps import verify_api_key
+from app.api.v1.endpoints import export
+from app.api.v1.endpoints.export import _csv_chunks, _ndjson_chunks
+from app.db import session as db_session
+from app.db.governor import DBGovernor
+from app.db.session import Base
+from app.db.models import Channel
+
+
+def _stream(engine):
+    connection = engine.connect()
+    result = connection.execution_options(stream_results=True, yield_per=2).execute(
+        select(Channel.__table__).order_by(Channel.id)
+    )
+    return connection, result
+
+
+def test_export_streams_rows_in_batches():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Channel.__table__.insert(), [{"name": f"canal,{i}"} for i in range(5)])
+
+    connection, result = _stream(engine)
+    chunks = list(_ndjson_chunks(result))
+    connection.close()
+    assert len(chunks) == 3
+    rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [row["name"] for row in rows] == [f"canal,{i}" for i in range(5)]
+
+    connection, result = _stream(engine)
+    rows = list(csv.reader(io.StringIO("".join(_csv_chunks(result)))))
+    connection.close()
+    assert rows[0] == ["id", "name", "description"]
+    assert rows[1][1] == "canal,0" and len(rows) == 6
+    engine.dispose()
+
+
+def test_client_disconnect_releases_connection_and_governor_slot(tmp_path, monkeypatch):
+    # El endpoint y el generador corren en hilos del threadpool de Starlette
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Channel.__table__.insert(), [{"name": f"canal {i}"} for i in range(5)])
+    governor = DBGovernor(1, 0, 0.1)
+    monkeypatch.setattr(db_session, "engine", engine)
+    monkeypatch.setattr(db_session, "db_governor", governor)
+    monkeypatch.setattr(db_session, "read_engine", None)
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+
+    app = FastAPI()
+    app.include_router(export.router, prefix="/export")
+    app.dependency_overrides[verify_api_key] = lambda: "test"
+    bodies = []
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message["body"]:
+            bodies.append(message["body"])
+            raise OSError("el cliente cerró la conexión")
+
+    async def download():
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/export/channels", "raw_path": b"/export/channels",
+            "query_string": b"", "root_path": "", "headers": [], "server": ("test", 80), "client": ("test", 1),
+        }
+        # `disconnect` retiene la excepción (y con ella la respuesta), como el servidor al registrarla.
+        # Se mide antes de que asyncio.run cierre los generadores pendientes.
+        with pytest.raises(ClientDisconnect) as disconnect:
+            await app(scope, receive, send)
+        assert disconnect.value is not None
+        return governor.stats()["in_use"], engine.pool.checkedout()
+
+    assert asyncio.run(download()) == (0, 0)
+    assert len(bodies) == 1
+    engine.dispose()
@@ -0,0 +1,99 @@
+# tests/test_migrations.py
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.session import Base
+from app.db.migrations import run_migrations
+from app.db.migrations.v0003_lookup_indexes import INDEXES
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """Base SQLite con el esquema actual pero sin los índices de búsqueda (como producción antes de 0003)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for _, name in INDEXES:
+            connection.execute(text(f'DROP INDEX "{name}"'))
+    yield engine
+    engine.dispose()
+
+
+def _index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_lookup_indexes_migration_creates_missing_indexes(legacy_engine):
+    applied = run_migrations(legacy_engine)
+
+    assert "0003" in applied
+    assert "ix_contact_state_contact_created" in _index_names(legacy_engine, "Contact_State")
+    assert "ux_channel_name" in _index_names(legacy_engine, "Channel")
+    assert {"ux_advisor_email", "ix_advisor_name"} <= _index_names(legacy_engine, "Advisor")
+    assert run_migrations(legacy_engine) == []
+
+
+def test_lookup_indexes_migration_refuses_duplicate_channels(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO Channel (name) VALUES ('WhatsApp'), ('WhatsApp')"))
+        connection.execute(text("INSERT INTO Advisor (name, email, is_active, created_at, updated_at) "
+                                "VALUES ('A', NULL, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP), "
+                                "('B', NULL, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"))
+
+    with pytest.raises(RuntimeError, match="Channel.name"):
+        run_migrations(legacy_engine)
+    assert "ux_channel_name" not in _index_names(legacy_engine, "Channel")
+
+
+def test_current_state_migration_adds_and_backfills_pointer(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'states.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE "Contact" DROP COLUMN current_state_id'))
+        connection.execute(text("INSERT INTO Contact (id, manychat_id, first_name) VALUES (1, 'mc-1', 'Ana'), (2, 'mc-2', 'Luis')"))
+        connection.execute(text("INSERT INTO Contact_State (id, contact_id, state, created_at) VALUES "
+                                "(10, 1, 'Nuevo', '2025-01-01'), (11, 1, 'Asignado', '2025-01-02')"))
+
+    run_migrations(engine)
+
+    with engine.connect() as connection:
+        pointers = dict(connection.execute(text("SELECT id, current_state_id FROM Contact")).all())
+    assert pointers == {1: 11, 2: None}
+    engine.dispose()
+
+
+def test_campaign_contact_lease_migration_adds_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'lease.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE "Campaign_Contact" DROP COLUMN lease_owner'))
+        connection.execute(text('ALTER TABLE "Campaign_Contact" DROP COLUMN lease_expires_at'))
+
+    assert "0005" in run_migrations(engine)
+    columns = {column["name"] for column in inspect(engine).get_columns("Campaign_Contact")}
+    assert {"lease_owner", "lease_expires_at"} <= columns
+    engine.dispose()
+
+
+def test_contact_odoo_lead_id_migration_adds_column(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'odoo_lead.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE "Contact" DROP COLUMN odoo_lead_id'))
+
+    assert "0008" in run_migrations(engine)
+    assert "odoo_lead_id" in {column["name"] for column in inspect(engine).get_columns("Contact")}
+    engine.dispose()
+
+
+def test_outbox_lease_migration_adds_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox_lease.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE "Outbox" DROP COLUMN lease_owner'))
+        connection.execute(text('ALTER TABLE "Outbox" DROP COLUMN lease_expires_at'))
+
+    assert "0009" in run_migrations(engine)
+    columns = {column["name"] for column in inspect(engine).get_columns("Outbox")}
+    assert {"lease_owner", "lease_expires_at"} <= columns
+    engine.dispose()
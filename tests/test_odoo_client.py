@@ -0,0 +1,219 @@
+# tests/test_odoo_client.py
+import asyncio
+import json
+from datetime import datetime
+
+import httpx
+import pytest
+
+from app.core.config import get_settings
+from app.db.rate_limit import SQLTokenBucket
+from app.services.odoo_crm_opportunity_service import (
+    OdooCRMOpportunityService, OdooRPCError, OdooTransportError,
+)
+from app.utils.cache import odoo_lead_cache
+
+
+@pytest.fixture
+def odoo_env(monkeypatch):
+    monkeypatch.setenv("ODOO_URL", "https://odoo.test/")
+    monkeypatch.setenv("ODOO_DB", "crm")
+    monkeypatch.setenv("ODOO_USERNAME", "bot")
+    monkeypatch.setenv("ODOO_PASSWORD", "secret")
+    get_settings.cache_clear()
+    odoo_lead_cache.invalidate()
+    yield
+    get_settings.cache_clear()
+    odoo_lead_cache.invalidate()
+
+
+def _service(handler):
+    return OdooCRMOpportunityService(transport=httpx.MockTransport(handler), rate_limiter=SQLTokenBucket("odoo", rate=0))
+
+
+def test_calls_go_through_jsonrpc_and_authenticate_once(odoo_env):
+    calls = []
+
+    def handler(request):
+        params = json.loads(request.content)["params"]
+        calls.append((request.url.path, params["service"], params["method"], params["args"]))
+        if params["service"] == "common":
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": 7})
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": [{"id": 42, "name": "Ana"}]})
+
+    async def scenario():
+        service = _service(handler)
+        found = await asyncio.gather(*(service.find_opportunity_by_manychat_id(f"mc-{i}") for i in range(3)))
+        await service.aclose()
+        return found
+
+    assert [item["id"] for item in asyncio.run(scenario())] == [42, 42, 42]
+    assert [call[1:3] for call in calls].count(("common", "authenticate")) == 1
+    assert all(path == "/jsonrpc" for path, *_ in calls)
+    _, _, method, args = calls[-1]
+    assert method == "execute_kw"
+    assert args[:6] == ["crm", 7, "secret", "crm.lead", "search_read", [[["x_studio_manychatid_api", "=", "mc-2"]]]]
+    assert args[6] == {"fields": ["id", "name", "stage_id", "x_studio_manychatid_api", "user_id", "partner_id"], "limit": 1}
+
+
+def test_odoo_errors_become_service_errors(odoo_env):
+    def handler(request):
+        params = json.loads(request.content)["params"]
+        if params["service"] == "common":
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": 7})
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "error": {
+            "code": 200, "message": "Odoo Server Error", "data": {"message": "Invalid field 'x'"}}})
+
+    service = _service(handler)
+    with pytest.raises(OdooRPCError, match="Invalid field 'x'"):
+        asyncio.run(service._execute_odoo_call("crm.lead", "write", [1], {"x": 1}))
+
+
+def test_timeouts_are_transport_errors(odoo_env):
+    def handler(request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    with pytest.raises(OdooTransportError):
+        asyncio.run(_service(handler)._rpc("object", "execute_kw"))
+
+
+def test_event_loop_keeps_running_while_odoo_answers(odoo_env):
+    async def handler(request):
+        await asyncio.sleep(0.2)  # Odoo lento
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": 7})
+
+    async def scenario():
+        service = _service(handler)
+        ticks = 0
+
+        async def sql_work():
+            nonlocal ticks
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        async def odoo_work():
+            await service._authenticate()
+            return ticks  # trabajo SQL avanzado mientras Odoo respondía
+
+        ticks_during_call, _ = await asyncio.gather(odoo_work(), sql_work())
+        await service.aclose()
+        return ticks_during_call
+
+    assert asyncio.run(scenario()) == 10
+
+
+def _recording_handler(calls, existing=None, stored_manychat_id="mc-1", deleted=()):
+    def handler(request):
+        params = json.loads(request.content)["params"]
+        if params["service"] == "common":
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": 7})
+        method = params["args"][4]
+        calls.append(method)
+        if method == "write" and params["args"][5][0][0] in deleted:
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "error": {
+                "code": 200, "message": "Odoo Server Error",
+                "data": {"name": "odoo.exceptions.MissingError", "message": "Record does not exist or has been deleted."}}})
+        result = {
+            "search_read": existing or [],
+            "create": 99,
+            "write": True,
+            "read": [{"id": 99, "x_studio_manychatid_api": stored_manychat_id}],
+        }[method]
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": result})
+    return handler
+
+
+def test_create_and_update_cost_two_calls_without_verification(odoo_env):
+    created, updated = [], []
+
+    asyncio.run(_service(_recording_handler(created)).create_or_update_opportunity("mc-1", "Ana", 16))
+    asyncio.run(_service(_recording_handler(updated, existing=[{"id": 5}])).create_or_update_opportunity("mc-2", "Luis", 17))
+
+    assert created == ["search_read", "create"]
+    assert updated == ["search_read", "write"]
+
+
+def test_sampled_verification_repairs_missing_manychat_id(odoo_env):
+    calls = []
+    service = _service(_recording_handler(calls, stored_manychat_id=False))
+    service.verify_sample_rate = 1.0
+
+    assert asyncio.run(service.create_or_update_opportunity("mc-1", "Ana", 16)) == 99
+    assert calls == ["search_read", "create", "read", "write"]
+
+
+def test_known_lead_id_skips_the_search(odoo_env):
+    calls = []
+    service = _service(_recording_handler(calls))
+
+    assert asyncio.run(service.create_or_update_opportunity("mc-1", "Ana", 17, odoo_lead_id=5)) == 5
+    # Sin argumento, el id sale de la caché en memoria
+    assert asyncio.run(service.update_opportunity_stage("mc-1", 18)) is True
+    assert calls == ["write", "write"]
+
+
+def test_deleted_lead_is_looked_up_again(odoo_env):
+    calls = []
+    service = _service(_recording_handler(calls, existing=[{"id": 6}], deleted={5}))
+
+    assert asyncio.run(service.create_or_update_opportunity("mc-1", "Ana", 17, odoo_lead_id=5)) == 6
+    assert calls == ["write", "search_read", "write"]
+    assert odoo_lead_cache.get("crm.lead", "mc-1") == 6
+
+
+def test_concurrent_stage_updates_become_one_write(odoo_env):
+    calls = []
+    service = _service(_recording_handler(calls))
+
+    async def scenario():
+        return await asyncio.gather(*(
+            service.update_opportunity_stage(f"mc-{lead_id}", 21, odoo_lead_id=lead_id) for lead_id in (1, 2, 3)
+        ))
+
+    assert asyncio.run(scenario()) == [True, True, True]
+    assert calls == ["write"]
+
+
+def test_updates_always_resend_the_stage(odoo_env):
+    writes = []
+
+    def handler(request):
+        params = json.loads(request.content)["params"]
+        if params["service"] == "common":
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": 7})
+        writes.append(params["args"][5][1])
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": True})
+
+    service = _service(handler)
+    update = lambda: service.create_or_update_opportunity("mc-5", "Ana", 20, contact_email="ana@example.com", odoo_lead_id=5)
+
+    asyncio.run(update())
+    # Entretanto alguien mueve el lead en Odoo: el mismo evento vuelve a fijar la etapa
+    asyncio.run(update())
+    assert [write["stage_id"] for write in writes] == [20, 20]
+    assert writes[1]["email_from"] == "ana@example.com"
+
+
+def test_failed_stage_write_makes_the_next_update_resend_the_stage(odoo_env):
+    writes = []
+
+    def handler(request):
+        params = json.loads(request.content)["params"]
+        if params["service"] == "common":
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": 7})
+        writes.append(params["args"][5][1])
+        if params["args"][5][1] == {"stage_id": 21}:
+            raise httpx.ReadTimeout("timeout", request=request)  # Odoo pudo aplicarlo igualmente
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": True})
+
+    service = _service(handler)
+    entered = datetime(2026, 10, 1, 9, 0)
+    update = lambda: service.create_or_update_opportunity("mc-5", "Ana", 20, fecha_ultimo_estado=entered, odoo_lead_id=5)
+
+    asyncio.run(update())
+    with pytest.raises(OdooTransportError):
+        asyncio.run(service.update_opportunity_stage("mc-5", 21, odoo_lead_id=5))
+    writes.clear()
+    asyncio.run(update())
+    assert writes and writes[0]["stage_id"] == 20
@@ -0,0 +1,131 @@
+# tests/test_odoo_write_batcher.py
+import asyncio
+
+import pytest
+
+from app.services.odoo_write_batcher import OdooWriteBatcher
+
+
+class FakeOdoo:
+    """Registra las llamadas y responde como Odoo; `missing` son ids borrados."""
+
+    def __init__(self, missing=(), create_error=None):
+        self.calls = []
+        self.missing = set(missing)
+        self.create_error = create_error
+        self.next_id = 100
+
+    async def __call__(self, model, method, *args):
+        self.calls.append((method, args))
+        if method == "write":
+            if self.missing & set(args[0]):
+                raise LookupError(f"Record does not exist: {sorted(self.missing & set(args[0]))}")
+            return True
+        if self.create_error is not None and len(args[0]) > 1:
+            raise self.create_error
+        ids = list(range(self.next_id, self.next_id + len(args[0])))
+        self.next_id += len(ids)
+        return ids
+
+
+def test_writes_with_identical_values_share_one_call():
+    odoo = FakeOdoo()
+    batcher = OdooWriteBatcher(odoo, window=0.01)
+
+    async def scenario():
+        await asyncio.gather(
+            *(batcher.write("crm.lead", lead_id, {"stage_id": 21}) for lead_id in (1, 2, 3)),
+            batcher.write("crm.lead", 4, {"stage_id": 22}),
+        )
+
+    asyncio.run(scenario())
+    assert odoo.calls == [("write", ([1, 2, 3], {"stage_id": 21})), ("write", ([4], {"stage_id": 22}))]
+    assert batcher.stats() == {"queued": 4, "calls": 2}
+
+
+def test_new_leads_go_through_one_multi_record_create():
+    odoo = FakeOdoo()
+    batcher = OdooWriteBatcher(odoo, window=0.01, max_batch=2)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.create("crm.lead", {"name": name}) for name in ("a", "b", "c")))
+
+    assert asyncio.run(scenario()) == [100, 101, 102]
+    assert [len(args[0]) for method, args in odoo.calls] == [2, 1]
+
+
+class RejectedByOdoo(Exception):
+    pass
+
+
+def test_create_rejected_by_odoo_is_retried_per_record():
+    odoo = FakeOdoo(create_error=RejectedByOdoo("Invalid field"))
+    batcher = OdooWriteBatcher(odoo, window=0.01, create_retry_errors=(RejectedByOdoo,))
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.create("crm.lead", {"name": name}) for name in ("a", "b")))
+
+    assert asyncio.run(scenario()) == [100, 101]
+    assert [len(args[0]) for _, args in odoo.calls] == [2, 1, 1]
+
+
+def test_create_with_unknown_outcome_is_not_repeated():
+    # Tras un timeout el lote pudo quedar creado: reintentar duplicaría cada lead.
+    odoo = FakeOdoo(create_error=TimeoutError("read timeout"))
+    batcher = OdooWriteBatcher(odoo, window=0.01, create_retry_errors=(RejectedByOdoo,))
+
+    async def scenario():
+        return await asyncio.gather(
+            *(batcher.create("crm.lead", {"name": name}) for name in ("a", "b", "c")), return_exceptions=True
+        )
+
+    assert all(isinstance(result, TimeoutError) for result in asyncio.run(scenario()))
+    assert len(odoo.calls) == 1
+
+
+def test_failed_group_is_retried_per_record():
+    odoo = FakeOdoo(missing={2})
+    batcher = OdooWriteBatcher(odoo, window=0.01)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(batcher.write("crm.lead", lead_id, {"stage_id": 21}) for lead_id in (1, 2, 3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], LookupError)
+    assert [args[0] for _, args in odoo.calls] == [[1, 2, 3], [1], [2], [3]]
+
+
+def test_writes_to_the_same_record_keep_their_order():
+    odoo = FakeOdoo()
+    batcher = OdooWriteBatcher(odoo, window=0.01)
+
+    async def scenario():
+        await asyncio.gather(
+            batcher.write("crm.lead", 9, {"stage_id": 22}),
+            batcher.write("crm.lead", 5, {"stage_id": 21}),
+            batcher.write("crm.lead", 5, {"stage_id": 22}),
+        )
+
+    asyncio.run(scenario())
+    # El 5 no entra en el primer grupo de stage 22: su escritura de stage 21 debe ir antes
+    assert odoo.calls == [
+        ("write", ([9], {"stage_id": 22})),
+        ("write", ([5], {"stage_id": 21})),
+        ("write", ([5], {"stage_id": 22})),
+    ]
+
+
+@pytest.mark.parametrize("method", ["write", "create"])
+def test_zero_window_calls_odoo_directly(method):
+    odoo = FakeOdoo()
+    batcher = OdooWriteBatcher(odoo, window=0)
+
+    if method == "write":
+        assert asyncio.run(batcher.write("crm.lead", 1, {"stage_id": 21})) is None
+    else:
+        assert asyncio.run(batcher.create("crm.lead", {"name": "a"})) == 100
+    assert len(odoo.calls) == 1
@@ -0,0 +1,136 @@
+# tests/test_outbox_relay.py
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.db.models import Outbox
+from app.db.repositories import OutboxRepository
+from workers import outbox_relay
+
+
+class FakeQueueService:
+    """Registra los envíos; las colas de `failing` lanzan error."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    async def send_message(self, queue_name, message):
+        if queue_name in self.failing:
+            raise RuntimeError(f"cola {queue_name} no disponible")
+        self.sent.append((queue_name, message))
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    path = tmp_path / "outbox.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        repo = OutboxRepository(db)
+        repo.add("crm", {"manychat_id": "mc-1"})
+        repo.add("crm", {"manychat_id": "mc-2"})
+        repo.add("direcciones", {"manychat_id": "mc-3"})
+        db.commit()
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def Session(db_url):
+    engine = create_engine(f"sqlite:///{db_url}")
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def relay_db(db_url, monkeypatch):
+    """El relay usa una AsyncSession sobre la misma base SQLite del test."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_url}")
+    factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def session():
+        async with factory() as db:
+            yield db
+
+    monkeypatch.setattr(outbox_relay, "get_async_db_session", session)
+    yield
+    engine.sync_engine.dispose()
+
+
+def _rows(Session):
+    with Session() as db:
+        return {m.id: (m.status, m.attempts, m.lease_owner) for m in db.query(Outbox).order_by(Outbox.id)}
+
+
+def test_concurrent_claims_never_share_events(Session):
+    with Session() as first, Session() as second:
+        a = OutboxRepository(first).claim_pending("relay-a", 2, 60)
+        first.commit()
+        b = OutboxRepository(second).claim_pending("relay-b", 2, 60)
+        second.commit()
+
+    assert [m.id for m in a] == [1, 2] and [m.id for m in b] == [3]
+    assert {m.status for m in a + b} == {"publishing"}
+    assert {m.lease_owner for m in b} == {"relay-b"}
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_cannot_mark(Session):
+    with Session() as db:
+        repo = OutboxRepository(db)
+        claimed = repo.claim_pending("relay-a", 1, 60)
+        db.commit()
+        db.query(Outbox).filter(Outbox.id == claimed[0].id).update(
+            {Outbox.lease_expires_at: datetime.now(timezone.utc) - timedelta(seconds=1)}
+        )
+        db.commit()
+
+        assert [m.id for m in repo.claim_pending("relay-b", 1, 60)] == [claimed[0].id]
+        repo.mark_sent([claimed[0].id], owner="relay-a")
+        db.commit()
+
+    assert _rows(Session)[claimed[0].id] == ("publishing", 0, "relay-b")
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_claimed_events(Session, relay_db):
+    queue = FakeQueueService()
+
+    assert await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=3) == 3
+    assert sorted(message["manychat_id"] for _, message in queue.sent) == ["mc-1", "mc-2", "mc-3"]
+    assert set(_rows(Session).values()) == {("sent", 0, None)}
+    assert await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=3) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_events_go_back_to_pending_and_are_retried(Session, relay_db):
+    queue = FakeQueueService(failing={"direcciones"})
+
+    assert await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=3) == 3
+    assert _rows(Session)[3] == ("pending", 1, None)
+    with Session() as db:
+        assert "no disponible" in db.get(Outbox, 3).last_error
+
+    queue.failing.clear()
+    assert await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=3) == 1
+    assert _rows(Session)[3] == ("sent", 1, None)
+
+
+@pytest.mark.asyncio
+async def test_events_fail_for_good_after_max_attempts(Session, relay_db):
+    queue = FakeQueueService(failing={"crm", "direcciones"})
+
+    await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=2)
+    assert set(_rows(Session).values()) == {("pending", 1, None)}
+    await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=2)
+    assert set(_rows(Session).values()) == {("failed", 2, None)}
+
+    queue.failing.clear()
+    assert await outbox_relay.relay_outbox_once(queue, batch_size=10, max_attempts=2) == 0
+    assert queue.sent == []
@@ -0,0 +1,47 @@
+# tests/test_pagination.py
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.pagination import NEXT_CURSOR_HEADER, PageParams, decode_cursor, paginate
+from app.db.session import Base
+from app.db.models import Channel
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([Channel(name=f"canal-{i}") for i in range(7)])
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def test_cursor_pages_walk_the_whole_table(db):
+    seen, cursor = [], None
+    while True:
+        response = Response()
+        rows = paginate(db.query(Channel), Channel.id, PageParams(limit=3, cursor=cursor), response)
+        seen.extend(row.name for row in rows)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    assert seen == [f"canal-{i}" for i in range(7)]
+
+
+def test_filters_apply_before_the_page(db):
+    response = Response()
+    rows = paginate(db.query(Channel).filter(Channel.name != "canal-0"), Channel.id, PageParams(limit=6), response)
+
+    assert [row.name for row in rows] == [f"canal-{i}" for i in range(1, 7)]
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("no-es-un-cursor")
+    assert exc.value.status_code == 400
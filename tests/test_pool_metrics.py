@@ -0,0 +1,46 @@
+# tests/test_pool_metrics.py
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from app.db.pool_metrics import instrument_engine, instrumented_pool_class
+from app.db.session import warm_up_pool
+
+
+def _engine(tmp_path):
+    return create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=instrumented_pool_class(QueuePool),
+        pool_size=3,
+        max_overflow=1,
+    )
+
+
+def test_pool_metrics_track_checkouts_and_waits(tmp_path):
+    engine = _engine(tmp_path)
+    metrics = instrument_engine(engine, "test")
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("SELECT 1"))
+        second.execute(text("SELECT 1"))
+        busy = metrics.snapshot()
+
+    idle = metrics.snapshot()
+    assert busy["checked_out"] == 2
+    assert idle["checked_out"] == 0
+    assert idle["checkouts"] == 2
+    assert idle["connects"] == 2
+    assert idle["checkout_wait"]["count"] == 2
+    assert idle["connection_age_s"]["open"] == 2
+    engine.dispose()
+
+
+def test_warm_up_pool_leaves_connections_idle(tmp_path):
+    engine = _engine(tmp_path)
+    metrics = instrument_engine(engine, "test")
+
+    opened = warm_up_pool(engine, 2)
+
+    snapshot = metrics.snapshot()
+    assert opened == 2
+    assert (snapshot["idle"], snapshot["checked_out"], snapshot["connects"]) == (2, 0, 2)
+    engine.dispose()
@@ -0,0 +1,74 @@
+# tests/test_rate_limit.py
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.db import rate_limit
+from app.db.models import RateLimitBucket
+from app.db.rate_limit import SQLTokenBucket
+from app.db.session import Base
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rate_limit.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 1000.0)
+
+
+def test_processes_share_one_budget(engine, frozen_clock):
+    api, worker = SQLTokenBucket("odoo", rate=10, burst=2, engine=engine), SQLTokenBucket("odoo", rate=10, burst=2, engine=engine)
+
+    waits = [bucket.reserve() for bucket in (api, worker, api, worker)]
+
+    assert waits == pytest.approx([0.0, 0.0, 0.1, 0.2])
+    with engine.connect() as connection:
+        row = connection.execute(select(RateLimitBucket.tokens, RateLimitBucket.version)).one()
+    assert row.tokens == pytest.approx(-2.0) and row.version == 3
+
+
+def test_concurrent_reservations_never_share_a_turn(engine, frozen_clock):
+    buckets = [SQLTokenBucket("odoo", rate=10, engine=engine) for _ in range(4)]
+    waits = []
+
+    def reserve_many(bucket):
+        for _ in range(5):
+            waits.append(bucket.reserve())
+
+    threads = [threading.Thread(target=reserve_many, args=(bucket,)) for bucket in buckets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(bucket.stats()["fallbacks"] for bucket in buckets) == 0
+    assert sorted(round(wait, 6) for wait in waits) == [round(0.1 * i, 6) for i in range(20)]
+
+
+def test_unavailable_database_falls_back_to_local_bucket(tmp_path, frozen_clock):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")  # sin la tabla Rate_Limit_Bucket
+    bucket = SQLTokenBucket("odoo", rate=2, engine=engine)
+
+    assert [bucket.reserve(), bucket.reserve()] == [0.0, 0.5]
+    assert bucket.stats()["fallbacks"] == 2
+
+
+def test_acquire_waits_and_records_histogram(engine):
+    bucket = SQLTokenBucket("odoo", rate=50, engine=engine)
+
+    async def scenario():
+        return [await bucket.acquire() for _ in range(3)]
+
+    waits = asyncio.run(scenario())
+    assert waits[0] == 0.0 and all(0 < wait <= 0.02 for wait in waits[1:])
+    stats = bucket.stats()
+    assert stats["acquired"] == 3
+    assert stats["wait"]["histogram"]["<=0s"] == 1 and stats["wait"]["histogram"]["<=0.1s"] == 2
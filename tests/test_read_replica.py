@@ -0,0 +1,48 @@
+# tests/test_read_replica.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db import session as db_session
+from app.db.governor import DBGovernor
+
+
+def test_read_only_url_adds_application_intent():
+    plain = db_session.read_only_url("mssql+pyodbc://u:p@server/db?driver=ODBC+Driver+18+for+SQL+Server")
+    assert plain.query["ApplicationIntent"] == "ReadOnly"
+
+    odbc = db_session.read_only_url("mssql+pyodbc:///?odbc_connect=Driver%3D%7BODBC%7D%3BServer%3Dsrv%3B")
+    assert odbc.query["odbc_connect"].endswith(";ApplicationIntent=ReadOnly")
+
+    assert db_session.read_only_url("sqlite:///local.db").query == {}
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE marker (name TEXT)"))
+        connection.execute(text("INSERT INTO marker VALUES ('replica')"))
+    monkeypatch.setattr(db_session, "read_engine", engine)
+    monkeypatch.setattr(db_session, "read_db_governor", DBGovernor(2, 2, 0.1, name="read-db"))
+    monkeypatch.setattr(db_session, "_replica_down_until", 0.0)
+    monkeypatch.setattr(db_session.settings, "DB_REPLICA_MAX_LAG", 5)
+    yield engine
+    engine.dispose()
+
+
+def test_reads_go_to_replica_only_within_staleness_tolerance(replica):
+    with db_session.read_connection(max_staleness=60) as connection:
+        assert connection.engine is replica
+    with db_session.read_connection(max_staleness=0) as connection:
+        assert connection.engine is db_session.engine
+
+
+def test_replica_failure_falls_back_to_primary(replica, monkeypatch):
+    def refuse():
+        raise OperationalError("connect", {}, Exception("replica down"))
+    monkeypatch.setattr(replica, "connect", refuse)
+
+    with db_session.read_connection(max_staleness=60) as connection:
+        assert connection.engine is db_session.engine
+    assert not db_session._replica_usable(60)
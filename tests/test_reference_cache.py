@@ -0,0 +1,95 @@
+# tests/test_reference_cache.py
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.session import Base, enable_sqlite_savepoints
+from app.db.models import Campaign, Channel
+from app.db.repositories import CampaignRepository, ChannelRepository
+from app.utils.cache import MISSING, TTLCache, reference_cache
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    enable_sqlite_savepoints(engine)
+    Base.metadata.create_all(engine)
+    reference_cache.invalidate()
+    yield engine
+    reference_cache.invalidate()
+    engine.dispose()
+
+
+def _count_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: args[2] != "BEGIN" and statements.append(args[2]))
+    return statements
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("Channel", "a", 1)
+    cache.set("Channel", "b", 2)
+    cache.get("Channel", "a")
+    cache.set("Channel", "c", 3)
+
+    assert cache.get("Channel", "b") is MISSING
+    assert cache.get("Channel", "a") == 1
+    time.sleep(0.06)
+    assert cache.get("Channel", "a") is MISSING
+
+
+def test_cached_lookups_skip_the_database(sqlite_engine):
+    Session = sessionmaker(bind=sqlite_engine, expire_on_commit=False)
+    with Session() as db:
+        db.add(Campaign(id=10, name="Verano", date_start=datetime(2025, 1, 1)))
+        db.commit()
+        CampaignRepository(db).get_by_id(10)
+
+    statements = _count_statements(sqlite_engine)
+    with Session() as db:
+        campaign = CampaignRepository(db).get_by_id(10)
+        assert campaign.name == "Verano"
+        assert campaign in db
+    assert statements == []
+
+    reference_cache.invalidate("Campaign")
+    with Session() as db:
+        CampaignRepository(db).get_by_id(10)
+    assert len(statements) == 1
+
+
+def test_channel_created_in_rolled_back_transaction_is_not_cached(sqlite_engine):
+    Session = sessionmaker(bind=sqlite_engine, expire_on_commit=False)
+    with Session() as db:
+        repo = ChannelRepository(db)
+        repo.get_or_create_by_name("WhatsApp")
+        assert repo.get_by_name("WhatsApp") is not None
+        db.rollback()
+
+    assert reference_cache.get("Channel", ("name", "WhatsApp")) is MISSING
+    with Session() as db:
+        assert ChannelRepository(db).get_by_name("WhatsApp") is None
+
+
+def test_concurrent_channel_creation_reuses_existing_row(sqlite_engine):
+    Session = sessionmaker(bind=sqlite_engine, expire_on_commit=False)
+    with Session() as db:
+        db.add(Channel(name="Facebook"))
+        db.commit()
+
+    with Session() as db:
+        # Simula que otro proceso creó el canal después de nuestra lectura
+        repo = ChannelRepository(db)
+        repo.get_by_name = lambda name: None
+        channel = repo.get_or_create_by_name("Facebook")
+        db.commit()
+
+    with Session() as db:
+        assert db.query(Channel).filter(Channel.name == "Facebook").count() == 1
+    assert channel.name == "Facebook"
@@ -0,0 +1,49 @@
+# tests/test_relationship_loading.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.db.models import Advisor, Campaign, CampaignContact, Contact
+from app.db.repositories import CampaignContactRepository
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as db:
+        db.add_all([
+            Contact(id=1, manychat_id="mc-1", first_name="Ana"),
+            Campaign(id=1, name="Campaña", date_start=datetime(2025, 1, 1)),
+            Advisor(id=1, name="Asesor", email="asesor@example.com"),
+            CampaignContact(contact_id=1, campaign_id=1, commercial_advisor_id=1),
+        ])
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def test_lazy_relationship_access_raises(Session):
+    with Session() as db:
+        cc = CampaignContactRepository(db).get_by_contact_and_campaign(1, 1)
+        with pytest.raises(InvalidRequestError):
+            cc.contact
+
+
+def test_relations_are_loaded_in_a_single_query(Session):
+    statements = []
+    event.listen(Session.kw["bind"], "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with Session() as db:
+        cc = CampaignContactRepository(db).get_by_contact_and_campaign(1, 1, with_relations=True)
+        assert cc.contact.manychat_id == "mc-1"
+        assert cc.campaign.name == "Campaña"
+        assert cc.commercial_advisor.email == "asesor@example.com"
+        assert cc.medical_advisor is None
+
+    assert len(statements) == 1
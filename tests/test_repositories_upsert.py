@@ -0,0 +1,88 @@
+# tests/test_repositories_upsert.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.session import Base
+from app.db.models import Campaign, Contact
+from app.db.repositories import ContactRepository, CampaignContactRepository
+
+
+@pytest.fixture
+def sqlite_session():
+    """Sesión sobre SQLite en memoria con el esquema completo (no usa la base real)."""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_contact_upsert_keeps_existing_values_for_none(sqlite_session):
+    repo = ContactRepository(sqlite_session)
+    created = repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana", "email": "ana@example.com"})
+    updated = repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana María", "email": None})
+
+    assert updated.id == created.id
+    assert updated.first_name == "Ana María"
+    assert updated.email == "ana@example.com"
+    assert sqlite_session.query(Contact).count() == 1
+
+
+def test_contact_bulk_upsert_merges_duplicate_keys(sqlite_session):
+    repo = ContactRepository(sqlite_session)
+    contacts = repo.bulk_create_or_update([
+        {"manychat_id": "mc-1", "first_name": "Ana"},
+        {"manychat_id": "mc-2", "first_name": "Luis"},
+        {"manychat_id": "mc-1", "last_name": "Pérez"},
+    ])
+
+    by_id = {c.manychat_id: c for c in contacts}
+    assert len(contacts) == 2
+    assert (by_id["mc-1"].first_name, by_id["mc-1"].last_name) == ("Ana", "Pérez")
+
+
+def test_campaign_contact_upsert_resets_sync_status_and_keeps_registration(sqlite_session):
+    sqlite_session.add(Contact(id=1, manychat_id="mc-1", first_name="Ana"))
+    sqlite_session.add(Campaign(id=10, name="Verano", date_start=datetime(2025, 1, 1)))
+    sqlite_session.commit()
+    repo = CampaignContactRepository(sqlite_session)
+
+    first = repo.create_or_update_assignment({"contact_id": 1, "campaign_id": 10, "summary": "Inicial"})
+    registration_date = first.registration_date
+    first.sync_status = "synced"
+    sqlite_session.commit()
+
+    second = repo.create_or_update_assignment({
+        "contact_id": 1, "campaign_id": 10, "last_state": "Retornó en AC",
+        "registration_date": datetime(2020, 1, 1),
+    })
+    assert second.id == first.id
+    assert second.sync_status == "new"
+    assert second.summary == "Inicial"
+    assert second.last_state == "Retornó en AC"
+    assert second.registration_date == registration_date
+
+
+def test_repositories_only_flush_until_caller_commits(sqlite_session):
+    repo = ContactRepository(sqlite_session)
+    repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana"})
+    sqlite_session.rollback()
+
+    assert sqlite_session.query(Contact).count() == 0
+
+
+def test_contact_upsert_keeps_stored_odoo_lead_id(sqlite_session):
+    repo = ContactRepository(sqlite_session)
+    contact = repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana"})
+    repo.set_odoo_lead_id(contact.id, 321)
+    repo.create_or_update({"manychat_id": "mc-1", "first_name": "Ana María"})
+    sqlite_session.commit()
+
+    assert sqlite_session.get(Contact, contact.id, populate_existing=True).odoo_lead_id == 321
@@ -0,0 +1,86 @@
+# tests/test_sync_log.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+
+from app.db.session import Base
+from app.db.models import SyncLog
+from app.db.sync_log import SyncLogRecorder
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync_log.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _count(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(SyncLog)).scalar()
+
+
+def test_record_only_buffers_and_flush_writes_in_batches(engine):
+    inserts = []
+    event.listen(engine, "before_cursor_execute", lambda *args: inserts.append(args[5]) if args[2].startswith("INSERT") else None)
+    recorder = SyncLogRecorder(engine, batch_size=3, flush_seconds=60)
+    recorder._ensure_started = lambda: None  # sin hilo de fondo: se vacía a mano
+
+    for i in range(7):
+        recorder.record("odoo", "Opportunity", f"mc-{i}", "upsert", "success", {"opportunity_id": i})
+    assert _count(engine) == 0
+
+    assert recorder.flush() == 7
+    assert inserts == [True, True, False]  # executemany por lote; el último tiene una sola fila
+    assert recorder.stats() == {"buffered": 0, "written": 7, "dropped": 0, "failed_flushes": 0}
+    with engine.connect() as connection:
+        assert connection.execute(select(SyncLog.details).where(SyncLog.entity_id == "mc-6")).scalar() == '{"opportunity_id": 6}'
+
+
+def test_full_buffer_drops_oldest_and_failed_flush_keeps_entries(engine):
+    recorder = SyncLogRecorder(engine, batch_size=10, max_buffer=3)
+    recorder._ensure_started = lambda: None
+    for i in range(5):
+        recorder.record("azure_sql", "Contact", i, "upsert", "success")
+    assert recorder.stats()["dropped"] == 2
+
+    SyncLog.__table__.drop(engine)
+    assert recorder.flush() == 0
+    assert recorder.stats()["buffered"] == 3 and recorder.stats()["failed_flushes"] == 1
+
+    SyncLog.__table__.create(engine)
+    assert recorder.flush() == 3
+    with engine.connect() as connection:
+        assert connection.execute(select(SyncLog.entity_id).order_by(SyncLog.id)).scalars().all() == ["2", "3", "4"]
+
+
+def test_background_thread_flushes_when_batch_is_full(engine):
+    recorder = SyncLogRecorder(engine, batch_size=2, flush_seconds=30)
+    recorder.record("azure_sql", "Contact", 1, "upsert", "success")
+    recorder.record("azure_sql", "Contact", 2, "upsert", "error", "boom")
+    recorder._thread.join(timeout=0.5)  # el hilo sigue vivo; solo se le da tiempo a escribir
+    assert _count(engine) == 2
+    recorder.close()
+
+
+def test_retention_deletes_old_rows_and_compacts_successful_details(engine):
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(SyncLog.__table__.insert(), [
+            {"source_system": "odoo", "entity_type": "Opportunity", "entity_id": "old", "action": "upsert",
+             "status": "success", "details": "x", "created_at": now - timedelta(days=100)},
+            {"source_system": "odoo", "entity_type": "Opportunity", "entity_id": "ok", "action": "upsert",
+             "status": "success", "details": "x", "created_at": now - timedelta(days=10)},
+            {"source_system": "odoo", "entity_type": "Opportunity", "entity_id": "failed", "action": "upsert",
+             "status": "error", "details": "x", "created_at": now - timedelta(days=10)},
+            {"source_system": "odoo", "entity_type": "Opportunity", "entity_id": "recent", "action": "upsert",
+             "status": "success", "details": "x", "created_at": now},
+        ])
+
+    recorder = SyncLogRecorder(engine, retention_days=90, compact_after_days=7)
+    assert recorder.apply_retention(now) == {"deleted": 1, "compacted": 1}
+    with engine.connect() as connection:
+        rows = dict(connection.execute(select(SyncLog.entity_id, SyncLog.details)).all())
+    assert rows == {"ok": None, "failed": "x", "recent": "x"}
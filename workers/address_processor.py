@@ -11,8 +11,9 @@ import os
 from app.services.queue_service import QueueService, QueueServiceError
 from app.schemas.manychat import ManyChatAddressEvent
 from app.core.logging import logger
-from app.db.session import get_db
-from app.db.repositories import AddressRepository
+from app.db.session import async_unit_of_work
+from app.db.async_repositories import AsyncAddressRepository
+from app.db.sync_log import sync_log
 
 async def process_address_events():
     """
@@ -35,26 +36,26 @@ async def process_address_events():
             message = await queue_service.receive_message(queue_service.address_queue_name)
             if message:
                 logger.info(f"Mensaje recibido de la cola de direcciones. ID: {message.id}")
-                db_session_generator = get_db()
-                db = next(db_session_generator)
                 try:
                     event_data = json.loads(message.content)
                     event = ManyChatAddressEvent(**event_data)
                     logger.info(f"Procesando evento de dirección para ManyChat ID: {event.manychat_id}")
-                    address_repo = AddressRepository(db)
-                    address_payload = event.dict(exclude={'manychat_id'})
-                    new_address = address_repo.add_address_to_contact(
-                        manychat_id=event.manychat_id,
-                        address_data=address_payload
-                    )
+                    async with async_unit_of_work() as db:
+                        address_repo = AsyncAddressRepository(db)
+                        address_payload = event.dict(exclude={'manychat_id'})
+                        new_address = await address_repo.add_address_to_contact(
+                            manychat_id=event.manychat_id,
+                            address_data=address_payload
+                        )
                     if new_address:
                         logger.info(f"Dirección con ID {new_address.id} añadida exitosamente al contacto con manychat_id {event.manychat_id}.")
+                        sync_log.record("azure_sql", "Address", event.manychat_id, "create", "success", {"address_id": new_address.id})
                     else:
                         logger.warning(f"No se pudo añadir la dirección para el manychat_id {event.manychat_id} porque el contacto no fue encontrado.")
+                        sync_log.record("azure_sql", "Address", event.manychat_id, "create", "skipped", "Contacto no encontrado")
                 except Exception as e:
                     logger.error(f"Error al procesar el mensaje de dirección: {e}", exc_info=True)
-                finally:
-                    next(db_session_generator, None)
+                    sync_log.record("azure_sql", "Address", message.id, "create", "error", str(e))
                 await queue_service.delete_message(queue_service.address_queue_name, message.id, message.pop_receipt)
             else:
                 logger.info(f"No hay mensajes en la cola de direcciones. Esperando {sync_interval} segundos...")
@@ -14,8 +14,14 @@ Este worker implementa el patrón recomendado de desacoplamiento por colas, perm
 - Reintentos automáticos y tolerancia a fallos.
 - Escalabilidad y resiliencia ante picos de tráfico.
 
+Reclamo concurrente:
+- Cada ciclo reclama un lote con CampaignContactRepository.claim_pending: las filas pasan a
+  'processing' con un lease a nombre de esta instancia (WORKER_ID) y ninguna otra las toma.
+- Al terminar, finish_claim las deja en 'synced' o 'error' solo si el lease sigue siendo propio.
+- Si una instancia muere, sus filas se vuelven a reclamar cuando vence el lease
+  (CAMPAIGN_LEASE_SECONDS), así que se pueden ejecutar varias réplicas sin trabajo duplicado.
+
 Recomendaciones:
-- Ejecutar solo una instancia de este worker para evitar saturar Odoo.
 - Monitorear métricas y errores para detectar cuellos de botella.
 - Mantener la lógica idempotente para evitar duplicados en reintentos.
 """
@@ -24,8 +30,10 @@ Recomendaciones:
 
 import asyncio
 import os
+import socket
 from app.db.session import get_db_session_worker
-from app.db.models import CampaignContact, ContactState
+from app.db.repositories import CampaignContactRepository, ContactStateRepository
+from app.db.sync_log import sync_log
 
 from app.core.logging import logger
 
@@ -46,50 +54,54 @@ MANYCHAT_TO_ODOO_STAGE = {
 
 # Constante para el intervalo de sincronización por defecto
 DEFAULT_SYNC_INTERVAL = 10
+# Filas reclamadas por ciclo y duración del lease (segundos) por defecto
+DEFAULT_CLAIM_BATCH = 100
+DEFAULT_LEASE_SECONDS = 300
+
+# Identificador de esta instancia en los leases de Campaign_Contact
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
 
 async def process_campaign_contacts():
     """
     Worker que procesa CampaignContact con sync_status 'new', 'updated' o 'error'.
     """
     sync_interval = int(os.getenv("SYNC_INTERVAL", DEFAULT_SYNC_INTERVAL))
-    logger.info(f"Worker de campaña iniciado. Procesando CampaignContact con sync_status relevante. Intervalo: {sync_interval}s")
+    claim_batch = int(os.getenv("CAMPAIGN_CLAIM_BATCH", DEFAULT_CLAIM_BATCH))
+    lease_seconds = int(os.getenv("CAMPAIGN_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+    logger.info(f"Worker de campaña {WORKER_ID} iniciado. Procesando CampaignContact con sync_status relevante. Intervalo: {sync_interval}s")
     while True:
         try:
             for db in get_db_session_worker():
-                contacts = db.query(CampaignContact).filter(CampaignContact.sync_status.in_(["new", "updated", "error"])).all()
+                campaign_contact_repo = CampaignContactRepository(db)
+                contacts = campaign_contact_repo.claim_pending(WORKER_ID, claim_batch, lease_seconds)
+                db.commit()
                 if not contacts:
                     logger.info(f"No hay CampaignContact pendientes. Esperando {sync_interval} segundos...")
                     await asyncio.sleep(sync_interval)
                     continue
                 for cc in contacts:
                     try:
-                        # Obtener el último estado relevante de ContactState para este contacto
-                        contact_state = db.query(ContactState).filter(
-                            ContactState.contact_id == cc.contact_id
-                        ).order_by(ContactState.created_at.desc()).first()
+                        # Obtener el estado actual del contacto (Contact.current_state_id ya apunta a él)
+                        contact_state = ContactStateRepository(db).get_latest_by_contact(cc.contact_id)
 
+                        values = {}
                         if contact_state:
                             # Actualizamos el last_state en CampaignContact con el último estado
-                            cc.last_state = contact_state.state
+                            values["last_state"] = contact_state.state
                             logger.info(f"Procesando CampaignContact {cc.id} (contact_id={cc.contact_id}, campaign_id={cc.campaign_id}). Actualizando last_state a: '{contact_state.state}'")
 
-                            # Aseguramos que el Contact tenga el estado más reciente
-                            contact = cc.contact
-                            if contact:
-                                contact.last_state_id = contact_state.id
-                                db.add(contact)
-                                db.commit()
-                                logger.info(f"Contact {contact.id} actualizado con último estado ID: {contact_state.id}")
-
-                        cc.sync_status = "synced"
-                        db.add(cc)
+                        finished = campaign_contact_repo.finish_claim(cc.id, WORKER_ID, "synced", **values)
                         db.commit()
-                        logger.info(f"CampaignContact {cc.id} actualizado correctamente en Azure SQL.")
+                        if finished:
+                            sync_log.record("azure_sql", "CampaignContact", cc.id, "sync", "success", values or None)
+                            logger.info(f"CampaignContact {cc.id} actualizado correctamente en Azure SQL.")
+                        else:
+                            logger.warning(f"CampaignContact {cc.id} cambió o su lease venció durante el proceso; se volverá a reclamar.")
                     except Exception as e:
                         db.rollback()
-                        cc.sync_status = "error"
-                        db.add(cc)
+                        campaign_contact_repo.finish_claim(cc.id, WORKER_ID, "error")
                         db.commit()
+                        sync_log.record("azure_sql", "CampaignContact", cc.id, "sync", "error", str(e))
                         logger.error(f"Error al sincronizar CampaignContact {cc.id}: {e}")
             await asyncio.sleep(sync_interval)
         except Exception as e:
@@ -26,6 +26,7 @@ from app.services.queue_service import QueueService, QueueServiceError
 from app.services.azure_sql_service import AzureSQLService
 from app.schemas.manychat import ManyChatContactEvent
 from app.core.logging import logger
+from app.db.sync_log import sync_log
 from app.db.models import Contact
 
 async def process_contact_events(queue_service: QueueService, sql_service: AzureSQLService):
@@ -41,16 +42,20 @@ async def process_contact_events(queue_service: QueueService, sql_service: Azure
             message = await queue_service.receive_message(queue_service.contact_queue_name)
             if message:
                 logger.info(f"Mensaje recibido de la cola de contactos. ID: {message.id}")
-                logger.info(f"Contenido bruto del mensaje recibido: {message.content}")
+                # Los payloads completos solo con LOG_LEVEL=DEBUG; el rastro de cada evento queda en Sync_Log.
+                logger.debug(f"Contenido bruto del mensaje recibido: {message.content}")
+                manychat_id = None
                 try:
                     event_data = json.loads(message.content)
-                    logger.info(f"Payload parseado: {event_data}")
+                    manychat_id = event_data.get("manychat_id")
                     event = ManyChatContactEvent(**event_data)
-                    logger.info(f"Evento ManyChatContactEvent parseado: {event}")
+                    logger.debug(f"Evento ManyChatContactEvent parseado: {event}")
                     result = await sql_service.process_contact_event(event)
-                    logger.info(f"Evento de contacto procesado: {result}")
+                    logger.info(f"Evento de contacto procesado. manychat_id: {event.manychat_id}")
+                    sync_log.record("azure_sql", "Contact", event.manychat_id, "upsert", "success", result)
                 except Exception as e:
                     logger.error(f"Error al parsear o procesar el mensaje: {e}")
+                    sync_log.record("azure_sql", "Contact", manychat_id or message.id, "upsert", "error", str(e))
                 # ...lógica de sincronización con Odoo eliminada...
                 # Elimina el mensaje de la cola tras procesar
                 await queue_service.delete_message(queue_service.contact_queue_name, message.id, message.pop_receipt)
@@ -3,160 +3,226 @@ import asyncio
 import json
 import logging
 import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
 from app.services.queue_service import QueueService
 from app.services.odoo_crm_opportunity_service import odoo_crm_opportunity_service
 from app.schemas.crm_opportunity import CRMOpportunityEvent
-from app.db.models import Channel, CampaignContact
+from app.db.models import Channel
+from app.db.sync_log import sync_log
 
 # Configuración de logging robusta
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger("crm_opportunity_worker")
 
+# Mensajes procesados a la vez. Mientras uno espera a Odoo, los demás avanzan con Azure SQL;
+# el ritmo de llamadas a Odoo lo sigue controlando el servicio.
+DEFAULT_CONCURRENCY = 5
+
+
 class CRMProcessor:
     def __init__(self):
         self.queue_service = QueueService()
         self.queue_name = self.queue_service.crm_queue_name
         self.sync_interval = int(os.getenv("SYNC_INTERVAL", 10))
+        self.concurrency = max(1, int(os.getenv("CRM_CONCURRENCY", DEFAULT_CONCURRENCY)))
+        # manychat_id -> [lock, mensajes en curso]: los eventos de un mismo contacto no se solapan
+        self._contact_locks: Dict[str, list] = {}
 
     async def process(self):
-        logger.info("Iniciando worker de oportunidades CRM → Odoo...")
-        while True:
-            try:
-                message = await self.queue_service.receive_message(self.queue_name)
+        logger.info(f"Iniciando worker de oportunidades CRM → Odoo (concurrencia: {self.concurrency})...")
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    message = await self.queue_service.receive_message(self.queue_name)
+                except Exception as e:
+                    slots.release()
+                    logger.error(f"Error en el procesamiento del worker CRM: {e}")
+                    await asyncio.sleep(self.sync_interval)
+                    continue
                 if not message:
+                    slots.release()
                     logger.info(f"No hay mensajes en la cola '{self.queue_name}'. Esperando {self.sync_interval} segundos...")
                     await asyncio.sleep(self.sync_interval)
                     continue
-                data = json.loads(message.content)
+                task = asyncio.create_task(self._run_message(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            if odoo_crm_opportunity_service:
+                await odoo_crm_opportunity_service.aclose()
+
+    async def _run_message(self, message):
+        try:
+            data = json.loads(message.content)
+            async with self._contact_turn(data.get("manychat_id")):
+                await self.handle_message(message, data)
+        except Exception as e:
+            logger.error(f"Error en el procesamiento del worker CRM: {e}")
+
+    @asynccontextmanager
+    async def _contact_turn(self, manychat_id: Optional[str]):
+        entry = self._contact_locks.setdefault(manychat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._contact_locks[manychat_id]
+
+    async def handle_message(self, message, data: Dict[str, Any]):
+        """Procesa un evento: primero Azure SQL y después Odoo. El mensaje se elimina siempre al final."""
+        try:
+            # El payload ya viene con los campos unificados, separar para cada tabla
+            manychat_id = data.get("manychat_id")
+            campaign_id = data.get("campaign_id")
+            state = data.get("state")
+            summary = data.get("summary")
+            assignment_type = data.get("assignment_type")
+            advisor_id = data.get("advisor_id")
+            assignment_datetime = data.get("assignment_datetime")
+
+            from app.db.session import get_async_db_session
+            from app.db.async_repositories import (
+                AsyncContactRepository, AsyncContactStateRepository, AsyncCampaignContactRepository, AsyncAdvisorRepository
+            )
+            # Sesión asíncrona: las consultas no bloquean el event loop del worker.
+            async with get_async_db_session() as db:
+                contact_repo = AsyncContactRepository(db)
+                state_repo = AsyncContactStateRepository(db)
+                campaign_contact_repo = AsyncCampaignContactRepository(db)
+                advisor_repo = AsyncAdvisorRepository(db)
+                contact = await contact_repo.get_by_manychat_id(manychat_id)
+                if not contact:
+                    logger.error(f"No se encontró el contacto con manychat_id={manychat_id} en la BD. Se elimina el mensaje de la cola.")
+                    await self.queue_service.delete_message(self.queue_name, message.id, message.pop_receipt)
+                    return
+
+                # Upsert ContactState
+                contact_state = await state_repo.create_or_update(
+                    contact_id=contact.id,
+                    state=state,
+                    category="manychat"
+                )
+
+                # Buscar nombre del asesor comercial o médico si corresponde
+                advisor_comercial_name = None
+                advisor_medico_name = None
+                # Buscar ambos asesores por sus IDs si existen en CampaignContact
+                campaign_contact_obj = await campaign_contact_repo.get_by_contact_and_campaign(contact.id, campaign_id)
+                if campaign_contact_obj:
+                    if campaign_contact_obj.commercial_advisor_id:
+                        advisor_obj = await advisor_repo.get_by_id_or_email(campaign_contact_obj.commercial_advisor_id)
+                        advisor_comercial_name = advisor_obj.name if advisor_obj else None
+                    if campaign_contact_obj.medical_advisor_id:
+                        advisor_obj = await advisor_repo.get_by_id_or_email(campaign_contact_obj.medical_advisor_id)
+                        advisor_medico_name = advisor_obj.name if advisor_obj else None
+
+                # Buscar nombre del canal correctamente por ID
+                channel_name = None
+                if contact.channel_id:
+                    channel_obj = await db.get(Channel, contact.channel_id)
+                    channel_name = channel_obj.name if channel_obj else None
+
+                # Upsert CampaignContact
+                cc_data = {
+                    "contact_id": contact.id,
+                    "campaign_id": campaign_id,
+                    "last_state": state,
+                    "summary": summary,
+                    "sync_status": "updated",
+                }
+                if assignment_type == "comercial":
+                    cc_data["commercial_advisor_id"] = advisor_id
+                    cc_data["commercial_assignment_date"] = assignment_datetime
+                elif assignment_type == "medico":
+                    cc_data["medical_advisor_id"] = advisor_id
+                    cc_data["medical_assignment_date"] = assignment_datetime
+                campaign_contact = await campaign_contact_repo.create_or_update_assignment(cc_data)
+                # Un solo commit para el estado y la asignación, antes de llamar a Odoo
+                await db.commit()
+
+                # Consultar el último estado real desde Contact_State
+                latest_state = await state_repo.get_latest_by_contact(contact.id)
+            # La sesión se cierra aquí: no se retiene una conexión durante la llamada a Odoo.
+
+            # Lógica real de integración con Odoo
+            full_name = f"{contact.first_name} {contact.last_name or ''}".strip()
+            stage_manychat = latest_state.state if latest_state else state
+
+            # Mapeo de estado ManyChat a stage_id de Odoo
+            MANYCHAT_TO_ODOO_STAGE = {
+                "Recién Suscrito (Sin Asignar)": 16,
+                "Recién suscrito Pendiente de AC": 17,
+                "Retornó en AC": 18,
+                "Comienza Atención Comercial": 19,
+                "Retornó a Asesoría especializada": 20,
+                "Derivado Asesoría Médica": 21,
+                "Comienza Asesoría Médica": 22,
+                "Terminó Asesoría Médica": 23,
+                "No terminó Asesoría especializada Derivado a Comecial": 24,
+                "Comienza Cotización": 25,
+                "Orden de venta confirmada": 26,
+            }
+            stage_odoo_id = MANYCHAT_TO_ODOO_STAGE.get(stage_manychat)
+            if not stage_odoo_id:
+                logger.error(f"No se pudo mapear el estado '{stage_manychat}' a un stage_id de Odoo. Se elimina el mensaje de la cola.")
+                sync_log.record("odoo", "Opportunity", manychat_id, "upsert", "skipped", f"Estado sin stage de Odoo: {stage_manychat}")
+                await self.queue_service.delete_message(self.queue_name, message.id, message.pop_receipt)
+                return
+
+            logger.info(f"Creando/actualizando oportunidad en Odoo para contacto: {full_name}, manychat_id: {manychat_id}, stage: {stage_manychat}, stage_odoo_id: {stage_odoo_id}")
+            if odoo_crm_opportunity_service and stage_odoo_id:
                 try:
-                    # El payload ya viene con los campos unificados, separar para cada tabla
-                    manychat_id = data.get("manychat_id")
-                    campaign_id = data.get("campaign_id")
-                    state = data.get("state")
-                    summary = data.get("summary")
-                    assignment_type = data.get("assignment_type")
-                    advisor_id = data.get("advisor_id")
-                    assignment_datetime = data.get("assignment_datetime")
-
-                    from app.db.session import SessionLocal
-                    from app.db.repositories import ContactRepository, ContactStateRepository, CampaignContactRepository, AdvisorRepository, ChannelRepository
-                    db = SessionLocal()
-                    contact_repo = ContactRepository(db)
-                    state_repo = ContactStateRepository(db)
-                    campaign_contact_repo = CampaignContactRepository(db)
-                    advisor_repo = AdvisorRepository(db)
-                    channel_repo = ChannelRepository(db)
-                    contact = contact_repo.get_by_manychat_id(manychat_id)
-                    if not contact:
-                        logger.error(f"No se encontró el contacto con manychat_id={manychat_id} en la BD. Se elimina el mensaje de la cola.")
-                        await self.queue_service.delete_message(self.queue_name, message.id, message.pop_receipt)
-                        continue
-
-                    # Upsert ContactState
-                    contact_state = state_repo.create_or_update(
-                        contact_id=contact.id,
-                        state=state,
-                        category="manychat"
-                    )
-
-                    # Buscar nombre del asesor comercial o médico si corresponde
-                    advisor_comercial_name = None
-                    advisor_medico_name = None
-                    # Buscar ambos asesores por sus IDs si existen en CampaignContact
-                    campaign_contact_obj = db.query(CampaignContact).filter_by(contact_id=contact.id, campaign_id=campaign_id).first()
-                    if campaign_contact_obj:
-                        if campaign_contact_obj.commercial_advisor_id:
-                            advisor_obj = advisor_repo.get_by_id_or_email(campaign_contact_obj.commercial_advisor_id)
-                            advisor_comercial_name = advisor_obj.name if advisor_obj else None
-                        if campaign_contact_obj.medical_advisor_id:
-                            advisor_obj = advisor_repo.get_by_id_or_email(campaign_contact_obj.medical_advisor_id)
-                            advisor_medico_name = advisor_obj.name if advisor_obj else None
-
-                    # Buscar nombre del canal correctamente por ID
-                    channel_name = None
-                    if contact.channel_id:
-                        channel_obj = db.query(Channel).filter_by(id=contact.channel_id).first()
-                        channel_name = channel_obj.name if channel_obj else None
-
-                    # Upsert CampaignContact
-                    cc_data = {
-                        "contact_id": contact.id,
-                        "campaign_id": campaign_id,
-                        "last_state": state,
-                        "summary": summary,
-                        "sync_status": "updated",
+                    fecha_entrada = contact.subscription_date if contact.subscription_date and hasattr(contact.subscription_date, 'strftime') else None
+                    fecha_ultimo_estado = latest_state.created_at if latest_state and hasattr(latest_state.created_at, 'strftime') else None
+                    payload_odoo = {
+                        "manychat_id": contact.manychat_id,
+                        "contact_name": full_name,
+                        "stage_odoo_id": stage_odoo_id,
+                        "advisor_comercial_id": advisor_comercial_name,
+                        "advisor_medico_id": advisor_medico_name,
+                        "contact_email": contact.email,
+                        "contact_phone": contact.phone,
+                        "source_id": contact.channel_id,
+                        "channel_name": channel_name,
+                        "fecha_entrada": fecha_entrada,
+                        "fecha_ultimo_estado": fecha_ultimo_estado,
+                        "odoo_lead_id": contact.odoo_lead_id,
                     }
-                    if assignment_type == "comercial":
-                        cc_data["commercial_advisor_id"] = advisor_id
-                        cc_data["commercial_assignment_date"] = assignment_datetime
-                    elif assignment_type == "medico":
-                        cc_data["medical_advisor_id"] = advisor_id
-                        cc_data["medical_assignment_date"] = assignment_datetime
-                    campaign_contact = campaign_contact_repo.create_or_update_assignment(cc_data)
-
-
-                    # Lógica real de integración con Odoo
-                    full_name = f"{contact.first_name} {contact.last_name or ''}".strip()
-                    # Consultar el último estado real desde Contact_State
-                    latest_state = state_repo.get_latest_by_contact(contact.id)
-                    stage_manychat = latest_state.state if latest_state else state
-
-                    # Mapeo de estado ManyChat a stage_id de Odoo
-                    MANYCHAT_TO_ODOO_STAGE = {
-                        "Recién Suscrito (Sin Asignar)": 16,
-                        "Recién suscrito Pendiente de AC": 17,
-                        "Retornó en AC": 18,
-                        "Comienza Atención Comercial": 19,
-                        "Retornó a Asesoría especializada": 20,
-                        "Derivado Asesoría Médica": 21,
-                        "Comienza Asesoría Médica": 22,
-                        "Terminó Asesoría Médica": 23,
-                        "No terminó Asesoría especializada Derivado a Comecial": 24,
-                        "Comienza Cotización": 25,
-                        "Orden de venta confirmada": 26,
-                    }
-                    stage_odoo_id = MANYCHAT_TO_ODOO_STAGE.get(stage_manychat)
-                    if not stage_odoo_id:
-                        logger.error(f"No se pudo mapear el estado '{stage_manychat}' a un stage_id de Odoo. Se elimina el mensaje de la cola.")
-                        db.close()
-                        await self.queue_service.delete_message(self.queue_name, message.id, message.pop_receipt)
-                        continue
-
-                    logger.info(f"Creando/actualizando oportunidad en Odoo para contacto: {full_name}, manychat_id: {manychat_id}, stage: {stage_manychat}, stage_odoo_id: {stage_odoo_id}")
-                    if odoo_crm_opportunity_service and stage_odoo_id:
-                        try:
-                            fecha_entrada = contact.subscription_date if contact.subscription_date and hasattr(contact.subscription_date, 'strftime') else None
-                            fecha_ultimo_estado = latest_state.created_at if latest_state and hasattr(latest_state.created_at, 'strftime') else None
-                            payload_odoo = {
-                                "manychat_id": contact.manychat_id,
-                                "contact_name": full_name,
-                                "stage_odoo_id": stage_odoo_id,
-                                "advisor_comercial_id": advisor_comercial_name,
-                                "advisor_medico_id": advisor_medico_name,
-                                "contact_email": contact.email,
-                                "contact_phone": contact.phone,
-                                "source_id": contact.channel_id,
-                                "channel_name": channel_name,
-                                "fecha_entrada": fecha_entrada,
-                                "fecha_ultimo_estado": fecha_ultimo_estado
-                            }
-                            logger.info(f"Payload enviado a Odoo: {payload_odoo}")
-                            opportunity_id = await odoo_crm_opportunity_service.create_or_update_opportunity(**payload_odoo)
-                            logger.info(f"Oportunidad Odoo creada/actualizada con ID: {opportunity_id} para contacto {contact.id}")
-                        except Exception as e:
-                            logger.error(f"Error al crear/actualizar oportunidad Odoo para contacto {contact.id}: {e}")
-                    else:
-                        logger.error(f"No se pudo crear/actualizar oportunidad Odoo: servicio no disponible o stage no mapeado para contacto {contact.id}")
-
-                    db.close()
+                    logger.debug(f"Payload enviado a Odoo: {payload_odoo}")
+                    opportunity_id = await odoo_crm_opportunity_service.create_or_update_opportunity(**payload_odoo)
+                    logger.info(f"Oportunidad Odoo creada/actualizada con ID: {opportunity_id} para contacto {contact.id}")
+                    if opportunity_id != contact.odoo_lead_id:
+                        await self._save_odoo_lead_id(contact.id, opportunity_id)
+                    sync_log.record("odoo", "Opportunity", manychat_id, "upsert", "success",
+                                    {"opportunity_id": opportunity_id, "stage_odoo_id": stage_odoo_id})
                 except Exception as e:
-                    logger.error(f"Error al procesar evento unificado: {e} | Evento: {data}")
-                    db.close()
-                await self.queue_service.delete_message(self.queue_name, message.id, message.pop_receipt)
-                await asyncio.sleep(1)  # Rate limit Odoo
-            except Exception as e:
-                logger.error(f"Error en el procesamiento del worker CRM: {e}")
-                await asyncio.sleep(self.sync_interval)
+                    logger.error(f"Error al crear/actualizar oportunidad Odoo para contacto {contact.id}: {e}")
+                    sync_log.record("odoo", "Opportunity", manychat_id, "upsert", "error", str(e))
+            else:
+                logger.error(f"No se pudo crear/actualizar oportunidad Odoo: servicio no disponible o stage no mapeado para contacto {contact.id}")
+        except Exception as e:
+            logger.error(f"Error al procesar evento unificado: {e} | Evento: {data}")
+        await self.queue_service.delete_message(self.queue_name, message.id, message.pop_receipt)
+
+    async def _save_odoo_lead_id(self, contact_id: int, odoo_lead_id: int):
+        """Guarda el id del crm.lead en Contact para que los próximos eventos escriban directo en Odoo."""
+        from app.db.session import get_async_db_session
+        from app.db.async_repositories import AsyncContactRepository
+        try:
+            async with get_async_db_session() as db:
+                await AsyncContactRepository(db).set_odoo_lead_id(contact_id, odoo_lead_id)
+                await db.commit()
+        except Exception as e:
+            # Sin el mapeo el siguiente evento vuelve a buscar la oportunidad por ManyChat ID.
+            logger.warning(f"No se pudo guardar odoo_lead_id={odoo_lead_id} del contacto {contact_id}: {e}")
 
 def main():
     """
@@ -0,0 +1,111 @@
+# workers/outbox_relay.py
+"""
+Relay del Outbox → Azure Storage Queue
+--------------------------------------
+Publica en las colas los eventos guardados en la tabla 'Outbox'.
+
+- Los endpoints escriben el evento en 'Outbox' dentro de la misma transacción
+  que sus cambios en Azure SQL (patrón transactional outbox).
+- Este worker reclama lotes de eventos pendientes, los envía en paralelo a la cola
+  y los marca como enviados con un único UPDATE por lote.
+- Reclamar es atómico: los eventos pasan a 'publishing' con un lease a nombre de
+  esta instancia (WORKER_ID) y ninguna otra los toma, así que se pueden ejecutar
+  varias réplicas sin publicar cada evento una vez por réplica. Si la instancia cae,
+  el evento se vuelve a reclamar cuando vence el lease (OUTBOX_LEASE_SECONDS).
+- Si el envío falla, el evento se reintenta en el siguiente ciclo hasta
+  OUTBOX_MAX_ATTEMPTS; después queda en estado 'failed' para revisión manual.
+
+La entrega es "al menos una vez": si el proceso cae entre el envío y el UPDATE,
+el evento se reenviará. Los consumidores ya deben ser idempotentes.
+"""
+import asyncio
+import json
+import os
+import socket
+from typing import Dict, List, Tuple
+
+from app.services.queue_service import QueueService
+from app.db.session import get_async_db_session
+from app.db.async_repositories import AsyncOutboxRepository
+from app.core.logging import logger
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_RELAY_INTERVAL = 2
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_LEASE_SECONDS = 60
+
+# Identifica a esta instancia del relay como dueña de los leases que toma.
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _publish(queue_service: QueueService, message_id: int, queue_name: str, payload: str) -> Tuple[int, str]:
+    """Envía un evento a su cola. Retorna (id, error) con error vacío si tuvo éxito."""
+    try:
+        await queue_service.send_message(queue_name, json.loads(payload))
+        return message_id, ""
+    except Exception as e:
+        return message_id, str(e) or e.__class__.__name__
+
+
+async def relay_outbox_once(
+    queue_service: QueueService, batch_size: int, max_attempts: int, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+) -> int:
+    """
+    Drena un lote del Outbox. Retorna el número de eventos procesados en el lote.
+    """
+    async with get_async_db_session() as db:
+        outbox_repo = AsyncOutboxRepository(db)
+        claimed = await outbox_repo.claim_pending(WORKER_ID, batch_size, lease_seconds)
+        pending = [(m.id, m.queue_name, m.payload) for m in claimed]
+        await db.commit()  # Confirma el reclamo y libera la conexión mientras se publica en la cola
+
+        if not pending:
+            return 0
+
+        results = await asyncio.gather(
+            *(_publish(queue_service, message_id, queue_name, payload) for message_id, queue_name, payload in pending)
+        )
+        sent: List[int] = [message_id for message_id, error in results if not error]
+        failures: Dict[int, str] = {message_id: error for message_id, error in results if error}
+
+        await outbox_repo.mark_sent(sent, owner=WORKER_ID)
+        await outbox_repo.mark_failed(failures, max_attempts=max_attempts, owner=WORKER_ID)
+        await db.commit()
+
+    if failures:
+        logger.warning(f"Outbox: {len(failures)} eventos no se pudieron publicar; se reintentarán.", failed_ids=list(failures))
+    logger.info(f"Outbox: {len(sent)} eventos publicados.")
+    return len(pending)
+
+
+async def process_outbox(queue_service: QueueService = None):
+    """
+    Worker que publica continuamente los eventos pendientes del Outbox.
+    """
+    queue_service = queue_service or QueueService()
+    batch_size = int(os.getenv("OUTBOX_RELAY_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    relay_interval = float(os.getenv("OUTBOX_RELAY_INTERVAL", DEFAULT_RELAY_INTERVAL))
+    max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+    lease_seconds = int(os.getenv("OUTBOX_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+    logger.info(f"Relay del Outbox {WORKER_ID} iniciado. Lote: {batch_size}, intervalo: {relay_interval}s")
+    while True:
+        try:
+            processed = await relay_outbox_once(queue_service, batch_size, max_attempts, lease_seconds)
+            # Si el lote vino lleno probablemente hay más pendientes: seguir sin esperar.
+            if processed < batch_size:
+                await asyncio.sleep(relay_interval)
+        except Exception as e:
+            logger.error(f"Error inesperado en el relay del Outbox: {e}", exc_info=True)
+            await asyncio.sleep(relay_interval * 5)
+
+
+async def main():
+    queue_service = QueueService()
+    await queue_service.ensure_queues_exist()
+    await process_outbox(queue_service)
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Relay del Outbox detenido manualmente.")